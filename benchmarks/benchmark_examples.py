@@ -0,0 +1,283 @@
+"""
+Benchmark every definition and solver combination over the bundled examples
+
+Usage:
+    python -m benchmarks.benchmark_examples --output results.json
+    python -m benchmarks.benchmark_examples --output results.json --compare baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import torch
+from counterfact.definitions import ModifiedHP, OriginalHP, DirectActualCause
+from counterfact.examples import *
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import RandomSearchOrder, instrument
+
+# Example classes, their outcome variables, and the constructor arguments to sweep over
+# Examples without fixed outcome variables provide them as an outcome_vars attribute
+EXAMPLES = {
+    "BinaryAnd": (BinaryAnd, ["y"], [{}]),
+    "BinaryOr": (BinaryOr, ["y"], [{}]),
+    "BinaryXor": (BinaryXor, ["y"], [{}]),
+    "ForestFireDisjunctive": (ForestFireDisjunctive, ["fire"], [{}]),
+    "ForestFireConjunctive": (ForestFireConjunctive, ["fire"], [{}]),
+    "ForestFireRainStorm": (ForestFireRainStorm, ["fire_in_june"], [{}]),
+    "ObedientGang": (ObedientGang, ["death"], [{}]),
+    "HaltOrCharge": (HaltOrCharge, ["corporal"], [{}]),
+    "Mover1D": (Mover1D, ["next_mover_pos"], "world_length"),
+    "QueenOfEngland": (QueenOfEngland, ["flowers_live"], [{}]),
+    "SwitchingRailroadTracks": (SwitchingRailroadTracks, ["arrived"], [{}]),
+    "RockThrowing": (RockThrowing, ["bottle_shatters"], [{}]),
+    "Voting": (Voting, ["winner"], "n_voters"),
+    "RandomSCM": (RandomSCM, None, "n_nodes"),
+}
+
+DEFINITIONS = {
+    "ModifiedHP": ModifiedHP,
+    "OriginalHP": OriginalHP,
+    "DirectActualCause": DirectActualCause,
+}
+
+MODES = ["solve", "solve_all_states"]
+
+# Counters from the instrumentation that are stored with every result
+COUNTERS = [
+    "evaluate",
+    "get_state",
+    "do",
+    "reset",
+    "alt_assignments_tried",
+    "witness_sets_tried",
+    "sufficiency_assignments_tried",
+]
+
+
+def get_configurations(args):
+    """
+    Expand the examples into (example name, constructor arguments) pairs, sweeping the scaling parameters
+    :param args: parsed command line arguments
+    :return: list of (name, kwargs) tuples
+    """
+    sweeps = {
+        "n_voters": [{"n_voters": n} for n in args.n_voters],
+        "world_length": [{"world_length": n} for n in args.world_lengths],
+        "n_nodes": [{"n_nodes": n, "seed": args.seed} for n in args.n_nodes],
+    }
+    configurations = []
+    for name, (_, _, kwargs_list) in EXAMPLES.items():
+        if args.examples and name not in args.examples:
+            continue
+        if isinstance(kwargs_list, str):
+            kwargs_list = sweeps[kwargs_list]
+        for kwargs in kwargs_list:
+            configurations.append((name, kwargs))
+    return configurations
+
+
+def run_benchmark(name, kwargs, defn_name, mode, seed):
+    """
+    Run a single benchmark and measure wall time, evaluation counts and peak memory
+    :param name: name of the example class
+    :param kwargs: constructor arguments for the example
+    :param defn_name: name of the actual cause definition
+    :param mode: "solve" for a single state, "solve_all_states" for every noise configuration
+    :param seed: seed for the search order and the sampled state
+    :return: dict with the result of the benchmark
+    """
+    example_class, outcome_vars, _ = EXAMPLES[name]
+    result = {
+        "example": name,
+        "kwargs": kwargs,
+        "definition": defn_name,
+        "mode": mode,
+    }
+
+    # The solvers shuffle candidate events with the global random number generators
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with instrument() as profile:
+            env = example_class(**kwargs)
+            outcome_vars = outcome_vars or env.outcome_vars
+            ac_defn = DEFINITIONS[defn_name](search_order=RandomSearchOrder(seed))
+            solver = HPExhaustiveSearch(env, ac_defn)
+            if mode == "solve":
+                # Pick one noise configuration at random and solve for its state
+                rng = np.random.default_rng(seed)
+                noise = {
+                    var: torch.tensor(support[rng.integers(len(support))])
+                    for var, support in solver.get_noise_supports(env).items()
+                }
+                state = env.get_state(dict(noise))
+                env.reset()
+                outcome = {var: state[var] for var in outcome_vars}
+                actual_causes = solver.solve(state, outcome, noise)
+                result["n_causes"] = len(actual_causes)
+            else:
+                ac_table = solver.solve_all_states(env, ac_defn, outcome_vars)
+                result["n_states"] = len(ac_table)
+        result["status"] = "ok"
+        result["counters"] = {
+            counter: profile.counters.get(counter, 0) for counter in COUNTERS
+        }
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{e.__class__.__name__}: {e}"
+    result["wall_time"] = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["peak_memory"] = peak_memory
+    return result
+
+
+def result_key(result):
+    """
+    Key that identifies the same benchmark across runs
+    """
+    return (
+        result["example"],
+        json.dumps(result["kwargs"], sort_keys=True),
+        result["definition"],
+        result["mode"],
+    )
+
+
+def compare_results(
+    results, baseline, time_threshold, memory_threshold, count_threshold
+):
+    """
+    Compare results against a baseline and flag regressions
+    A metric regresses if it grows by more than its relative threshold. The search is seeded, but some
+    definitions still iterate over sets of variable names, so evaluation counts can vary between processes
+    :param results: list of benchmark results
+    :param baseline: list of benchmark results from the baseline file
+    :param time_threshold: allowed relative increase in wall time
+    :param memory_threshold: allowed relative increase in peak memory
+    :param count_threshold: allowed relative increase in evaluation counts
+    :return: list of regressions, each a dict describing the benchmark and the metric that regressed
+    """
+    baseline_by_key = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline_by_key.get(result_key(result))
+        if old is None or old["status"] != "ok":
+            continue
+        key = {k: result[k] for k in ["example", "kwargs", "definition", "mode"]}
+        if result["status"] != "ok":
+            regressions.append({**key, "metric": "status", "new": result["error"]})
+            continue
+        metrics = [
+            ("wall_time", result["wall_time"], old["wall_time"], time_threshold),
+            (
+                "peak_memory",
+                result["peak_memory"],
+                old["peak_memory"],
+                memory_threshold,
+            ),
+        ] + [
+            (
+                counter,
+                result["counters"][counter],
+                old["counters"].get(counter, 0),
+                count_threshold,
+            )
+            for counter in COUNTERS
+        ]
+        for metric, new_value, old_value, threshold in metrics:
+            if new_value > old_value * (1 + threshold):
+                regressions.append(
+                    {**key, "metric": metric, "old": old_value, "new": new_value}
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--examples", nargs="*", help="only run these examples")
+    parser.add_argument(
+        "--definitions", nargs="*", default=list(DEFINITIONS), help="definitions"
+    )
+    parser.add_argument("--modes", nargs="*", default=MODES, help="solver modes")
+    parser.add_argument("--n-voters", nargs="*", type=int, default=[3, 5, 7])
+    parser.add_argument("--world-lengths", nargs="*", type=int, default=[3, 4, 6])
+    parser.add_argument("--n-nodes", nargs="*", type=int, default=[4, 6, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--time-threshold",
+        type=float,
+        default=0.2,
+        help="relative increase in wall time flagged as a regression",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        default=0.2,
+        help="relative increase in peak memory flagged as a regression",
+    )
+    parser.add_argument(
+        "--count-threshold",
+        type=float,
+        default=0.25,
+        help="relative increase in evaluation counts flagged as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, kwargs in get_configurations(args):
+        for defn_name in args.definitions:
+            for mode in args.modes:
+                result = run_benchmark(name, kwargs, defn_name, mode, args.seed)
+                results.append(result)
+                print(
+                    f"{name}{kwargs or ''} {defn_name} {mode}: {result['status']} "
+                    f"{result['wall_time']:.3f}s {result['peak_memory'] / 1e6:.2f}MB",
+                    file=sys.stderr,
+                )
+
+    output = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "torch": torch.__version__,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(
+            results,
+            baseline,
+            args.time_threshold,
+            args.memory_threshold,
+            args.count_threshold,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        print(f"{len(regressions)} regressions found", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Benchmark the import time of the package and the heavy dependencies that each entry point loads
+
+Usage:
+    python -m benchmarks.benchmark_imports --output imports.json
+    python -m benchmarks.benchmark_imports --output imports.json --compare baseline.json
+
+Every import is timed in a new interpreter, so that modules imported by an earlier measurement are not reused
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+# Statements whose import time is measured, from the bare package to a fully loaded query module
+TARGETS = {
+    "package": "import counterfact",
+    "scm": "import counterfact.causal_models.scm",
+    "utils": "import counterfact.utils",
+    "definitions": "from counterfact.definitions import ModifiedHP",
+    "inference": "from counterfact.inference import HPExhaustiveSearch",
+    "example": "from counterfact.examples import RockThrowing",
+    "queries": "import counterfact.queries",
+}
+
+# Dependencies that dominate the import time when they are loaded
+HEAVY_DEPENDENCIES = ["torch", "pyro", "pandas", "networkx"]
+
+# Code run in the new interpreter, which prints the wall time of the statement and the dependencies it loaded
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+wall_time = time.perf_counter() - start
+print(json.dumps({{"wall_time": wall_time, "loaded": [m for m in {dependencies!r} if m in sys.modules]}}))
+"""
+
+
+def run_benchmark(name, repeats):
+    """
+    Time an import target in new interpreters and record which heavy dependencies it loads
+    :param name: name of the target in TARGETS
+    :param repeats: number of interpreters to start, the median wall time is reported
+    :return: dict with the result of the benchmark
+    """
+    result = {"target": name, "statement": TARGETS[name]}
+    code = MEASURE.format(statement=TARGETS[name], dependencies=HEAVY_DEPENDENCIES)
+    try:
+        measurements = []
+        for _ in range(repeats):
+            process = subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True
+            )
+            if process.returncode != 0:
+                raise RuntimeError(process.stderr.strip().splitlines()[-1])
+            measurements.append(json.loads(process.stdout.strip().splitlines()[-1]))
+        result["status"] = "ok"
+        result["wall_time"] = statistics.median(m["wall_time"] for m in measurements)
+        result["loaded"] = measurements[-1]["loaded"]
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{e.__class__.__name__}: {e}"
+    return result
+
+
+def compare_results(results, baseline, time_threshold):
+    """
+    Compare results against a baseline and flag regressions
+    A target regresses if its wall time grows by more than the relative threshold, or if it loads a heavy
+    dependency that it did not load before
+    :param results: list of benchmark results
+    :param baseline: list of benchmark results from the baseline file
+    :param time_threshold: allowed relative increase in wall time
+    :return: list of regressions, each a dict describing the target and the metric that regressed
+    """
+    baseline_by_target = {result["target"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline_by_target.get(result["target"])
+        if old is None or old["status"] != "ok":
+            continue
+        if result["status"] != "ok":
+            regressions.append(
+                {"target": result["target"], "metric": "status", "new": result["error"]}
+            )
+            continue
+        if result["wall_time"] > old["wall_time"] * (1 + time_threshold):
+            regressions.append(
+                {
+                    "target": result["target"],
+                    "metric": "wall_time",
+                    "old": old["wall_time"],
+                    "new": result["wall_time"],
+                }
+            )
+        new_dependencies = sorted(set(result["loaded"]) - set(old["loaded"]))
+        if new_dependencies:
+            regressions.append(
+                {
+                    "target": result["target"],
+                    "metric": "loaded",
+                    "old": old["loaded"],
+                    "new": result["loaded"],
+                }
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--targets", nargs="*", default=list(TARGETS), help="import targets"
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="interpreters started per target"
+    )
+    parser.add_argument(
+        "--time-threshold",
+        type=float,
+        default=0.2,
+        help="relative increase in wall time flagged as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.targets:
+        result = run_benchmark(name, args.repeats)
+        results.append(result)
+        if result["status"] == "ok":
+            print(
+                f"{name}: {result['wall_time']:.3f}s {' '.join(result['loaded'])}",
+                file=sys.stderr,
+            )
+        else:
+            print(f"{name}: {result['status']} {result['error']}", file=sys.stderr)
+
+    output = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.time_threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        print(f"{len(regressions)} regressions found", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Run a batch of actual cause queries from a JSONL file
+
+Usage:
+    python -m counterfact.batch queries.jsonl --output results.jsonl --workers 8
+    cat queries.jsonl | python -m counterfact.batch > results.jsonl
+
+Every line of the input is a JSON query, see counterfact.queries.run_query, where model is the name of the example
+class and kwargs are its constructor arguments. Every line of the output is the JSON result of one query, written
+as soon as its chunk of queries finishes, so results can be in a different order than the queries. Queries without
+an id get their line number as id
+"""
+
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from counterfact.queries import load_model, run_query
+from counterfact.utils import ResultCache
+
+# Models built by this process, keyed by model_key, and the result caches opened by this process, keyed by path
+_models = {}
+_models_lock = threading.Lock()
+_caches = {}
+
+
+def model_key(request: dict) -> str:
+    """
+    Key that identifies the model of a query by its class name and constructor arguments
+    """
+    return json.dumps(
+        [request.get("model"), request.get("kwargs") or {}], sort_keys=True
+    )
+
+
+def run_chunk(
+    requests: list, limit: dict = None, cache_path: str = None, cache_size: int = None
+) -> list:
+    """
+    Run a chunk of queries, building each model only the first time this process needs it
+    :param requests: list of queries
+    :param limit: dict with optional max_queries and timeout that caps the budget of every query
+    :param cache_path: optional path of a ResultCache, opened once per process
+    :param cache_size: maximum number of results in the cache
+    :return: list of results, in the order of the queries
+    """
+    cache = None
+    if cache_path is not None:
+        with _models_lock:
+            if cache_path not in _caches:
+                _caches[cache_path] = ResultCache(cache_path, cache_size)
+        cache = _caches[cache_path]
+    results = []
+    for request in requests:
+        key = model_key(request)
+        try:
+            with _models_lock:
+                if key not in _models:
+                    _models[key] = load_model(
+                        request.get("model"), request.get("kwargs")
+                    )
+        except Exception as e:
+            results.append(
+                {
+                    "id": request.get("id"),
+                    "status": "error",
+                    "error": f"{e.__class__.__name__}: {e}",
+                }
+            )
+            continue
+        results.append(run_query(_models, {**request, "model": key}, limit, cache))
+    return results
+
+
+def read_queries(lines):
+    """
+    Parse query lines, giving queries without an id their line number
+    :param lines: iterable of lines
+    :return: generator of (query, result) tuples, where the result is an error for lines that are not a query
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A query must be a JSON object.")
+        except ValueError as e:
+            yield None, {
+                "id": line_number,
+                "status": "error",
+                "error": f"Invalid query: {e}",
+            }
+            continue
+        request.setdefault("id", line_number)
+        yield request, None
+
+
+def run_batch(
+    lines,
+    output,
+    n_workers: int = 4,
+    chunk_size: int = 16,
+    threads: bool = False,
+    limit: dict = None,
+    cache_path: str = None,
+    cache_size: int = 100000,
+):
+    """
+    Run queries in parallel and write their results as they finish
+    Queries are grouped by model into chunks, so that a worker builds each model once and reuses it for all later
+    chunks of the model. The number of queries that are read but not yet written is bounded by a few chunks per
+    worker, so memory use does not grow with the size of the input
+    :param lines: iterable of query lines
+    :param output: file to write result lines to
+    :param n_workers: number of worker processes, or threads if threads is set
+    :param chunk_size: number of queries of the same model that are sent to a worker together
+    :param threads: use worker threads that share the models instead of worker processes
+    :param limit: dict with optional max_queries and timeout that caps the budget of every query
+    :param cache_path: optional path of a ResultCache that results are reused from and stored in
+    :param cache_size: maximum number of results in the cache
+    :return: dict with the number of queries, the number of results of each status and the number of cached
+    results
+    """
+    summary = {"n_queries": 0}
+    max_buffered = chunk_size * n_workers * 2
+    max_in_flight = n_workers * 2
+    buffers = {}
+    n_buffered = 0
+    in_flight = set()
+
+    def write(results):
+        for result in results:
+            summary["n_queries"] += 1
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+            if result.get("cached"):
+                summary["cached"] = summary.get("cached", 0) + 1
+            output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    def collect(block: bool):
+        nonlocal in_flight
+        if not in_flight:
+            return
+        done, in_flight = wait(
+            in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED
+        )
+        for future in done:
+            write(future.result())
+
+    executor_class = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with executor_class(max_workers=n_workers) as executor:
+
+        def submit(key):
+            nonlocal n_buffered
+            chunk = buffers.pop(key)
+            n_buffered -= len(chunk)
+            while len(in_flight) >= max_in_flight:
+                collect(block=True)
+            in_flight.add(
+                executor.submit(run_chunk, chunk, limit, cache_path, cache_size)
+            )
+
+        for request, result in read_queries(lines):
+            if result is not None:
+                write([result])
+                continue
+
+            # Buffer the query with the other queries of its model until there is a full chunk
+            key = model_key(request)
+            buffers.setdefault(key, []).append(request)
+            n_buffered += 1
+            if len(buffers[key]) >= chunk_size:
+                submit(key)
+            elif n_buffered >= max_buffered:
+                submit(max(buffers, key=lambda k: len(buffers[k])))
+            collect(block=False)
+
+        # Send the remaining partial chunks and wait for all results
+        for key in list(buffers):
+            submit(key)
+        while in_flight:
+            collect(block=True)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "input", nargs="?", default="-", help="JSONL file of queries, - for stdin"
+    )
+    parser.add_argument("--output", help="JSONL file to write results to")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=16,
+        help="number of queries of the same model sent to a worker together",
+    )
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="use worker threads that share the models instead of processes",
+    )
+    parser.add_argument(
+        "--max-queries",
+        type=int,
+        help="largest number of model evaluations any query can use",
+    )
+    parser.add_argument(
+        "--timeout", type=float, help="largest wall time in seconds of any query"
+    )
+    parser.add_argument("--cache", help="SQLite file to cache results in")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        help="largest number of cached results",
+    )
+    args = parser.parse_args(argv)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = open(args.output, "w") if args.output else sys.stdout
+    try:
+        summary = run_batch(
+            input_file,
+            output_file,
+            n_workers=args.workers,
+            chunk_size=args.chunk_size,
+            threads=args.threads,
+            limit={"max_queries": args.max_queries, "timeout": args.timeout},
+            cache_path=args.cache,
+            cache_size=args.cache_size,
+        )
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    print(" ".join(f"{key}={value}" for key, value in summary.items()), file=sys.stderr)
+    return 1 if summary.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
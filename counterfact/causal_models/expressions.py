@@ -0,0 +1,572 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import itertools
+import numpy as np
+import torch
+from counterfact.causal_models.scm import StructuralFunction
+
+if TYPE_CHECKING:
+    import pyro.distributions as dist
+
+# Operators of the expression language, grouped by how they are compiled
+BOOLEAN_OPS = {"not", "and", "or", "xor"}
+COMPARISON_OPS = {"eq": "==", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+ARITHMETIC_OPS = {"add": "+", "sub": "-", "mul": "*"}
+
+
+class Expr:
+    """
+    Node of a structural function expression
+    Expressions are built from Var, Noise and Const leaves with the functions below or with Python operators:
+    & (and), | (or), ^ (xor), ~ (not), +, -, *, <, <=, >, >=. Equality is built with Eq and Ne, or the eq and ne
+    methods, since == is kept for comparing expressions as objects
+    """
+
+    __slots__ = ("op", "args")
+
+    def __init__(self, op: str, args: tuple):
+        self.op = op
+        self.args = args
+
+    def variables(self) -> List[str]:
+        """
+        Get the names of the endogenous variables used in the expression, in order of first appearance
+        """
+        return _collect(self, "var")
+
+    def noise_variables(self) -> List[str]:
+        """
+        Get the names of the noise terms used in the expression, in order of first appearance
+        """
+        return _collect(self, "noise")
+
+    def is_boolean(self, supports: Dict[str, list] = None) -> bool:
+        """
+        Check if the expression only combines binary variables with boolean operators
+        :param supports: dictionary of the supports of the variables, variables with support [0, 1] are binary
+        """
+        if self.op == "var":
+            return supports is not None and list(supports[self.args[0]]) == [0, 1]
+        if self.op == "const":
+            return self.args[0] in [0, 1]
+        if self.op in BOOLEAN_OPS:
+            return all(arg.is_boolean(supports) for arg in self.args)
+        if self.op == "ite":
+            return all(arg.is_boolean(supports) for arg in self.args)
+        if self.op in ["eq", "ne"]:
+            return all(arg.is_boolean(supports) for arg in self.args)
+        return False
+
+    def eq(self, other):
+        return Eq(self, other)
+
+    def ne(self, other):
+        return Ne(self, other)
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __rand__(self, other):
+        return And(other, self)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __ror__(self, other):
+        return Or(other, self)
+
+    def __xor__(self, other):
+        return Xor(self, other)
+
+    def __rxor__(self, other):
+        return Xor(other, self)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __add__(self, other):
+        return Expr("add", (self, _wrap(other)))
+
+    def __radd__(self, other):
+        return Expr("add", (_wrap(other), self))
+
+    def __sub__(self, other):
+        return Expr("sub", (self, _wrap(other)))
+
+    def __rsub__(self, other):
+        return Expr("sub", (_wrap(other), self))
+
+    def __mul__(self, other):
+        return Expr("mul", (self, _wrap(other)))
+
+    def __rmul__(self, other):
+        return Expr("mul", (_wrap(other), self))
+
+    def __neg__(self):
+        return Expr("sub", (Const(0), self))
+
+    def __lt__(self, other):
+        return Expr("lt", (self, _wrap(other)))
+
+    def __le__(self, other):
+        return Expr("le", (self, _wrap(other)))
+
+    def __gt__(self, other):
+        return Expr("gt", (self, _wrap(other)))
+
+    def __ge__(self, other):
+        return Expr("ge", (self, _wrap(other)))
+
+    def __bool__(self):
+        raise TypeError(
+            "Expressions have no truth value, use &, |, ~ or And, Or, Not instead of and, or, not."
+        )
+
+    def __repr__(self):
+        if self.op == "var":
+            return self.args[0]
+        if self.op == "noise":
+            return f"noise[{self.args[0]}]"
+        if self.op == "const":
+            return repr(self.args[0])
+        if self.op == "not":
+            return f"~{self.args[0]}"
+        if self.op in ["and", "or", "xor"]:
+            symbol = {"and": " & ", "or": " | ", "xor": " ^ "}[self.op]
+            return "(" + symbol.join(repr(arg) for arg in self.args) + ")"
+        if self.op in COMPARISON_OPS:
+            return f"({self.args[0]} {COMPARISON_OPS[self.op]} {self.args[1]})"
+        if self.op in ARITHMETIC_OPS:
+            return f"({self.args[0]} {ARITHMETIC_OPS[self.op]} {self.args[1]})"
+        if self.op == "ite":
+            return f"({self.args[1]} if {self.args[0]} else {self.args[2]})"
+        if self.op == "lookup":
+            keys = ", ".join(repr(key) for key in self.args[0])
+            return f"lookup({keys})"
+        raise ValueError(f"Unknown operator '{self.op}'.")
+
+
+def Var(name: str) -> Expr:
+    """
+    Value of an endogenous variable, read from the inputs of the structural function
+    """
+    return Expr("var", (name,))
+
+
+def Noise(name: str) -> Expr:
+    """
+    Value of the exogenous noise of a variable, read from the noise of the structural function
+    """
+    return Expr("noise", (name,))
+
+
+def Const(value) -> Expr:
+    return Expr("const", (value,))
+
+
+def Not(arg) -> Expr:
+    return Expr("not", (_wrap(arg),))
+
+
+def And(*args) -> Expr:
+    return Expr("and", tuple(_wrap(arg) for arg in args))
+
+
+def Or(*args) -> Expr:
+    return Expr("or", tuple(_wrap(arg) for arg in args))
+
+
+def Xor(*args) -> Expr:
+    return Expr("xor", tuple(_wrap(arg) for arg in args))
+
+
+def Eq(left, right) -> Expr:
+    return Expr("eq", (_wrap(left), _wrap(right)))
+
+
+def Ne(left, right) -> Expr:
+    return Expr("ne", (_wrap(left), _wrap(right)))
+
+
+def IfThenElse(condition, then_value, else_value) -> Expr:
+    return Expr("ite", (_wrap(condition), _wrap(then_value), _wrap(else_value)))
+
+
+def Lookup(keys: list, table: dict, default=None) -> Expr:
+    """
+    Table lookup on the values of one or more expressions
+    :param keys: list of expressions whose values index the table
+    :param table: dictionary mapping tuples of key values to output values
+    :param default: value for key combinations missing from the table, missing keys raise an error if None
+    """
+    keys = tuple(_wrap(key) for key in keys)
+    table = {tuple(k) if isinstance(k, tuple) else (k,): v for k, v in table.items()}
+    return Expr("lookup", (keys, table, default))
+
+
+def _wrap(value) -> Expr:
+    return value if isinstance(value, Expr) else Const(value)
+
+
+def _collect(expr: Expr, op: str) -> List[str]:
+    names = []
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if node.op == op and node.args[0] not in names:
+            names.append(node.args[0])
+        elif node.op == "lookup":
+            stack.extend(reversed(node.args[0]))
+        elif node.op not in ["var", "noise", "const"]:
+            stack.extend(reversed(node.args))
+    return names
+
+
+def _to_number(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _to_array(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+def _lookup_array(keys: list, table: dict, default):
+    """
+    Vectorized table lookup over arrays of key values
+    """
+    keys = np.broadcast_arrays(*keys)
+    out = None
+    matched = np.zeros(keys[0].shape, dtype=bool)
+    for key_values, value in table.items():
+        mask = np.ones(keys[0].shape, dtype=bool)
+        for key, key_value in zip(keys, key_values):
+            mask &= key == key_value
+        if out is None:
+            out = np.full(keys[0].shape, value if default is None else default)
+        out[mask] = value
+        matched |= mask
+    if default is None and not np.all(matched):
+        raise KeyError("Key values missing from lookup table.")
+    return out
+
+
+class _Compiler:
+    """
+    Generate the source code of a Python function from an expression
+    The "python" backend evaluates scalars with Python operators, and the "numpy" backend evaluates arrays with
+    vectorized NumPy operations
+    """
+
+    def __init__(self, expression: Expr, backend: str):
+        self.backend = backend
+        self.namespace = {"np": np, "_num": _to_number, "_arr": _to_array}
+        self.names = {}
+        self.lines = []
+        self.source = self.compile(expression)
+
+    def leaf(self, source: str, key):
+        if key not in self.names:
+            name = f"v{len(self.names)}"
+            self.names[key] = name
+            convert = "_num" if self.backend == "python" else "_arr"
+            self.lines.append(f"    {name} = {convert}({source})")
+        return self.names[key]
+
+    def truth(self, expr: Expr):
+        source = self.compile(expr)
+        if self.backend == "python" and not _is_bool_op(expr):
+            return f"bool({source})"
+        return source
+
+    def compile(self, expr: Expr) -> str:
+        op, args = expr.op, expr.args
+        numpy = self.backend == "numpy"
+        if op == "var":
+            return self.leaf(f"inputs[{args[0]!r}]", ("var", args[0]))
+        if op == "noise":
+            return self.leaf(f"noise[{args[0]!r}]", ("noise", args[0]))
+        if op == "const":
+            return repr(args[0])
+        if op == "not":
+            if numpy:
+                return f"np.logical_not({self.compile(args[0])})"
+            return f"(not {self.truth(args[0])})"
+        if op in ["and", "or", "xor"]:
+            if numpy:
+                function = f"np.logical_{op}"
+                source = self.compile(args[0])
+                for arg in args[1:]:
+                    source = f"{function}({source}, {self.compile(arg)})"
+                return source
+            if op == "xor":
+                source = self.truth(args[0])
+                for arg in args[1:]:
+                    source = f"({source} != {self.truth(arg)})"
+                return source
+            return "(" + f" {op} ".join(self.truth(arg) for arg in args) + ")"
+        if op in COMPARISON_OPS:
+            left, right = self.compile(args[0]), self.compile(args[1])
+            return f"({left} {COMPARISON_OPS[op]} {right})"
+        if op in ARITHMETIC_OPS:
+            left, right = self.compile(args[0]), self.compile(args[1])
+            return f"({left} {ARITHMETIC_OPS[op]} {right})"
+        if op == "ite":
+            condition = self.truth(args[0]) if not numpy else self.compile(args[0])
+            then_value, else_value = self.compile(args[1]), self.compile(args[2])
+            if numpy:
+                return f"np.where({condition}, {then_value}, {else_value})"
+            return f"({then_value} if {condition} else {else_value})"
+        if op == "lookup":
+            keys, table, default = args
+            if not table:
+                raise ValueError("Lookup tables must not be empty.")
+            name = f"_table{len(self.namespace)}"
+            self.namespace[name] = table
+            self.namespace[f"{name}_default"] = default
+            key_sources = [self.compile(key) for key in keys]
+            if numpy:
+                self.namespace["_lookup"] = _lookup_array
+                return f"_lookup([{', '.join(key_sources)}], {name}, {name}_default)"
+            key_tuple = "(" + "".join(f"{key}, " for key in key_sources) + ")"
+            if default is None:
+                return f"{name}[{key_tuple}]"
+            return f"{name}.get({key_tuple}, {name}_default)"
+        raise ValueError(f"Unknown operator '{op}'.")
+
+    def build(self):
+        source = "\n".join(
+            ["def _function(inputs, noise):"]
+            + self.lines
+            + [f"    return {self.source}"]
+        )
+        exec(compile(source, f"<expression:{self.backend}>", "exec"), self.namespace)
+        return self.namespace["_function"], source
+
+
+def _is_bool_op(expr: Expr) -> bool:
+    return expr.op in BOOLEAN_OPS or expr.op in COMPARISON_OPS
+
+
+class CNF:
+
+    def __init__(self):
+        """
+        Formula in conjunctive normal form with DIMACS-style literals
+        Atoms are a binary variable name, a (variable name, value) pair for the one-hot encoding of a non-binary
+        variable, or ("_aux", i) for auxiliary variables of the Tseitin transformation
+        """
+        self.atoms: Dict[Any, int] = {}
+        self.clauses: List[List[int]] = []
+        self.encoded_domains = set()
+        self.n_aux = 0
+
+    def atom(self, atom) -> int:
+        if atom not in self.atoms:
+            self.atoms[atom] = len(self.atoms) + 1
+        return self.atoms[atom]
+
+    def aux(self) -> int:
+        self.n_aux += 1
+        return self.atom(("_aux", self.n_aux))
+
+    def add_clause(self, clause: List[int]):
+        self.clauses.append(list(clause))
+
+    def value_literal(self, var_name: str, value, support: list) -> int:
+        """
+        Literal that is true iff the variable takes the given value
+        """
+        if list(support) == [0, 1]:
+            literal = self.atom(var_name)
+            return literal if value else -literal
+        if value not in support:
+            raise ValueError(f"Value {value} is not in the support of {var_name}.")
+        self.encode_domain(var_name, support)
+        return self.atom((var_name, value))
+
+    def encode_domain(self, var_name: str, support: list):
+        """
+        Add clauses for a non-binary variable to take exactly one value of its support
+        """
+        if var_name in self.encoded_domains:
+            return
+        self.encoded_domains.add(var_name)
+        literals = [self.atom((var_name, value)) for value in support]
+        self.add_clause(literals)
+        for a, b in itertools.combinations(literals, 2):
+            self.add_clause([-a, -b])
+
+    def to_dimacs(self) -> str:
+        lines = [f"p cnf {len(self.atoms)} {len(self.clauses)}"]
+        lines += [
+            " ".join(str(lit) for lit in clause) + " 0" for clause in self.clauses
+        ]
+        return "\n".join(lines)
+
+
+class ExpressionFunction(StructuralFunction):
+    def __init__(
+        self,
+        expression: Expr,
+        parents: Optional[List[str]] = None,
+        noise_dist: Optional["dist.Distribution"] = None,
+    ):
+        """
+        Structural function given by an expression instead of a Python callable
+        The expression is compiled once to a scalar Python function, used like any other structural function,
+        and to a vectorized NumPy function used for batched inputs. Expressions can also be converted to truth
+        tables and CNF for engines that cannot trace Python code
+        :param expression: Expr
+        :param parents: list of parent variables, defaults to the variables used in the expression
+        :param noise_dist: distribution of the exogenous noise
+        """
+        used_vars = expression.variables()
+        parents = used_vars if parents is None else list(parents)
+        missing_parents = [var for var in used_vars if var not in parents]
+        if missing_parents:
+            raise ValueError(
+                f"Variables {missing_parents} are used in the expression but are not parents."
+            )
+        self.expression = expression
+        self.python_function, self.python_source = _Compiler(
+            expression, "python"
+        ).build()
+        self.numpy_function, self.numpy_source = _Compiler(expression, "numpy").build()
+        super().__init__(self.evaluate_scalar, parents, noise_dist)
+
+    def evaluate_scalar(self, inputs, noise=None):
+        value = self.python_function(inputs, noise)
+        return torch.tensor(int(value) if isinstance(value, bool) else value)
+
+    def evaluate(self, inputs, noise=None):
+        """
+        Evaluate the expression on scalar or batched inputs
+        """
+        self._check_parents(inputs)
+        batched = any(
+            getattr(value, "ndim", 0) > 0
+            for values in [inputs, noise or {}]
+            for value in values.values()
+        )
+        if batched:
+            return torch.as_tensor(self.evaluate_batch(inputs, noise))
+        return self.evaluate_scalar(inputs, noise)
+
+    def evaluate_batch(self, inputs: Dict[str, Any], noise: Dict[str, Any] = None):
+        """
+        Evaluate the expression on arrays of inputs with vectorized NumPy operations
+        :param inputs: dictionary of arrays or tensors of parent values
+        :param noise: dictionary of arrays or tensors of noise values
+        :return: np.ndarray of outputs, with booleans converted to integers
+        """
+        value = np.asarray(self.numpy_function(inputs, noise))
+        return value.astype(np.int64) if value.dtype == bool else value
+
+    def truth_table(self, supports: Dict[str, list]) -> Dict[tuple, Any]:
+        """
+        Evaluate the expression on every combination of parent values
+        :param supports: dictionary of the supports of the parents
+        :return: dictionary mapping tuples of parent values, in the order of the parents, to outputs
+        """
+        if self.expression.noise_variables():
+            raise ValueError("Truth tables are only defined for noiseless expressions.")
+        rows = list(itertools.product(*[supports[var] for var in self.parents]))
+        if not self.parents:
+            return {(): self.evaluate_batch({}, {}).item()}
+        columns = np.array(rows).T
+        inputs = {var: columns[i] for i, var in enumerate(self.parents)}
+        outputs = np.broadcast_to(self.evaluate_batch(inputs, {}), (len(rows),))
+        return {row: output.item() for row, output in zip(rows, outputs)}
+
+    def to_cnf(self, var_name: str, supports: Dict[str, list], cnf: CNF = None):
+        """
+        Encode the constraint var_name = expression in conjunctive normal form
+        Boolean expressions over binary variables use the Tseitin transformation, and all other expressions are
+        encoded row by row from their truth table over one-hot encoded variables
+        :param var_name: name of the variable defined by the expression
+        :param supports: dictionary of the supports of the variable and its parents
+        :param cnf: CNF to add the clauses to, so that a whole model can be encoded into one formula
+        :return: CNF
+        """
+        cnf = CNF() if cnf is None else cnf
+        output_support = supports[var_name]
+        if list(output_support) == [0, 1] and self.expression.is_boolean(supports):
+            output = cnf.atom(var_name)
+            literal = _tseitin(self.expression, supports, cnf)
+            cnf.add_clause([-output, literal])
+            cnf.add_clause([output, -literal])
+            return cnf
+
+        for row, value in self.truth_table(supports).items():
+            if value not in output_support:
+                raise ValueError(
+                    f"Expression for {var_name} gives {value} outside of its support for parents {row}."
+                )
+            clause = [
+                -cnf.value_literal(var, parent_value, supports[var])
+                for var, parent_value in zip(self.parents, row)
+            ]
+            clause.append(cnf.value_literal(var_name, value, output_support))
+            cnf.add_clause(clause)
+        return cnf
+
+    def __deepcopy__(self, memo):
+        # Expression functions are immutable, so resetting the model does not need to copy them
+        return self
+
+    def __repr__(self):
+        return (
+            f"ExpressionFunction({self.expression}, {self.parents}, {self.noise_dist})"
+        )
+
+
+def _tseitin(expr: Expr, supports: Dict[str, list], cnf: CNF) -> int:
+    """
+    Tseitin transformation of a boolean expression
+    :return: literal that is equivalent to the expression under the clauses added to the CNF
+    """
+    op, args = expr.op, expr.args
+    if op == "var":
+        return cnf.atom(args[0])
+    if op == "const":
+        literal = cnf.aux()
+        cnf.add_clause([literal if args[0] else -literal])
+        return literal
+    if op == "not":
+        return -_tseitin(args[0], supports, cnf)
+    if op in ["eq", "ne"]:
+        literal = _tseitin(Expr("xor", args), supports, cnf)
+        return -literal if op == "eq" else literal
+
+    literals = [_tseitin(arg, supports, cnf) for arg in args]
+    output = cnf.aux()
+    if op == "and":
+        for literal in literals:
+            cnf.add_clause([-output, literal])
+        cnf.add_clause([output] + [-literal for literal in literals])
+    elif op == "or":
+        for literal in literals:
+            cnf.add_clause([output, -literal])
+        cnf.add_clause([-output] + literals)
+    elif op == "xor":
+        if len(literals) == 1:
+            cnf.add_clause([-output, literals[0]])
+            cnf.add_clause([output, -literals[0]])
+        a = literals[0]
+        for i, b in enumerate(literals[1:], start=2):
+            t = output if i == len(literals) else cnf.aux()
+            cnf.add_clause([-t, a, b])
+            cnf.add_clause([-t, -a, -b])
+            cnf.add_clause([t, -a, b])
+            cnf.add_clause([t, a, -b])
+            a = t
+    elif op == "ite":
+        c, a, b = literals
+        cnf.add_clause([-output, -c, a])
+        cnf.add_clause([-output, c, b])
+        cnf.add_clause([output, -c, -a])
+        cnf.add_clause([output, c, -b])
+    else:
+        raise ValueError(f"Operator '{op}' is not boolean.")
+    return output
@@ -0,0 +1,116 @@
+from typing import List, Optional, Union
+import numpy as np
+import torch
+
+
+class CategoricalNoise:
+
+    has_enumerate_support = True
+
+    def __init__(
+        self,
+        name: str,
+        support: List[Union[int, float]],
+        probs: Optional[List[float]] = None,
+        seed: Optional[int] = None,
+    ):
+        """
+        Exogenous noise with a finite support and exact probabilities
+        Samples are drawn in vectorized batches, and the support can be enumerated exactly, so that solvers can
+        iterate over all noise configurations and weight them by their probabilities
+        :param name: name of the noise variable
+        :param support: list of values the noise can take
+        :param probs: probability of each value in the support, defaults to uniform
+        :param seed: optional seed for a generator owned by this noise, otherwise the global NumPy generator is used
+        """
+        if len(support) == 0:
+            raise ValueError(f"Support of noise '{name}' must be non-empty.")
+        if len(set(support)) != len(support):
+            raise ValueError(f"Support of noise '{name}' has repeated values.")
+        if probs is None:
+            probs = np.full(len(support), 1 / len(support))
+        probs = np.asarray(probs, dtype=np.float64)
+        if probs.shape != (len(support),):
+            raise ValueError(
+                f"Noise '{name}' has {len(support)} values but {probs.shape[0]} probabilities."
+            )
+        if np.any(probs < 0) or not np.isclose(probs.sum(), 1.0):
+            raise ValueError(
+                f"Probabilities of noise '{name}' must be non-negative and sum to 1, {probs} given."
+            )
+        self.name = name
+        self.support = list(support)
+        self.probs = probs / probs.sum()
+        self.values = np.asarray(self.support)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed) if seed is not None else None
+
+    def sample_batch(self, n: int, rng: Optional[np.random.Generator] = None):
+        """
+        Draw a batch of samples with a single generator call
+        :param n: number of samples
+        :param rng: np.random.Generator to draw from, defaults to the generator of the noise or the global one
+        :return: np.ndarray of n values from the support
+        """
+        if rng is None:
+            rng = self.rng if self.rng is not None else np.random
+        return self.values[rng.choice(len(self.support), size=n, p=self.probs)]
+
+    def sample(self, sample_shape=(), rng: Optional[np.random.Generator] = None):
+        """
+        Draw samples as a tensor, with the same interface as the sample method of torch distributions
+        :param sample_shape: shape of the samples, () for a single value
+        :param rng: np.random.Generator to draw from
+        :return: torch.Tensor of values from the support
+        """
+        sample_shape = tuple(sample_shape)
+        n = int(np.prod(sample_shape)) if sample_shape else 1
+        samples = self.sample_batch(n, rng).reshape(sample_shape)
+        return torch.as_tensor(samples)
+
+    def enumerate_support(self):
+        """
+        Get all values the noise can take
+        :return: list of values
+        """
+        return list(self.support)
+
+    def prob(self, value) -> float:
+        """
+        Get the probability of a value, which is 0 for values outside of the support
+        """
+        value = value.item() if hasattr(value, "item") else value
+        if value not in self.support:
+            return 0.0
+        return float(self.probs[self.support.index(value)])
+
+    def log_prob(self, value) -> torch.Tensor:
+        values = torch.as_tensor(value)
+        probs = [self.prob(v) for v in values.reshape(-1).tolist()]
+        return torch.log(torch.tensor(probs, dtype=torch.float64)).reshape(values.shape)
+
+    def items(self):
+        """
+        Get pairs of values and their probabilities
+        :return: list of (value, probability) tuples
+        """
+        return list(zip(self.support, self.probs.tolist()))
+
+    def __deepcopy__(self, memo):
+        # Noise objects are immutable, and copying the generator on every model reset would replay its samples
+        return self
+
+    def __repr__(self):
+        return f"CategoricalNoise({self.name}, {self.support}, {self.probs.tolist()})"
+
+
+class BernoulliNoise(CategoricalNoise):
+
+    def __init__(self, name: str, p: float = 0.5, seed: Optional[int] = None):
+        """
+        Binary exogenous noise that is 1 with probability p
+        :param name: name of the noise variable
+        :param p: probability of 1
+        :param seed: optional seed for a generator owned by this noise
+        """
+        super().__init__(name, [0, 1], [1 - p, p], seed)
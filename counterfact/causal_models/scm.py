@@ -1,8 +1,13 @@
-from typing import Any, Callable, Dict, List, Union, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Union, Optional
 import copy
 import torch
-import pyro.distributions as dist
 import networkx as nx
+from counterfact.causal_models.state import State
+from counterfact.utils.instrumentation import instrumentation
+
+# pyro is only used for type annotations, models that use pyro distributions import it themselves
+if TYPE_CHECKING:
+    import pyro.distributions as dist
 
 
 class StructuralFunction:
@@ -12,7 +17,7 @@ class StructuralFunction:
             [Dict[str, torch.Tensor], Optional[Dict[str, torch.Tensor]]], torch.Tensor
         ],
         parents: List[str],
-        noise_dist: Optional[dist.Distribution] = None,
+        noise_dist: Optional["dist.Distribution"] = None,
     ):
         self.function = function
         self.noise_dist = noise_dist
@@ -37,6 +42,34 @@ class StructuralFunction:
         self._check_parents(inputs)
         return self.function(inputs, noise)
 
+    def evaluate_samples(
+        self,
+        inputs: Dict[str, torch.Tensor],
+        noise: Dict[str, torch.Tensor],
+        n_samples: int,
+    ) -> torch.Tensor:
+        """
+        Evaluate the structural function on a batch of inputs and noise stacked along the first dimension
+        Functions that cannot handle batches, such as those using Python control flow on their inputs, are
+        evaluated one sample at a time
+        :return: tensor of n_samples outputs
+        """
+        try:
+            output = torch.as_tensor(self.evaluate(inputs, noise))
+            if output.shape == (n_samples,):
+                return output
+            if output.dim() == 0:
+                return output.expand(n_samples).clone()
+        except (RuntimeError, TypeError, ValueError):
+            pass
+
+        outputs = []
+        for i in range(n_samples):
+            sample_inputs = {parent: values[i] for parent, values in inputs.items()}
+            sample_noise = {var: values[i] for var, values in noise.items()}
+            outputs.append(torch.as_tensor(self.evaluate(sample_inputs, sample_noise)))
+        return torch.stack(outputs)
+
     def _check_parents(self, inputs: Dict[str, torch.Tensor]):
         """
         Ensure all required parents are present in the inputs.
@@ -124,6 +157,8 @@ class StructuralCausalModel:
         """
         Reset the SCM to its original state
         """
+        if instrumentation.enabled:
+            instrumentation.count("reset")
         self.interventions.clear()
         self.structural_functions = copy.deepcopy(self.original_functions)
         self.causal_graph = copy.deepcopy(self.original_graph)
@@ -142,6 +177,9 @@ class StructuralCausalModel:
         :param value: Intervened value
         :return: None
         """
+        if instrumentation.enabled:
+            instrumentation.count("do", var_name)
+
         # Check if intervened value is in the support of the variable
         self.validate_intervention(
             var_name, self.variables[var_name]["var_type"], value
@@ -210,6 +248,8 @@ class StructuralCausalModel:
                     noise_dist.sample() if noise_dist else torch.tensor(torch.nan)
                 )
 
+            if instrumentation.enabled:
+                instrumentation.count("evaluate", var_name)
             return self.structural_functions[var_name].evaluate(inputs={}, noise=noise)
 
         # Recursive case: evaluate the structural function for the variable
@@ -231,29 +271,54 @@ class StructuralCausalModel:
             )
 
         # Calculate the value of the given variable
+        if instrumentation.enabled:
+            instrumentation.count("evaluate", var_name)
         output = self.structural_functions[var_name].evaluate(inputs, noise)
         return output
 
-    def sample(self, n_samples: int):
+    def sample(
+        self,
+        n_samples: int,
+        noise: Optional[Dict[str, torch.Tensor]] = None,
+        return_noise: bool = False,
+        intervention: Optional[Dict[str, Any]] = None,
+    ):
         """
         Sample from the SCM
+        Structural functions are evaluated on whole batches of parent values and noise. Functions that cannot
+        handle batches, such as those using Python control flow on their inputs, are evaluated one sample at a time
+        Like query, sampling does not change the SCM, so counterfactual worlds are sampled by passing the
+        intervention instead of intervening on the SCM
         :param n_samples: Number of samples to generate
-        :return: List of samples
+        :param noise: optional dictionary of noise batches of length n_samples, missing noise is sampled, which
+        allows factual and counterfactual worlds to be sampled with shared noise
+        :param return_noise: also return the noise used for every variable
+        :param intervention: optional dictionary of intervened values, applied on top of the interventions of the SCM
+        :return: dictionary of tensors of samples for every variable, and the dictionary of noise if return_noise
         """
+        if intervention is None:
+            intervention = {}
+        for var_name, value in intervention.items():
+            if var_name not in self.variables:
+                raise ValueError(f"Variable {var_name} not found.")
+            self.validate_intervention(
+                var_name, self.variables[var_name]["var_type"], value
+            )
 
         samples = {var: torch.empty(n_samples) for var in self.variables}
-        noise = {}
+        noise = dict(noise) if noise is not None else {}
 
         for var_name in self.topological_order:
 
-            # Use intervention value if present
-            if var_name in self.interventions:
+            # Use the intervened value if the variable is intervened on in the call or in the SCM
+            if var_name in intervention or var_name in self.interventions:
+                value = intervention.get(var_name, self.interventions.get(var_name))
                 value = (
-                    torch.tensor(self.interventions[var_name])
-                    if not isinstance(self.interventions[var_name], torch.Tensor)
+                    torch.tensor(value)
+                    if not isinstance(value, torch.Tensor)
                     else value
                 )
-                samples[var_name].fill_(value)
+                samples[var_name] = value.expand(n_samples).clone()
                 continue
 
             # Gather parent values as tensors
@@ -269,20 +334,130 @@ class StructuralCausalModel:
                 )
 
             # Evaluate the structural function
-            output = self.structural_functions[var_name].evaluate(parent_values, noise)
-            samples[var_name] = output
+            if instrumentation.enabled:
+                instrumentation.count("evaluate", var_name)
+            samples[var_name] = self.structural_functions[var_name].evaluate_samples(
+                parent_values, noise, n_samples
+            )
 
+        if return_noise:
+            return samples, noise
         return samples
 
     def get_state(
         self, noise: Optional[Dict[str, torch.Tensor]] = None
     ) -> Dict[str, torch.Tensor]:
 
+        if instrumentation.enabled:
+            instrumentation.count("get_state")
         state = {}
         for var_name in self.topological_order:
             state[var_name] = self.evaluate(var_name, state, noise)
         return state
 
+    def query(
+        self,
+        intervention: Optional[Dict[str, Any]] = None,
+        noise: Optional[Dict[str, torch.Tensor]] = None,
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Get the state of the SCM under an intervention without changing the SCM
+        Unlike do, intervene and reset, a query only reads the structural functions and interventions of the SCM,
+        and it does not add sampled noise to the given noise, so one SCM that is not intervened on can be queried
+        by many threads or tasks at the same time
+        :param intervention: dictionary of intervened values, applied on top of the interventions of the SCM
+        :param noise: dictionary of values of all exogenous noise variables, missing noise is sampled
+        :return: dictionary of values of all variables
+        """
+        if intervention is None:
+            intervention = {}
+        for var_name, value in intervention.items():
+            if var_name not in self.variables:
+                raise ValueError(f"Variable {var_name} not found.")
+            self.validate_intervention(
+                var_name, self.variables[var_name]["var_type"], value
+            )
+        noise = dict(noise) if noise is not None else {}
+
+        if instrumentation.enabled:
+            instrumentation.count("query")
+        state = {}
+        for var_name in self.topological_order:
+
+            # Use the intervened value if the variable is intervened on in the query or in the SCM
+            # Values that tensors cannot hold, such as strings in discrete supports, are kept as they are
+            if var_name in intervention or var_name in self.interventions:
+                value = intervention.get(var_name, self.interventions.get(var_name))
+                state[var_name] = (
+                    torch.tensor(value)
+                    if not isinstance(value, (torch.Tensor, str))
+                    else value
+                )
+                continue
+
+            # Sample noise for the variable if there is a noise distribution but a noise sample is not given
+            structural_function = self.structural_functions[var_name]
+            if var_name not in noise:
+                noise_dist = structural_function.noise_dist
+                noise[var_name] = (
+                    noise_dist.sample() if noise_dist else torch.tensor(torch.nan)
+                )
+
+            if instrumentation.enabled:
+                instrumentation.count("evaluate", var_name)
+            state[var_name] = structural_function.evaluate(
+                {parent: state[parent] for parent in structural_function.parents}, noise
+            )
+        return state
+
+    def get_compact_state(
+        self, noise: Optional[Dict[str, torch.Tensor]] = None
+    ) -> State:
+        """
+        Get the state of the SCM as a compact State, with variables in topological order
+        :param noise: dictionary of values of all exogenous noise variables
+        :return: State
+        """
+        return State.from_dict(self.get_state(noise), self.topological_order)
+
+    def get_parents(self, var_name: str) -> List[str]:
+        """
+        Get the parents of a variable in the original (non-intervened) model
+        :param var_name: Name of the variable
+        :return: List of parent variable names
+        """
+        if var_name not in self.original_functions:
+            return []
+        return list(self.original_functions[var_name].parents)
+
+    def get_children(self, var_name: str) -> List[str]:
+        """
+        Get the children of a variable in the original (non-intervened) model
+        :param var_name: Name of the variable
+        :return: List of child variable names in topological order
+        """
+        return [
+            child
+            for child in self.topological_order
+            if var_name in self.get_parents(child)
+        ]
+
+    def get_support_values(self, var_name: str) -> List[Any]:
+        """
+        Enumerate all values in the support of a variable with finite support
+        :param var_name: Name of the variable
+        :return: List of values
+        """
+        var_type = self.variables[var_name].var_type
+        var_support = self.variables[var_name].support
+        if var_type == "int":
+            return list(range(var_support[0], var_support[1] + 1))
+        elif var_type in ["bool", "discrete"]:
+            return list(var_support)
+        raise ValueError(
+            f"Variable {var_name} of type {var_type} does not have a finite support."
+        )
+
     def validate_support(self, name, var_type, support):
         if var_type == "bool":
             if not isinstance(support, list) or len(support) != 2:
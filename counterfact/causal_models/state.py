@@ -0,0 +1,165 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Union
+import numpy as np
+
+
+class State:
+    """
+    Compact, immutable state of a discrete SCM
+    Values are stored in a NumPy integer array with one slot per variable, and the mapping from variables to slots
+    is shared by all states over the same variables. Reading a value returns a Python int, so the state can be
+    used anywhere a dict of values is read, while comparisons and hashing work on the array as a whole
+    States with values that are not integers, such as strings or fractional supports of discrete variables, are
+    stored in an object array instead, which keeps the same interface without the integer fast path
+    """
+
+    __slots__ = ("variables", "index", "array")
+
+    def __init__(self, variables: List[str], values):
+        """
+        :param variables: variable names, in the order of their slots
+        :param values: values of the variables, in the same order
+        """
+        variables = tuple(variables)
+        values = _to_array(values)
+        if values.shape != (len(variables),):
+            raise ValueError(
+                f"Expected {len(variables)} values for variables {variables}, got shape {values.shape}."
+            )
+        values.flags.writeable = False
+        self.variables = variables
+        self.index = _get_index(variables)
+        self.array = values
+
+    @classmethod
+    def from_dict(cls, state: Union[dict, "State"], variables: List[str] = None):
+        """
+        Build a compact state from a dictionary of values
+        :param state: dictionary of values of all observable variables, values may be tensors, arrays or numbers
+        :param variables: optional order of the variables, defaults to the order of the dictionary
+        :return: State
+        """
+        if isinstance(state, State) and (
+            variables is None or tuple(variables) == state.variables
+        ):
+            return state
+        variables = list(state.keys()) if variables is None else variables
+        return cls(variables, [_to_number(state[var]) for var in variables])
+
+    def select(self, var_names) -> np.ndarray:
+        """
+        Get the values of a set of variables as an array
+        :param var_names: iterable of variable names
+        :return: array of values in the order of the given variables
+        """
+        return self.array[[self.index[var] for var in var_names]]
+
+    def mismatches(self, assignment: Union[dict, "State"]) -> List[str]:
+        """
+        Find the variables whose values in the state differ from the given assignment
+        :param assignment: dictionary of values of a set of variables, or another State
+        :return: list of variable names, in the order of the assignment
+        """
+        var_names = list(assignment.keys())
+        if not var_names:
+            return []
+        if isinstance(assignment, State):
+            other = assignment.array
+        else:
+            other = _to_array(list(assignment.values()))
+        different = self.select(var_names) != other
+        return [var for var, diff in zip(var_names, different) if diff]
+
+    def matches(self, assignment: Union[dict, "State"]) -> bool:
+        """
+        Check if the state agrees with the given assignment on all of its variables
+        :param assignment: dictionary of values of a set of variables, or another State
+        :return: bool
+        """
+        var_names = list(assignment.keys())
+        if not var_names:
+            return True
+        if isinstance(assignment, State):
+            other = assignment.array
+        else:
+            other = _to_array(list(assignment.values()))
+        return bool(np.array_equal(self.select(var_names), other))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self.variables, self.array.tolist()))
+
+    def keys(self):
+        return self.variables
+
+    def values(self):
+        return self.array.tolist()
+
+    def items(self):
+        return zip(self.variables, self.array.tolist())
+
+    def get(self, var_name: str, default: Any = None):
+        if var_name in self.index:
+            return self[var_name]
+        return default
+
+    def __getitem__(self, var_name: str):
+        return self.array.item(self.index[var_name])
+
+    def __contains__(self, var_name: str) -> bool:
+        return var_name in self.index
+
+    def __iter__(self):
+        return iter(self.variables)
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, State):
+            return self.variables == other.variables and bool(
+                np.array_equal(self.array, other.array)
+            )
+        if isinstance(other, dict):
+            return set(other.keys()) == set(self.variables) and self.matches(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        if self.array.dtype == object:
+            return hash((self.variables, tuple(self.array.tolist())))
+        return hash((self.variables, self.array.tobytes()))
+
+    def __repr__(self):
+        return f"State({self.to_dict()})"
+
+
+@lru_cache(maxsize=1024)
+def _get_index(variables: tuple) -> Dict[str, int]:
+    """
+    Get the variable to slot mapping shared by all states over the same variables
+    The number of mappings is bounded, so a long running process that sees many models does not keep all of them
+    """
+    return {var: i for i, var in enumerate(variables)}
+
+
+def _to_array(values) -> np.ndarray:
+    """
+    Convert values to an int64 array if they are all integers, and to an object array otherwise
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iub":
+        return values.astype(np.int64)
+    values = [_to_number(value) for value in values]
+    array = np.asarray(values)
+    if array.ndim == 1 and array.dtype.kind in "iub":
+        return array.astype(np.int64)
+    if array.ndim == 1 and array.dtype.kind == "f" and np.all(np.mod(array, 1) == 0):
+        return array.astype(np.int64)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _to_number(value):
+    """
+    Convert a tensor, array or Python number to a Python number
+    """
+    return value.item() if hasattr(value, "item") else value
@@ -0,0 +1,170 @@
+from typing import Dict, List, Optional
+import numpy as np
+import torch
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.utils.instrumentation import instrumentation
+
+
+class TwinNetwork:
+
+    def __init__(self, env: StructuralCausalModel, batch_size: int = 256):
+        """
+        Evaluate the factual world and any number of counterfactual copies of it under the same noise in a single
+        pass over the topological order, without intervening on and resetting the model for every counterfactual
+        Counterfactual copies are stacked along a batch dimension. A copy only evaluates a variable if it is
+        intervened on or one of its parents differs from the factual world, otherwise it shares the factual value
+        :param env: StructuralCausalModel, interventions already applied to it are part of the factual world
+        :param batch_size: maximum number of counterfactual copies evaluated in one pass
+        """
+        self.env = env
+        self.batch_size = batch_size
+
+    def evaluate(
+        self,
+        interventions: List[dict],
+        noise: Optional[Dict[str, torch.Tensor]] = None,
+        factual: Optional[Dict[str, torch.Tensor]] = None,
+    ):
+        """
+        Evaluate one counterfactual copy of the model for every intervention
+        :param interventions: list of dictionaries of intervened values, one per counterfactual copy
+        :param noise: dictionary of values of all exogenous noise variables, missing noise is sampled and added to
+        the dictionary so that it is shared by all copies
+        :param factual: state of the factual world under the same noise, evaluated if not given
+        :return: factual: dictionary of values of all variables in the factual world
+        :return: counterfactuals: dictionary of tensors of values of all variables with one entry per copy
+        """
+        if noise is None:
+            noise = {}
+        if factual is None:
+            factual = self.env.get_state(noise)
+        n_copies = len(interventions)
+        if instrumentation.enabled:
+            instrumentation.count("twin_network_copies", n=n_copies)
+
+        # Share the noise between all copies, so any subset of copies sees the same noise expanded to its size
+        noise = {var: torch.as_tensor(value) for var, value in noise.items()}
+        copy_noise = {}
+
+        counterfactuals = {}
+        changed = {}
+        for var_name in self.env.topological_order:
+            factual_value = torch.as_tensor(factual[var_name])
+            values = factual_value.expand(n_copies)
+
+            # Copies in which the variable is intervened on take the intervened value
+            intervened = np.array(
+                [var_name in intervention for intervention in interventions],
+                dtype=bool,
+            )
+            if intervened.any():
+                rows = np.flatnonzero(intervened)
+                values = _assign(
+                    values,
+                    rows,
+                    torch.tensor(
+                        [_to_python(interventions[i][var_name]) for i in rows]
+                    ),
+                )
+
+            # Copies in which a parent differs from the factual world evaluate the structural function
+            structural_function = self.env.structural_functions[var_name]
+            parents_changed = np.zeros(n_copies, dtype=bool)
+            for parent in structural_function.parents:
+                parents_changed |= changed[parent]
+            evaluated = parents_changed & ~intervened
+            if evaluated.any():
+                rows = np.flatnonzero(evaluated)
+                if instrumentation.enabled:
+                    instrumentation.count("evaluate", var_name, n=len(rows))
+                output = structural_function.evaluate_samples(
+                    {
+                        parent: counterfactuals[parent][rows]
+                        for parent in structural_function.parents
+                    },
+                    _expand_noise(noise, copy_noise, len(rows)),
+                    len(rows),
+                )
+                values = _assign(values, rows, output)
+
+            # Variables that are equal to their factual value are shared with the factual world by descendants
+            counterfactuals[var_name] = values
+            if intervened.any() or evaluated.any():
+                changed[var_name] = (values != factual_value).numpy()
+            else:
+                changed[var_name] = np.zeros(n_copies, dtype=bool)
+
+        return factual, counterfactuals
+
+    def first_mismatch(
+        self,
+        interventions: List[dict],
+        outcome: dict,
+        noise: Optional[Dict[str, torch.Tensor]] = None,
+    ):
+        """
+        Find the first intervention under which the outcome does not hold, evaluating the copies in batches of
+        doubling size up to batch_size and stopping at the first batch that contains a mismatch
+        :param interventions: list of dictionaries of intervened values, one per counterfactual copy
+        :param outcome: dictionary of values of the outcome variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :return: index: index of the first intervention under which the outcome does not hold, None if it always
+        holds
+        :return: alt_state: state of the counterfactual copy at that index, None if the outcome always holds
+        """
+        noise = dict(noise) if noise is not None else {}
+        factual = self.env.get_state(noise)
+        start, size = 0, 1
+        while start < len(interventions):
+            batch = interventions[start : start + size]
+            _, counterfactuals = self.evaluate(batch, noise, factual)
+            mismatches = np.flatnonzero(~self.matches(counterfactuals, outcome))
+            if len(mismatches) > 0:
+                index = int(mismatches[0])
+                return start + index, self.get_state(counterfactuals, index)
+            start, size = start + size, min(2 * size, self.batch_size)
+        return None, None
+
+    @staticmethod
+    def matches(counterfactuals: Dict[str, torch.Tensor], assignment: dict):
+        """
+        Boolean array of the counterfactual copies that agree with the assignment on all of its variables
+        """
+        n_copies = len(next(iter(counterfactuals.values())))
+        matches = np.ones(n_copies, dtype=bool)
+        for var, value in assignment.items():
+            matches &= (counterfactuals[var] == _to_python(value)).numpy()
+        return matches
+
+    @staticmethod
+    def get_state(counterfactuals: Dict[str, torch.Tensor], index: int):
+        """
+        Get the state of a single counterfactual copy
+        """
+        return {var: values[index] for var, values in counterfactuals.items()}
+
+
+def _expand_noise(noise: dict, copy_noise: dict, n_copies: int) -> dict:
+    """
+    Expand the shared noise to a number of copies, caching the result for every number of copies
+    """
+    if n_copies not in copy_noise:
+        copy_noise[n_copies] = {
+            var: value.expand(n_copies) for var, value in noise.items()
+        }
+    return copy_noise[n_copies]
+
+
+def _to_python(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _assign(values: torch.Tensor, rows, new_values: torch.Tensor) -> torch.Tensor:
+    """
+    Write new values into a copy of some rows, promoting the dtype if the new values do not fit
+    """
+    new_values = torch.as_tensor(new_values)
+    dtype = torch.promote_types(values.dtype, new_values.dtype)
+    values = values.to(dtype, copy=True)
+    values[torch.as_tensor(rows)] = new_values.to(dtype)
+    return values
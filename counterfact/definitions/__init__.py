@@ -1,7 +1,15 @@
-from counterfact.definitions.ac_definition import *
-from counterfact.definitions.direct_ac import *
-from counterfact.definitions.functional_ac import *
-from counterfact.definitions.modified_hp import *
-from counterfact.definitions.original_hp import *
-from counterfact.definitions.strong_ac import *
-from counterfact.definitions.updated_hp import *
+from counterfact.utils.lazy import attach
+
+# Definitions are imported on first use, so that using one definition does not import all of the others
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "ac_definition": ["ACDefinition"],
+        "direct_ac": ["DirectActualCause"],
+        "functional_ac": ["FunctionalActualCause"],
+        "modified_hp": ["ModifiedHP"],
+        "original_hp": ["OriginalHP"],
+        "strong_ac": ["StrongActualCause"],
+        "updated_hp": ["UpdatedHP"],
+    },
+)
@@ -1,12 +1,28 @@
 from counterfact.causal_models.scm import StructuralCausalModel
-from counterfact.utils import *
+from counterfact.causal_models.state import State
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.utils import add_info
+from counterfact.utils.search_order import RandomSearchOrder, SearchOrder
+from counterfact.utils.subsets import get_all_subevents
+from counterfact.utils.witness_store import WitnessStore
+from counterfact.utils.instrumentation import instrumentation
 import numpy as np
 
 
 class ACDefinition:
 
-    def __init__(self):
-        pass
+    # Whether an alternative event violates sufficiency iff the outcome does not hold under it and the witness,
+    # which find_alt_event needs to prune alternative events and evaluate all witness sets in one twin network pass
+    outcome_sufficiency = False
+
+    def __init__(self, search_order: SearchOrder = None):
+        """
+        :param search_order: strategy for the order in which alternative assignments and witness sets are tried,
+        defaults to a random order
+        """
+        self.search_order = (
+            search_order if search_order is not None else RandomSearchOrder()
+        )
 
     def is_factual(
         self,
@@ -30,20 +46,12 @@ class ACDefinition:
         :return: info: dict with additional info about the factuality test
         """
         info = {}
-        factual = True
-        incorrect_events = {}
-        incorrect_outcomes = {}
-
-        # Check if the event and outcome are factual
-        for var, value in event.items():
-            if state[var] != value:
-                incorrect_events[var] = event[var]
-                factual = False
-                print(f"{var} not factual")
-        for var, value in outcome.items():
-            if state[var] != value:
-                incorrect_outcomes[var] = outcome[var]
-                factual = False
+
+        # Check if the event and outcome are factual by comparing their values with the compact state at once
+        state = State.from_dict(state)
+        incorrect_events = {var: event[var] for var in state.mismatches(event)}
+        incorrect_outcomes = {var: outcome[var] for var in state.mismatches(outcome)}
+        factual = not incorrect_events and not incorrect_outcomes
 
         # Report any incorrect events or outcomes
         if incorrect_events:
@@ -116,42 +124,462 @@ class ACDefinition:
         :param outcome: dictionary of values of the outcome variables
         :param state: dictionary of values of all observable variables
         :param noise: dictionary of values of all exogenous noise variables
-        :param kwargs: additional arguments needed for the particular definition
+        :param kwargs: additional arguments needed for the particular definition, subevent_table is an optional
+        SubeventTable with results of events that were already checked, which are looked up instead of checking
+        the subevents again, and which new results are added to
         :return: answer: bool indicating whether the event is a minimal actual cause
         :return: info: dict with any additional info about the minimality test
         """
 
         info = {}
 
-        # Save the current state of the model
-        env.original_graph = env.causal_graph.copy()
-        env.original_functions = env.structural_functions.copy()
-
         # Base case: singleton event
         if len(event.keys()) == 1:
             return True, info
 
-        # Find all possible subsets of the set of variables in the event
+        # Check all proper subsets of the set of variables in the event, largest first
         all_subevents = get_all_subevents(event, reverse=True)
+        subevent_table = kwargs.get("subevent_table")
         for subevent in all_subevents:
 
-            # Reset the effect of prior interventions
-            env.reset()
+            # Use the result of the subevent if it was already checked
+            smaller_cause = None
+            if subevent_table is not None:
+                smaller_cause = subevent_table.get(subevent, outcome, state, noise)
+                if smaller_cause is not None and instrumentation.enabled:
+                    instrumentation.count("subevent_table_hits")
 
-            subevent_is_necessary, _ = self.is_necessary(
-                env, subevent, outcome, state, noise
-            )
-            subevent_is_sufficient, _ = self.is_sufficient(
-                env, subevent, outcome, state, noise
-            )
-            if subevent_is_necessary and subevent_is_sufficient:
+            if smaller_cause is None:
+                subevent_is_necessary, _ = self.is_necessary(
+                    env, subevent, outcome, state, noise
+                )
+                subevent_is_sufficient, _ = self.is_sufficient(
+                    env, subevent, outcome, state, noise
+                )
+                smaller_cause = subevent_is_necessary and subevent_is_sufficient
+                if subevent_table is not None:
+                    subevent_table.add(subevent, outcome, state, noise, smaller_cause)
+
+            if smaller_cause:
                 info = {"ac3_smaller_cause": subevent}
-                env.reset()
                 return False, info
 
-        env.reset()
         return True, info
 
+    def find_alt_event(
+        self,
+        env: StructuralCausalModel,
+        event: dict,
+        outcome: dict,
+        state: dict,
+        noise,
+        info: dict,
+        **kwargs,
+    ):
+        """
+        Search for an alternative event and witness under which the event is not sufficient for the outcome
+        This is the contrastive necessity search shared by the definitions, which differ in is_sufficient. The
+        but-for matrix, the witness store and the twin network are tried first if they are given, followed by the
+        enumeration of all alternative events and witness sets in the order of the search order
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param info: dict to add the alternative event and witness that were found to
+        :param kwargs: optional witness_set to only try that witness, and the domain_propagation, but_for_matrix,
+        witness_store and twin_network of the solver
+        :return: answer: bool indicating whether an alternative event and witness violate sufficiency
+        :return: info: dict with additional info about the necessity test
+        """
+
+        # Build the witness
+        if "witness_set" in kwargs:
+            witness = {var: state[var] for var in kwargs["witness_set"]}
+        else:
+            witness = None
+
+        all_vars = list(env.variables.keys())
+        event_vars = list(event.keys())
+        outcome_vars = list(outcome.keys())
+        remaining_vars = list(set(all_vars) - set(event_vars) - set(outcome_vars))
+
+        # Collect supports for all variables in the event
+        supports = []
+        for var_name in event:
+            var_support = env.variables[var_name].support
+            var_type = env.variables[var_name].var_type
+            if var_type == "float":
+                raise ValueError(
+                    f"Modified HP is not supported for float variable {var_name}"
+                )
+            elif var_type == "int":
+                supports.append(np.arange(var_support[0], var_support[1] + 1, 1))
+            else:
+                supports.append(var_support)
+
+        # Get all combinations of values
+        original_assignment = np.array([event[var] for var in event_vars])
+        event_combinations = np.array(np.meshgrid(*supports)).T.reshape(
+            -1, len(supports)
+        )
+
+        # Order the event combinations and witness sets according to the search strategy
+        event_combinations = self.search_order.order_alt_assignments(
+            env, event, outcome, state, event_combinations
+        )
+        witness_sets = self.search_order.order_witness_sets(
+            env, event, outcome, state, remaining_vars
+        )
+
+        # Remove alternative assignments that cannot change the outcome under any witness set
+        propagation = (
+            kwargs.get("domain_propagation") if self.outcome_sufficiency else None
+        )
+        if propagation is not None:
+            event_combinations = propagation.prune_alt_assignments(
+                event, outcome, state, noise, event_combinations
+            )
+
+        # Try alternative events that change the outcome without any witness before the witness search
+        if witness is None and kwargs.get("but_for_matrix") is not None:
+            but_for_necessary, but_for_info = self.try_but_for(
+                env, event, outcome, state, noise, **kwargs
+            )
+            if but_for_necessary:
+                add_info(info, but_for_info)
+                return True, info
+
+        # Try witness sets that made similar events necessary before the blind enumeration
+        witness_store = kwargs.get("witness_store")
+        if witness is None and witness_store is not None:
+            stored_necessary, stored_info = self.try_stored_witnesses(
+                env,
+                event,
+                outcome,
+                state,
+                noise,
+                event_combinations,
+                **kwargs,
+            )
+            if stored_necessary:
+                add_info(info, stored_info)
+                return True, info
+
+        # Evaluate all witness sets for an alternative event at once if a twin network is given
+        if self.outcome_sufficiency and kwargs.get("twin_network") is not None:
+            necessary, twin_info = self.try_twin_network(
+                env,
+                event,
+                outcome,
+                state,
+                noise,
+                event_combinations,
+                witness_sets,
+                kwargs["twin_network"],
+                witness,
+                witness_store,
+            )
+            add_info(info, twin_info)
+            return necessary, info
+
+        # Check if any of the combinations are not sufficient for the outcome
+        for alt_assignment in event_combinations:
+
+            # Ignore the original event
+            if np.array_equal(alt_assignment, original_assignment):
+                continue
+
+            if instrumentation.enabled:
+                instrumentation.count("alt_assignments_tried")
+
+            # Set up alternative event
+            alt_event = {var: value for var, value in zip(event_vars, alt_assignment)}
+
+            if witness is not None:
+
+                # Query the model under the witness and the alternative event to obtain an alternate outcome
+                alt_state = env.query(witness | alt_event, noise)
+
+                # Check if the sufficiency condition is violated by the alternative event and outcome
+                sufficient, ac2b_info = self.is_sufficient(
+                    env,
+                    alt_event,
+                    outcome,
+                    alt_state,
+                    noise,
+                    **self.get_sufficiency_kwargs(list(witness), **kwargs),
+                )
+                if not sufficient:
+                    info["ac2a_alt_event"] = alt_event
+                    info["ac2a_witness"] = witness
+                    return True, info
+
+            else:
+                # Only try one of the witness sets that differ in variables that cannot change the outcome
+                alt_witness_sets = witness_sets
+                if propagation is not None:
+                    alt_witness_sets = propagation.prune_witness_sets(
+                        alt_event, outcome, state, noise, witness_sets
+                    )
+
+                # No witness provided, so we try all possible witness sets
+                for witness_set in alt_witness_sets:
+
+                    # Ignore the witness set that is the same as the original event
+                    if set(witness_set) == set(event_vars):
+                        continue
+                    alt_witness = {var: state[var] for var in witness_set}
+
+                    if instrumentation.enabled:
+                        instrumentation.count("witness_sets_tried", "enumeration")
+
+                    # Query the model under the witness and the alternative event to obtain an alternate outcome
+                    alt_state = env.query(alt_witness | alt_event, noise)
+
+                    # Check if the sufficiency condition is violated by the alternative event and outcome
+                    sufficient, ac2b_info = self.is_sufficient(
+                        env,
+                        alt_event,
+                        outcome,
+                        alt_state,
+                        noise,
+                        **self.get_sufficiency_kwargs(witness_set, **kwargs),
+                    )
+                    if not sufficient:
+
+                        # Collect information
+                        self.search_order.record_witness(
+                            env, event, outcome, state, witness_set
+                        )
+                        if witness_store is not None:
+                            witness_store.add(event, outcome, state, witness_set)
+                        info["ac2a_alt_event"] = alt_event
+                        info["ac2a_witness"] = alt_witness
+                        if "ac2b_alt_outcome" in ac2b_info:
+                            info["ac2a_alt_outcome"] = ac2b_info["ac2b_alt_outcome"]
+                        return True, info
+
+        # No other intervention on the event variables was insufficient for the observed outcome
+        return False, info
+
+    def get_sufficiency_kwargs(self, witness_set, **kwargs):
+        """
+        Keyword arguments of is_sufficient for an alternative event under a witness set in find_alt_event
+        :param witness_set: variable names of the witness
+        :param kwargs: keyword arguments of is_necessary
+        :return: dict
+        """
+        return {"witness_set": witness_set}
+
+    def try_stored_witnesses(
+        self,
+        env: StructuralCausalModel,
+        event: dict,
+        outcome: dict,
+        state: dict,
+        noise,
+        event_combinations,
+        witness_store: WitnessStore,
+        **kwargs,
+    ):
+        """
+        Try witness sets that made similar events necessary before enumerating all possible witness sets
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param event_combinations: array of assignments of the event variables, in the order of the event
+        :param witness_store: WitnessStore to look up witness sets from
+        :param kwargs: keyword arguments of is_necessary, passed on to is_sufficient as in find_alt_event
+        :return: answer: bool indicating whether a stored witness set made the event necessary
+        :return: info: dict with the alternative event and witness that were found
+        """
+        info = {}
+        event_vars = list(event.keys())
+        remaining_vars = [
+            var for var in env.variables if var not in event and var not in outcome
+        ]
+        original_assignment = np.array([event[var] for var in event_vars])
+        witness_sets = witness_store.lookup(event, outcome, state, remaining_vars)
+
+        for n_tried, witness_set in enumerate(witness_sets, start=1):
+            witness = {var: state[var] for var in witness_set}
+            for alt_assignment in event_combinations:
+
+                # Ignore the original event
+                if np.array_equal(alt_assignment, original_assignment):
+                    continue
+
+                if instrumentation.enabled:
+                    instrumentation.count("alt_assignments_tried")
+                    instrumentation.count("witness_sets_tried", "witness_store")
+
+                # Query the model under the witness and the alternative event to obtain an alternate outcome
+                alt_event = {
+                    var: value for var, value in zip(event_vars, alt_assignment)
+                }
+                alt_state = env.query(witness | alt_event, noise)
+
+                # Check if the sufficiency condition is violated by the alternative event and outcome
+                sufficient, ac2b_info = self.is_sufficient(
+                    env,
+                    alt_event,
+                    outcome,
+                    alt_state,
+                    noise,
+                    **self.get_sufficiency_kwargs(witness_set, **kwargs),
+                )
+                if not sufficient:
+
+                    # Store the witness set for the new event too, so that the next lookup finds an exact match
+                    witness_store.record_hit(n_tried)
+                    witness_store.add(event, outcome, state, witness_set)
+                    self.search_order.record_witness(
+                        env, event, outcome, state, witness_set
+                    )
+                    info["ac2a_alt_event"] = alt_event
+                    info["ac2a_witness"] = witness
+                    info["ac2a_witness_source"] = "witness_store"
+                    if "ac2b_alt_outcome" in ac2b_info:
+                        info["ac2a_alt_outcome"] = ac2b_info["ac2b_alt_outcome"]
+                    return True, info
+
+        witness_store.record_miss(len(witness_sets))
+        return False, info
+
+    def try_but_for(
+        self,
+        env: StructuralCausalModel,
+        event: dict,
+        outcome: dict,
+        state: dict,
+        noise,
+        but_for_matrix,
+        **kwargs,
+    ):
+        """
+        Try the alternative events that change the outcome without any witness in a precomputed ButForMatrix
+        before enumerating all possible witness sets
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param but_for_matrix: ButForMatrix of the state
+        :param kwargs: keyword arguments of is_necessary, passed on to is_sufficient as in find_alt_event
+        :return: answer: bool indicating whether an alternative event made the event necessary with an empty witness
+        :return: info: dict with the alternative event and witness that were found
+        """
+        info = {}
+        if not but_for_matrix.covers(list(event.keys())):
+            return False, info
+
+        for alt_event in but_for_matrix.get_alt_events(list(event.keys())):
+
+            if instrumentation.enabled:
+                instrumentation.count("alt_assignments_tried")
+                instrumentation.count("witness_sets_tried", "but_for")
+
+            # Query the model under the alternative event to obtain an alternate outcome
+            alt_state = env.query(alt_event, noise)
+
+            # Check if the sufficiency condition is violated by the alternative event and outcome
+            sufficient, ac2b_info = self.is_sufficient(
+                env,
+                alt_event,
+                outcome,
+                alt_state,
+                noise,
+                **self.get_sufficiency_kwargs([], **kwargs),
+            )
+            if not sufficient:
+                info["ac2a_alt_event"] = alt_event
+                info["ac2a_witness"] = {}
+                info["ac2a_witness_source"] = "but_for"
+                if "ac2b_alt_outcome" in ac2b_info:
+                    info["ac2a_alt_outcome"] = ac2b_info["ac2b_alt_outcome"]
+                return True, info
+
+        return False, info
+
+    def try_twin_network(
+        self,
+        env: StructuralCausalModel,
+        event: dict,
+        outcome: dict,
+        state: dict,
+        noise,
+        event_combinations,
+        witness_sets,
+        twin_network: TwinNetwork,
+        witness: dict = None,
+        witness_store: WitnessStore = None,
+    ):
+        """
+        Search for an alternative event and witness under which the outcome does not hold, in the same order as
+        the enumeration in is_necessary, evaluating all witness sets for an alternative event in one pass of a
+        twin network instead of intervening on and resetting the model for each of them
+        This is only valid for definitions where an alternative event violates sufficiency iff the outcome does
+        not hold under the alternative event and witness
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param event_combinations: array of assignments of the event variables, in the order of the event
+        :param witness_sets: list of candidate witness sets in the order they should be tried
+        :param twin_network: TwinNetwork for the model
+        :param witness: dictionary of values of a given witness, witness_sets are ignored if it is given
+        :param witness_store: optional WitnessStore to add the witness set that was found to
+        :return: answer: bool indicating whether an alternative event and witness violate the outcome
+        :return: info: dict with the alternative event, witness and outcome that were found
+        """
+        info = {}
+        event_vars = list(event.keys())
+        original_assignment = np.array([event[var] for var in event_vars])
+
+        # Collect the witnesses, ignoring the witness set that is the same as the original event
+        if witness is not None:
+            witness_sets = [None]
+            witnesses = [witness]
+        else:
+            witness_sets = [ws for ws in witness_sets if set(ws) != set(event_vars)]
+            witnesses = [{var: state[var] for var in ws} for ws in witness_sets]
+
+        for alt_assignment in event_combinations:
+
+            # Ignore the original event
+            if np.array_equal(alt_assignment, original_assignment):
+                continue
+
+            if instrumentation.enabled:
+                instrumentation.count("alt_assignments_tried")
+                instrumentation.count(
+                    "witness_sets_tried", "twin_network", n=len(witnesses)
+                )
+
+            # Evaluate the alternative event under every witness as a counterfactual copy
+            alt_event = {var: value for var, value in zip(event_vars, alt_assignment)}
+            index, alt_state = twin_network.first_mismatch(
+                [witness | alt_event for witness in witnesses], outcome, noise
+            )
+            if index is not None:
+                if witness_sets[index] is not None:
+                    self.search_order.record_witness(
+                        env, event, outcome, state, witness_sets[index]
+                    )
+                    if witness_store is not None:
+                        witness_store.add(event, outcome, state, witness_sets[index])
+                alt_state = State.from_dict(alt_state, env.topological_order)
+                info["ac2a_alt_event"] = alt_event
+                info["ac2a_witness"] = witnesses[index]
+                info["ac2a_alt_outcome"] = {var: alt_state[var] for var in outcome}
+                return True, info
+
+        return False, info
+
     def is_actual_cause(self, env, event, outcome, state, noise=None, **kwargs):
         """
         Check if the event is an actual cause of the outcome in the state
@@ -173,7 +601,8 @@ class ACDefinition:
             "is_minimal": None,
         }
         # Check for AC1
-        ac1, ac1_info = self.is_factual(env, event, outcome, state, noise, **kwargs)
+        with instrumentation.span("is_factual"):
+            ac1, ac1_info = self.is_factual(env, event, outcome, state, noise, **kwargs)
         add_info(info, ac1_info)
 
         # Stop if given event and outcome are not factual
@@ -183,9 +612,10 @@ class ACDefinition:
         info["is_factual"] = True
 
         # Check for AC2b
-        ac2b, ac2b_info = self.is_sufficient(
-            env, event, outcome, state, noise, **kwargs
-        )
+        with instrumentation.span("is_sufficient"):
+            ac2b, ac2b_info = self.is_sufficient(
+                env, event, outcome, state, noise, **kwargs
+            )
         add_info(info, ac2b_info)
         if ac2b:
             info["is_sufficient"] = True
@@ -193,19 +623,27 @@ class ACDefinition:
             info["is_sufficient"] = False
 
         # Check for AC2a
-        ac2a, ac2a_info = self.is_necessary(env, event, outcome, state, noise, **kwargs)
+        with instrumentation.span("is_necessary"):
+            ac2a, ac2a_info = self.is_necessary(
+                env, event, outcome, state, noise, **kwargs
+            )
         add_info(info, ac2a_info)
         if ac2a:
             info["is_necessary"] = True
         else:
             info["is_necessary"] = False
 
+        # Record the result for the minimality checks of larger events
+        if kwargs.get("subevent_table") is not None:
+            kwargs["subevent_table"].add(event, outcome, state, noise, ac2a and ac2b)
+
         # Stop if not necessary or sufficient
         if not ac2a or not ac2b:
             return False, info
 
         # Check for AC3
-        ac3, ac3_info = self.is_minimal(env, event, outcome, state, noise, **kwargs)
+        with instrumentation.span("is_minimal"):
+            ac3, ac3_info = self.is_minimal(env, event, outcome, state, noise, **kwargs)
         add_info(info, ac3_info)
         if ac3:
             info["is_minimal"] = True
@@ -1,14 +1,46 @@
 from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.causal_models.state import State
+from counterfact.causal_models.twin_network import TwinNetwork
 from counterfact.definitions import ACDefinition
+import itertools
+import math
 import numpy as np
-from counterfact.inference import *
-from counterfact.utils.subsets import get_all_subsets
+from counterfact.utils.instrumentation import instrumentation
 
 
 class DirectActualCause(ACDefinition):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(
+        self,
+        search_order=None,
+        counterexample_guided: bool = True,
+        n_random_counterexamples: int = 16,
+        sampling_tolerance: float = None,
+        sampling_delta: float = 0.05,
+        seed=None,
+    ):
+        """
+        Direct actual causation, where the event must be sufficient for the outcome under every intervention on the
+        remaining variables
+        :param search_order: SearchOrder used to order alternative events and witness sets
+        :param counterexample_guided: try cheap candidate counterexamples to sufficiency before enumerating all
+        interventions on the remaining variables
+        :param n_random_counterexamples: number of random candidate counterexamples tried
+        :param sampling_tolerance: if given, interventions on the remaining variables are sampled uniformly instead
+        of enumerated whenever there are more of them than samples needed. A sampled check that finds no
+        counterexample means that, with confidence 1 - sampling_delta, less than this fraction of the interventions
+        are counterexamples
+        :param sampling_delta: probability that the sampled check misses a fraction of counterexamples of at least
+        sampling_tolerance
+        :param seed: seed for the random candidate counterexamples and the sampled interventions
+        """
+        super().__init__(search_order)
+        self.counterexample_guided = counterexample_guided
+        self.n_random_counterexamples = n_random_counterexamples
+        self.sampling_tolerance = sampling_tolerance
+        self.sampling_delta = sampling_delta
+        self.rng = np.random.default_rng(seed)
+        self.sampling_network = None
 
     def is_necessary(
         self,
@@ -31,125 +63,31 @@ class DirectActualCause(ACDefinition):
         :return:
         """
         info = {"necessity_defn": "ContrastiveNecessity"}
+        return self.find_alt_event(env, event, outcome, state, noise, info, **kwargs)
 
-        # Build the witness
-        if "witness_set" in kwargs:
-            witness = {var: state[var] for var in kwargs["witness_set"]}
-        else:
-            witness = None
-
-        all_vars = list(env.variables.keys())
-        event_vars = list(event.keys())
-        outcome_vars = list(outcome.keys())
-        remaining_vars = list(set(all_vars) - set(event_vars) - set(outcome_vars))
-
-        # Collect supports for all variables in the event
-        supports = []
-        for var_name in event:
-            var_support = env.variables[var_name].support
-            var_type = env.variables[var_name].var_type
-            if var_type == "float":
-                raise ValueError(
-                    f"Modified HP is not supported for float variable {var_name}"
-                )
-            elif var_type == "int":
-                supports.append(np.arange(var_support[0], var_support[1] + 1, 1))
-            else:
-                supports.append(var_support)
-
-        # Get all combinations of values
-        original_assignment = np.array([event[var] for var in event_vars])
-        event_combinations = np.array(np.meshgrid(*supports)).T.reshape(
-            -1, len(supports)
-        )
-
-        # Shuffle the event combinations
-        np.random.shuffle(event_combinations)
-
-        # Check if any of the combinations are not sufficient for the outcome
-        for alt_assignment in event_combinations:
-
-            # Ignore the original event
-            if np.array_equal(alt_assignment, original_assignment):
-                continue
-
-            # Set up alternative event
-            alt_event = {var: value for var, value in zip(event_vars, alt_assignment)}
-
-            if witness is not None:
-
-                # Reset the effect of prior interventions
-                env.reset()
-
-                # Apply the witness set intervention if a witness set is provided
-                env.intervene(witness)
-
-                # Apply the alternative event as an intervention on the causal model to obtain an alternate outcome
-                env.intervene(alt_event)
-                alt_state = env.get_state(noise)
-                alt_outcome = {var: alt_state[var] for var in outcome}
-                # Check if the sufficiency condition is violated by the alternative event and outcome
-                sufficient, ac2b_info = self.is_sufficient(
-                    env, alt_event, outcome, alt_state, noise
-                )
-                if not sufficient:
-                    info["ac2a_alt_event"] = alt_event
-                    info["ac2a_witness"] = witness
-                    env.reset()
-                    return True, info
-
-            else:
-                # No witness provided, so we try all possible witness sets
-                for witness_set in get_all_subsets(
-                    remaining_vars, shuffle_by_size=True
-                ):
-
-                    # Reset the effect of prior interventions
-                    env.reset()
-
-                    # Ignore the witness set that is the same as the original event
-                    witness = {var: state[var] for var in witness_set}
-                    if set(witness_set) == set(event_vars):
-                        continue
-
-                    # Apply the witness set intervention
-                    env.intervene(witness)
-
-                    # Apply the intervention on the causal model to obtain an alternate outcome
-                    alt_event = {
-                        var: value for var, value in zip(event_vars, alt_assignment)
-                    }
-                    env.intervene(alt_event)
-
-                    # Print the functions of the SCM that are constant functions
-                    alt_state = env.get_state(noise)
-                    alt_outcome = {var: alt_state[var] for var in outcome}
-
-                    # Check if the sufficiency condition is violated by the alternative event and outcome
-                    sufficient, ac2b_info = self.is_sufficient(
-                        env, alt_event, outcome, alt_state, noise
-                    )
-                    if not sufficient:
-
-                        # Collect information
-                        info["ac2a_alt_event"] = alt_event
-                        info["ac2a_witness"] = witness
-                        if "ac2b_alt_outcome" in ac2b_info:
-                            info["ac2a_alt_outcome"] = ac2b_info["ac2b_alt_outcome"]
-                        # Reset the model to its original state and return result
-                        env.reset()
-                        return True, info
-
-                # Reset witness when moving to the next alt event
-                witness = None
-
-        # No other intervention on the event variables was insufficient for the observed outcome
-        # Reset the model to its original state and return result
-        return False, info
+    def get_sufficiency_kwargs(self, witness_set, **kwargs):
+        """
+        Direct sufficiency intervenes on all remaining variables, so alternative events are checked without the
+        witness, in the twin network if one is given
+        :param witness_set: variable names of the witness
+        :param kwargs: keyword arguments of is_necessary
+        :return: dict
+        """
+        if kwargs.get("twin_network") is not None:
+            return {"twin_network": kwargs["twin_network"]}
+        return {}
 
     def is_sufficient(self, env, event, outcome, state, noise=None, **kwargs):
         """
         Check if the event is directly sufficient for the outcome in the state
+        The outcome must hold under the event and witness for every intervention on the remaining variables. Since
+        all variables other than the outcome are intervened on, only the parents of the outcome variables can
+        change it, so only interventions on those parents are enumerated (see Proposition 5 in Causal Sufficiency
+        and Actual Causation, Beckers 2021)
+        With counterexample_guided, the actual values of the parents, every change of a single parent and a number
+        of random assignments are tried before the exhaustive enumeration
+        With a sampling_tolerance, the enumeration is replaced by uniformly sampled interventions, evaluated in
+        batches of counterfactual copies, if there are more possible interventions than samples needed
         :param env:
         :param event:
         :param outcome:
@@ -164,75 +102,219 @@ class DirectActualCause(ACDefinition):
         else:
             witness = None
 
-        # Optional: filter out non-parents since only parents can be directly sufficient
-        # For proof, see Proposition 5 in Causal Sufficiency and Actual Causation, Beckers 2021
-        # if "filter_non_parents" in kwargs and kwargs["filter_non_parents"]:
-        #     # Get parents of all outcome variables
-        #     parents = set()
-        #     for var in outcome:
-        #         parents.add(env.causal_graph.predecessors(var))
-        #     for event_var in event:
-        #         if event_var not in parents:
-        #             return False, {}
-
         info = {"sufficiency_defn": "DirectSufficiency"}
-        all_vars = list(env.variables.keys())
-        event_vars = list(event.keys())
-        outcome_vars = list(outcome.keys())
-        remaining_vars = list(set(all_vars) - set(event_vars) - set(outcome_vars))
+        remaining_vars = self.get_remaining_parents(env, event, outcome, witness)
 
-        # Collect supports for all variables not in the witness or event
+        # Collect supports for the remaining parents
         supports = []
-        for var_name in state:
-
-            # Ignore the variables in the event or witness set
-            if var_name in event:
-                continue
-            if witness is not None and var_name in witness:
-                continue
-
-            # Collect the support for the variable
-            var_support = env.variables[var_name].support
-            var_type = env.variables[var_name].var_type
-            if var_type == "float":
+        for var_name in remaining_vars:
+            if env.variables[var_name].var_type == "float":
                 raise ValueError(
                     f"Modified HP is not supported for float variable {var_name}"
                 )
-            elif var_type == "int":
-                supports.append(np.arange(var_support[0], var_support[1] + 1, 1))
-            else:
-                supports.append(var_support)
-
-        # Get all combinations of values
-        rem_var_combinations = np.array(np.meshgrid(*supports)).T.reshape(
-            -1, len(supports)
+            supports.append(env.get_support_values(var_name))
+
+        # Sample the interventions on the remaining parents in counterfactual copies if there are too many of them
+        twin_network = kwargs.get("twin_network")
+        n_samples = self.get_n_samples(supports)
+        if n_samples is not None:
+            if twin_network is None:
+                twin_network = self.get_sampling_network(env)
+            info["ac2b_sampled"] = True
+            info["ac2b_n_samples"] = n_samples
+            info["ac2b_confidence"] = 1 - self.sampling_delta
+            info["ac2b_tolerance"] = self.sampling_tolerance
+
+        # Find an intervention on the remaining parents under which the outcome does not hold
+        candidates = self.iter_counterexample_candidates(
+            remaining_vars,
+            supports,
+            state,
+            n_samples,
+            twin_network.batch_size if twin_network is not None else 1,
         )
-        np.random.shuffle(rem_var_combinations)
+        counterexample = self.find_counterexample(
+            env,
+            event,
+            outcome,
+            witness,
+            noise,
+            remaining_vars,
+            candidates,
+            twin_network,
+        )
+        if counterexample is not None:
+            source, rem_var_intervention, alt_state = counterexample
+            info["ac2b_alt_state"] = alt_state
+            info["ac2b_alt_outcome"] = {v: alt_state[v] for v in outcome}
+            info["ac2b_counterexample"] = rem_var_intervention
+            info["ac2b_counterexample_source"] = source
+            return False, info
+
+        # All possible (or sampled) interventions on the remaining variables were sufficient for the outcome
+        return True, info
 
-        # Check if the observed outcome is produced for all combinations along with the event and witness
-        for rem_var_assignment in rem_var_combinations:
+    def get_sampling_network(self, env):
+        """
+        Get the twin network in which sampled interventions are evaluated if the solver does not give one
+        The network is built once and reused by all sufficiency checks on the same model
+        :param env: StructuralCausalModel
+        :return: TwinNetwork
+        """
+        if self.sampling_network is None or self.sampling_network.env is not env:
+            self.sampling_network = TwinNetwork(env)
+        return self.sampling_network
 
-            # Set up the intervention
-            rem_var_intervention = {
-                var: value for var, value in zip(remaining_vars, rem_var_assignment)
-            }
-            env.intervene(rem_var_intervention)
+    def get_n_samples(self, supports):
+        """
+        Get the number of sampled interventions n = ceil(ln(1 / delta) / tolerance), so that a fraction of
+        counterexamples of at least the tolerance is missed with probability (1 - tolerance)^n <= delta
+        :param supports: list of supports of the remaining parents
+        :return: number of samples, None if sampling is disabled or enumerating all interventions is cheaper
+        """
+        if self.sampling_tolerance is None:
+            return None
+        n_samples = math.ceil(
+            math.log(1 / self.sampling_delta) / self.sampling_tolerance
+        )
+        n_assignments = math.prod(len(support) for support in supports)
+        return n_samples if n_assignments > n_samples else None
 
-            # Intervene on the model to apply the given event and witness
-            env.intervene(event)
+    def get_remaining_parents(self, env, event, outcome, witness=None):
+        """
+        Get the parents of the outcome variables that are not fixed by the event, the witness or the outcome, in
+        topological order
+        """
+        fixed = set(event) | set(outcome) | set(witness or {})
+        parents = set()
+        for var in outcome:
+            parents.update(env.get_parents(var))
+        return [
+            var for var in env.topological_order if var in parents and var not in fixed
+        ]
+
+    def iter_counterexample_candidates(
+        self, remaining_vars, supports, state, n_samples=None, batch_size=1
+    ):
+        """
+        Lazily generate candidate assignments of the remaining parents, each with the way it was found
+        Heuristic candidates come first if counterexample_guided is set, followed by all assignments that were not
+        tried yet, or by n_samples uniformly sampled assignments
+        :param n_samples: number of sampled assignments, all assignments are enumerated if None
+        :param batch_size: number of assignments sampled at once
+        :return: generator of tuples of the source of the candidate, heuristic, enumeration or sampling, and the
+        assignment
+        """
+        tried = set()
+        if self.counterexample_guided and len(remaining_vars) > 0:
+            heuristic = []
+
+            # The actual values of the parents, then every change of a single parent
+            actual = tuple(_to_python(state[var]) for var in remaining_vars)
+            heuristic.append(actual)
+            for i, support in enumerate(supports):
+                for value in support:
+                    if value != actual[i]:
+                        heuristic.append(actual[:i] + (value,) + actual[i + 1 :])
+
+            # Random assignments of all parents
+            for _ in range(self.n_random_counterexamples):
+                heuristic.append(
+                    tuple(
+                        support[self.rng.integers(len(support))] for support in supports
+                    )
+                )
+
+            for assignment in heuristic:
+                if assignment not in tried:
+                    tried.add(assignment)
+                    yield "heuristic", assignment
+
+        # Samples are independent of the heuristic candidates, so the confidence of the sampled check holds
+        if n_samples is not None:
+            sizes = [len(support) for support in supports]
+            for start in range(0, n_samples, batch_size):
+                indices = self.rng.integers(
+                    0, sizes, size=(min(batch_size, n_samples - start), len(sizes))
+                )
+                for row in indices:
+                    yield "sampling", tuple(
+                        support[i] for support, i in zip(supports, row)
+                    )
+            return
+
+        for assignment in itertools.product(*supports):
+            if assignment not in tried:
+                yield "enumeration", assignment
+
+    def find_counterexample(
+        self,
+        env,
+        event,
+        outcome,
+        witness,
+        noise,
+        remaining_vars,
+        candidates,
+        twin_network=None,
+    ):
+        """
+        Find the first candidate intervention on the remaining parents under which the event and witness do not
+        produce the outcome, evaluating the candidates in counterfactual copies if a twin network is given
+        :return: tuple of the source of the counterexample, the intervention and the alternative state, None if the
+        outcome holds for all candidates
+        """
+
+        # Evaluate chunks of candidates as counterfactual copies if a twin network is given
+        if twin_network is not None:
+            while True:
+                chunk = list(itertools.islice(candidates, twin_network.batch_size))
+                if len(chunk) == 0:
+                    return None
+                interventions = []
+                for _, rem_var_assignment in chunk:
+                    intervention = dict(zip(remaining_vars, rem_var_assignment))
+                    intervention.update(event)
+                    if witness is not None:
+                        intervention.update(witness)
+                    interventions.append(intervention)
+                index, alt_state = twin_network.first_mismatch(
+                    interventions, outcome, noise
+                )
+                n_tried = len(chunk) if index is None else index + 1
+                if instrumentation.enabled:
+                    for source, _ in chunk[:n_tried]:
+                        instrumentation.count("sufficiency_assignments_tried", source)
+                if index is not None:
+                    source, rem_var_assignment = chunk[index]
+                    alt_state = State.from_dict(alt_state, env.topological_order)
+                    return (
+                        source,
+                        dict(zip(remaining_vars, rem_var_assignment)),
+                        alt_state,
+                    )
+
+        # Check if the observed outcome is produced for all candidates along with the event and witness
+        for source, rem_var_assignment in candidates:
+
+            if instrumentation.enabled:
+                instrumentation.count("sufficiency_assignments_tried", source)
+
+            # Query the model under the remaining parents, the event and the witness
+            rem_var_intervention = dict(zip(remaining_vars, rem_var_assignment))
+            intervention = rem_var_intervention | event
             if witness is not None:
-                env.intervene(witness)
+                intervention = intervention | witness
 
             # Check if the outcome is satisfied
-            new_state = env.get_state(noise)
-            for var in outcome:
-                if new_state[var] != outcome[var]:
-                    info["ac2b_alt_state"] = new_state
-                    info["ac2b_alt_outcome"] = {v: new_state[v] for v in outcome}
-                    env.reset()
-                    return False, info
-
-        # All possible interventions on the remaining variables were sufficient for the outcome
-        # Reset the model to its original state and return result
-        env.reset()
-        return True, info
+            new_state = State.from_dict(
+                env.query(intervention, noise), env.topological_order
+            )
+            if not new_state.matches(outcome):
+                return source, rem_var_intervention, new_state
+
+        return None
+
+
+def _to_python(value):
+    return value.item() if hasattr(value, "item") else value
@@ -1,5 +1,4 @@
 from counterfact.definitions import ACDefinition
 from counterfact.causal_models.scm import StructuralCausalModel
 import numpy as np
-from counterfact.inference import *
 from counterfact.utils.subsets import get_all_subsets
@@ -1,9 +1,22 @@
-from counterfact.examples.binary import *
-from counterfact.examples.forest_fire import *
-from counterfact.examples.gang import *
-from counterfact.examples.halt_charge import *
-from counterfact.examples.mover_1d import *
-from counterfact.examples.queen_of_england import *
-from counterfact.examples.railroad import *
-from counterfact.examples.rock_throwing import *
-from counterfact.examples.voting import *
+from counterfact.utils.lazy import attach
+
+# Examples are imported on first use, so that building one example does not import the dependencies of the others
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "binary": ["BinaryAnd", "BinaryOr", "BinaryXor"],
+        "forest_fire": [
+            "ForestFireDisjunctive",
+            "ForestFireConjunctive",
+            "ForestFireRainStorm",
+        ],
+        "gang": ["ObedientGang"],
+        "halt_charge": ["HaltOrCharge"],
+        "mover_1d": ["Mover1D"],
+        "queen_of_england": ["QueenOfEngland"],
+        "railroad": ["SwitchingRailroadTracks"],
+        "rock_throwing": ["RockThrowing"],
+        "voting": ["Voting"],
+        "random_scm": ["RandomSCM"],
+    },
+)
@@ -1,6 +1,6 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
-import numpy as np
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
 
 
 class BinaryAnd(StructuralCausalModel):
@@ -15,10 +15,10 @@ class BinaryAnd(StructuralCausalModel):
         )
 
         def a(inputs, noise):
-            return noise
+            return noise["a"]
 
         def b(inputs, noise):
-            return noise
+            return noise["b"]
 
         def y(inputs, noise):
             return inputs["a"] and inputs["b"]
@@ -28,16 +28,12 @@ class BinaryAnd(StructuralCausalModel):
                 "a": StructuralFunction(
                     a,
                     [],
-                    ExogenousNoise(
-                        "u_a", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_a", [0, 1], [0.5, 0.5]),
                 ),
                 "b": StructuralFunction(
                     b,
                     [],
-                    ExogenousNoise(
-                        "u_b", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_b", [0, 1], [0.5, 0.5]),
                 ),
                 "y": StructuralFunction(y, ["a", "b"], None),
             }
@@ -56,10 +52,10 @@ class BinaryOr(StructuralCausalModel):
         )
 
         def a(inputs, noise):
-            return noise
+            return noise["a"]
 
         def b(inputs, noise):
-            return noise
+            return noise["b"]
 
         def y(inputs, noise):
             return inputs["a"] or inputs["b"]
@@ -69,16 +65,12 @@ class BinaryOr(StructuralCausalModel):
                 "a": StructuralFunction(
                     a,
                     [],
-                    ExogenousNoise(
-                        "u_a", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_a", [0, 1], [0.5, 0.5]),
                 ),
                 "b": StructuralFunction(
                     b,
                     [],
-                    ExogenousNoise(
-                        "u_b", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_b", [0, 1], [0.5, 0.5]),
                 ),
                 "y": StructuralFunction(y, ["a", "b"], None),
             }
@@ -97,10 +89,10 @@ class BinaryXor(StructuralCausalModel):
         )
 
         def a(inputs, noise):
-            return noise
+            return noise["a"]
 
         def b(inputs, noise):
-            return noise
+            return noise["b"]
 
         def y(inputs, noise):
             return (inputs["a"] and not inputs["b"]) or (
@@ -112,16 +104,12 @@ class BinaryXor(StructuralCausalModel):
                 "a": StructuralFunction(
                     a,
                     [],
-                    ExogenousNoise(
-                        "u_a", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_a", [0, 1], [0.5, 0.5]),
                 ),
                 "b": StructuralFunction(
                     b,
                     [],
-                    ExogenousNoise(
-                        "u_b", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_b", [0, 1], [0.5, 0.5]),
                 ),
                 "y": StructuralFunction(y, ["a", "b"], None),
             }
@@ -1,5 +1,7 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
+from counterfact.causal_models.expressions import ExpressionFunction, Var
 import numpy as np
 
 
@@ -15,10 +17,10 @@ class ForestFireDisjunctive(StructuralCausalModel):
         )
 
         def lightning(inputs, noise):
-            return noise
+            return noise["lightning"]
 
         def arson(inputs, noise):
-            return noise
+            return noise["arson"]
 
         def fire(inputs, noise):
             return int(np.logical_or(inputs["lightning"], inputs["arson"]))
@@ -28,16 +30,12 @@ class ForestFireDisjunctive(StructuralCausalModel):
                 "lightning": StructuralFunction(
                     lightning,
                     [],
-                    ExogenousNoise(
-                        "u_lightning", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_lightning", [0, 1], [0.5, 0.5]),
                 ),
                 "arson": StructuralFunction(
                     arson,
                     [],
-                    ExogenousNoise(
-                        "u_arson", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_arson", [0, 1], [0.5, 0.5]),
                 ),
                 "fire": StructuralFunction(fire, ["lightning", "arson"], None),
             }
@@ -56,10 +54,10 @@ class ForestFireConjunctive(StructuralCausalModel):
         )
 
         def lightning(inputs, noise):
-            return noise
+            return noise["lightning"]
 
         def arson(inputs, noise):
-            return noise
+            return noise["arson"]
 
         def fire(inputs, noise):
             return inputs["lightning"] and inputs["arson"]
@@ -69,16 +67,12 @@ class ForestFireConjunctive(StructuralCausalModel):
                 "lightning": StructuralFunction(
                     lightning,
                     [],
-                    ExogenousNoise(
-                        "u_lightning", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_lightning", [0, 1], [0.5, 0.5]),
                 ),
                 "arson": StructuralFunction(
                     arson,
                     [],
-                    ExogenousNoise(
-                        "u_arson", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_arson", [0, 1], [0.5, 0.5]),
                 ),
                 "fire": StructuralFunction(fire, ["lightning", "arson"], None),
             }
@@ -99,52 +93,41 @@ class ForestFireRainStorm(StructuralCausalModel):
         )
 
         def april_showers(inputs, noise):
-            return noise
+            return noise["april_showers"]
 
         def may_electric_storm(inputs, noise):
-            return noise
+            return noise["may_electric_storm"]
 
         def june_electric_storm(inputs, noise):
-            return noise
+            return noise["june_electric_storm"]
 
-        def fire_in_may(inputs, noise):
-            return int(inputs["may_electric_storm"] and not inputs["april_showers"])
-
-        def fire_in_june(inputs, noise):
-            return inputs["june_electric_storm"] and (
-                inputs["april_showers"] or not inputs["may_electric_storm"]
-            )
+        # Fires are given as expressions, so that they can be compiled to vectorized code, truth tables and CNF
+        fire_in_may = Var("may_electric_storm") & ~Var("april_showers")
+        fire_in_june = Var("june_electric_storm") & (
+            Var("april_showers") | ~Var("may_electric_storm")
+        )
 
         self.set_structural_functions(
             {
                 "april_showers": StructuralFunction(
                     april_showers,
                     [],
-                    ExogenousNoise(
-                        "u_april_showers",
-                        lambda: np.random.choice([0, 1], p=[0.5, 0.5]),
-                    ),
+                    CategoricalNoise("u_april_showers", [0, 1], [0.5, 0.5]),
                 ),
                 "may_electric_storm": StructuralFunction(
                     may_electric_storm,
                     [],
-                    ExogenousNoise(
-                        "u_may_electric_storm",
-                        lambda: np.random.choice([0, 1], p=[0.5, 0.5]),
-                    ),
+                    CategoricalNoise("u_may_electric_storm", [0, 1], [0.5, 0.5]),
                 ),
                 "june_electric_storm": StructuralFunction(
                     june_electric_storm,
                     [],
-                    ExogenousNoise(
-                        "u_june_electric_storm",
-                        lambda: np.random.choice([0, 1], p=[0.5, 0.5]),
-                    ),
+                    CategoricalNoise("u_june_electric_storm", [0, 1], [0.5, 0.5]),
                 ),
-                "fire_in_may": StructuralFunction(
+                "fire_in_may": ExpressionFunction(
                     fire_in_may, ["may_electric_storm", "april_showers"], None
                 ),
-                "fire_in_june": StructuralFunction(
+                "fire_in_june": ExpressionFunction(
                     fire_in_june,
                     ["june_electric_storm", "april_showers", "may_electric_storm"],
                     None,
@@ -1,5 +1,6 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
 import numpy as np
 
 
@@ -12,7 +13,7 @@ class ObedientGang(StructuralCausalModel):
         )
 
         def leader(inputs, noise):
-            return noise
+            return noise["leader"]
 
         def gang_member(inputs, noise):
             return inputs["leader"]
@@ -30,9 +31,7 @@ class ObedientGang(StructuralCausalModel):
                 "leader": StructuralFunction(
                     leader,
                     [],
-                    ExogenousNoise(
-                        "u_leader", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_leader", [0, 1], [0.5, 0.5]),
                 ),
                 **{
                     f"gang_member_{i}": StructuralFunction(
@@ -1,6 +1,6 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
-import numpy as np
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
 
 
 class HaltOrCharge(StructuralCausalModel):
@@ -15,10 +15,10 @@ class HaltOrCharge(StructuralCausalModel):
         )
 
         def major(inputs, noise):
-            return noise
+            return noise["major"]
 
         def sergeant(inputs, noise):
-            return noise
+            return noise["sergeant"]
 
         def corporal(inputs, noise):
             return inputs["sergeant"] if inputs["major"] == 2 else inputs["major"]
@@ -28,14 +28,12 @@ class HaltOrCharge(StructuralCausalModel):
                 "major": StructuralFunction(
                     major,
                     [],
-                    ExogenousNoise("u_major", lambda: np.random.choice([0, 1, 2])),
+                    CategoricalNoise("u_major", [0, 1, 2]),
                 ),
                 "sergeant": StructuralFunction(
                     sergeant,
                     [],
-                    ExogenousNoise(
-                        "u_sergeant", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_sergeant", [0, 1], [0.5, 0.5]),
                 ),
                 "corporal": StructuralFunction(corporal, ["major", "sergeant"], None),
             }
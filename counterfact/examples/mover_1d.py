@@ -1,6 +1,7 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
-import numpy as np
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
+from counterfact.causal_models.expressions import ExpressionFunction, IfThenElse, Var
 
 # next_mover_pos = mover + 1 if obstacle != mover + 1 else mover
 
@@ -23,37 +24,28 @@ class Mover1D(StructuralCausalModel):
         }
 
         def mover(inputs, noise):
-            return noise
+            return noise["mover"]
 
         def obstacle(inputs, noise):
-            return noise
+            return noise["obstacle"]
 
-        def next_mover_pos(inputs, noise):
-            return (
-                inputs["mover"] + 1
-                if inputs["obstacle"] != inputs["mover"] + 1
-                else inputs["mover"]
-            )
+        next_mover_pos = IfThenElse(
+            Var("obstacle").ne(Var("mover") + 1), Var("mover") + 1, Var("mover")
+        )
 
         self.set_structural_functions(
             {
                 "mover": StructuralFunction(
                     mover,
                     [],
-                    ExogenousNoise(
-                        "u_mover",
-                        lambda: np.random.choice(list(range(world_length - 1))),
-                    ),
+                    CategoricalNoise("u_mover", list(range(world_length - 1))),
                 ),
                 "obstacle": StructuralFunction(
                     obstacle,
                     [],
-                    ExogenousNoise(
-                        "u_obstacle",
-                        lambda: np.random.choice(list(range(world_length))),
-                    ),
+                    CategoricalNoise("u_obstacle", list(range(world_length))),
                 ),
-                "next_mover_pos": StructuralFunction(
+                "next_mover_pos": ExpressionFunction(
                     next_mover_pos, ["mover", "obstacle"], None
                 ),
             }
@@ -1,6 +1,6 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
-import numpy as np
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
 
 
 class QueenOfEngland(StructuralCausalModel):
@@ -15,10 +15,10 @@ class QueenOfEngland(StructuralCausalModel):
         )
 
         def queen(inputs, noise):
-            return noise
+            return noise["queen"]
 
         def gardener(inputs, noise):
-            return noise
+            return noise["gardener"]
 
         def flowers_live(inputs, noise):
             return inputs["gardener"] or inputs["queen"] == 1
@@ -28,14 +28,12 @@ class QueenOfEngland(StructuralCausalModel):
                 "queen": StructuralFunction(
                     queen,
                     [],
-                    ExogenousNoise("u_queen", lambda: np.random.choice([-1, 0, 1])),
+                    CategoricalNoise("u_queen", [-1, 0, 1]),
                 ),
                 "gardener": StructuralFunction(
                     gardener,
                     [],
-                    ExogenousNoise(
-                        "u_gardener", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_gardener", [0, 1], [0.5, 0.5]),
                 ),
                 "flowers_live": StructuralFunction(
                     flowers_live, ["queen", "gardener"], None
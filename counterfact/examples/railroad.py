@@ -1,6 +1,6 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
-import numpy as np
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
 
 
 class SwitchingRailroadTracks(StructuralCausalModel):
@@ -17,10 +17,10 @@ class SwitchingRailroadTracks(StructuralCausalModel):
         )
 
         def breakdown(inputs, noise):
-            return noise
+            return noise["breakdown"]
 
         def track_switcher(inputs, noise):
-            return noise
+            return noise["track_switcher"]
 
         def on_track(inputs, noise):
             return 2 if inputs["breakdown"] else inputs["track_switcher"]
@@ -33,17 +33,12 @@ class SwitchingRailroadTracks(StructuralCausalModel):
                 "breakdown": StructuralFunction(
                     breakdown,
                     [],
-                    ExogenousNoise(
-                        "u_breakdown", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise("u_breakdown", [0, 1], [0.5, 0.5]),
                 ),
                 "track_switcher": StructuralFunction(
                     track_switcher,
                     [],
-                    ExogenousNoise(
-                        "u_track_switcher",
-                        lambda: np.random.choice([0, 1], p=[0.5, 0.5]),
-                    ),
+                    CategoricalNoise("u_track_switcher", [0, 1], [0.5, 0.5]),
                 ),
                 "on_track": StructuralFunction(
                     on_track, ["breakdown", "track_switcher"], None
@@ -0,0 +1,221 @@
+from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
+import itertools
+import numpy as np
+import torch
+import pyro.distributions as dist
+
+
+class RandomSCM(StructuralCausalModel):
+
+    def __init__(
+        self,
+        n_nodes: int = 10,
+        max_in_degree: int = 2,
+        depth: int = 3,
+        var_types=("bool",),
+        support_sizes=(2, 4),
+        function_types=("boolean", "threshold", "lookup"),
+        max_table_size: int = 256,
+        seed=None,
+    ):
+        """
+        Random structural causal model for load and scaling tests
+        Variables are placed in depth + 1 layers, where the last layer holds the single outcome variable "y" and
+        every other variable in layer k > 0 has a parent in layer k - 1, so the longest directed path has exactly
+        depth edges. Root variables copy their exogenous noise, and all other variables are deterministic
+        functions of their parents
+        :param n_nodes: number of variables, at least depth + 1
+        :param max_in_degree: maximum number of parents of a variable
+        :param depth: number of edges on the longest directed path
+        :param var_types: variable types to draw from, any of "bool", "int" and "discrete"
+        :param support_sizes: (min, max) number of values of "int" and "discrete" variables
+        :param function_types: structural function families to draw from, any of "boolean", "threshold" and "lookup"
+        :param max_table_size: lookup tables with more rows than this are replaced by threshold functions
+        :param seed: seed for the random number generator, the same seed always gives the same model
+        """
+        super().__init__()
+        if depth < 1 or n_nodes < depth + 1:
+            raise ValueError(
+                f"Need depth >= 1 and at least depth + 1 nodes, got n_nodes={n_nodes} and depth={depth}."
+            )
+        if max_in_degree < 1:
+            raise ValueError(
+                f"max_in_degree must be at least 1, {max_in_degree} given."
+            )
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.var_types = list(var_types)
+        self.support_sizes = support_sizes
+        self.function_types = list(function_types)
+        self.max_table_size = max_table_size
+
+        # Assign variables to layers, one in each layer and the rest spread over all layers but the last
+        layer_sizes = np.ones(depth + 1, dtype=int)
+        layer_sizes[:-1] += self.rng.multinomial(
+            n_nodes - depth - 1, np.ones(depth) / depth
+        )
+        self.layers = []
+        var_names = [f"x_{i}" for i in range(n_nodes - 1)] + ["y"]
+        for size in layer_sizes:
+            start = sum(len(layer) for layer in self.layers)
+            self.layers.append(var_names[start : start + size])
+        self.outcome_vars = ["y"]
+
+        # Add all variables, roots take values 0, 1, ... so that their noise can be sampled directly
+        for k, layer in enumerate(self.layers):
+            for var in layer:
+                var_type, support = self.random_support(root=k == 0)
+                self.add_variable(var, var_type, support)
+
+        # Create structural functions, with a parent in the previous layer and the rest from any earlier layer
+        structural_functions = {}
+        for var in self.layers[0]:
+            structural_functions[var] = StructuralFunction(
+                self.root_function(var), [], self.root_noise(var)
+            )
+        for k in range(1, depth + 1):
+            earlier_vars = [var for layer in self.layers[:k] for var in layer]
+            for var in self.layers[k]:
+                parent = str(self.rng.choice(self.layers[k - 1]))
+                candidates = [v for v in earlier_vars if v != parent]
+                in_degree = self.rng.integers(
+                    1, min(max_in_degree, len(candidates) + 1) + 1
+                )
+                parents = [parent] + [
+                    str(v)
+                    for v in self.rng.choice(candidates, in_degree - 1, replace=False)
+                ]
+                parents = sorted(parents, key=var_names.index)
+                structural_functions[var] = StructuralFunction(
+                    self.random_function(var, parents), parents, None
+                )
+        self.set_structural_functions(structural_functions)
+
+    def random_support(self, root: bool = False):
+        """
+        Draw a variable type and support
+        :param root: whether the variable is a root, whose support must be 0, 1, ..., k - 1
+        :return: tuple of variable type and support
+        """
+        var_type = str(self.rng.choice(self.var_types))
+        if var_type == "bool":
+            return var_type, [0, 1]
+        size = int(self.rng.integers(self.support_sizes[0], self.support_sizes[1] + 1))
+        if var_type == "int":
+            low = 0 if root else int(self.rng.integers(-size, size + 1))
+            return var_type, [low, low + size - 1]
+        elif var_type == "discrete":
+            if root:
+                return var_type, list(range(size))
+            values = self.rng.choice(
+                np.arange(-2 * size, 2 * size), size, replace=False
+            )
+            return var_type, sorted(int(v) for v in values)
+        raise ValueError(f"Unsupported variable type '{var_type}'.")
+
+    def get_support_index(self, var_name: str):
+        """
+        Get a mapping from the values of a variable to their index in its support
+        """
+        return {value: i for i, value in enumerate(self.get_support_values(var_name))}
+
+    def root_noise(self, var_name: str):
+        """
+        Uniform noise over the support of a root variable
+        """
+        n_values = len(self.get_support_values(var_name))
+        if self.variables[var_name].var_type == "bool":
+            return dist.Bernoulli(0.5)
+        return dist.Categorical(torch.ones(n_values) / n_values)
+
+    def root_function(self, var_name: str):
+        def function(inputs, noise):
+            return noise[var_name]
+
+        return function
+
+    def random_function(self, var_name: str, parents: list):
+        """
+        Draw a structural function from one of the function families
+        :param var_name: name of the variable
+        :param parents: list of names of the parents of the variable
+        :return: function of inputs and noise that returns a value in the support of the variable
+        """
+        function_types = self.function_types
+        if self.variables[var_name].var_type != "bool":
+            function_types = [f for f in function_types if f != "boolean"]
+        table_size = np.prod([len(self.get_support_values(p)) for p in parents])
+        if table_size > self.max_table_size:
+            function_types = [f for f in function_types if f != "lookup"]
+        function_type = (
+            str(self.rng.choice(function_types)) if function_types else "threshold"
+        )
+
+        if function_type == "boolean":
+            return self.boolean_function(parents)
+        elif function_type == "threshold":
+            return self.threshold_function(var_name, parents)
+        elif function_type == "lookup":
+            return self.lookup_function(var_name, parents)
+        raise ValueError(f"Unsupported function type '{function_type}'.")
+
+    def boolean_function(self, parents: list):
+        """
+        AND, OR or XOR of one literal per parent, where a literal is true if the parent takes one of a random
+        subset of its values
+        """
+        operator = str(self.rng.choice(["and", "or", "xor"]))
+        active_values = {}
+        for parent in parents:
+            values = self.get_support_values(parent)
+            n_active = self.rng.integers(1, len(values))
+            active_values[parent] = {
+                int(v) for v in self.rng.choice(values, n_active, replace=False)
+            }
+
+        def function(inputs, noise):
+            literals = [int(inputs[p]) in active_values[p] for p in parents]
+            if operator == "and":
+                value = all(literals)
+            elif operator == "or":
+                value = any(literals)
+            else:
+                value = sum(literals) % 2 == 1
+            return torch.tensor(int(value))
+
+        return function
+
+    def threshold_function(self, var_name: str, parents: list):
+        """
+        Weighted sum of the indices of the parent values, binned into the support of the variable by random
+        thresholds between the smallest and largest possible sums
+        """
+        values = self.get_support_values(var_name)
+        indices = {p: self.get_support_index(p) for p in parents}
+        weights = {p: int(self.rng.choice([-2, -1, 1, 2])) for p in parents}
+        low = sum(min(0, w * (len(indices[p]) - 1)) for p, w in weights.items())
+        high = sum(max(0, w * (len(indices[p]) - 1)) for p, w in weights.items())
+        thresholds = np.sort(self.rng.uniform(low, high, len(values) - 1))
+
+        def function(inputs, noise):
+            score = sum(weights[p] * indices[p][int(inputs[p])] for p in parents)
+            return torch.tensor(values[int(np.searchsorted(thresholds, score))])
+
+        return function
+
+    def lookup_function(self, var_name: str, parents: list):
+        """
+        Table with a random value of the variable for every combination of parent values
+        """
+        values = self.get_support_values(var_name)
+        table = {
+            parent_values: values[self.rng.integers(len(values))]
+            for parent_values in itertools.product(
+                *[self.get_support_values(p) for p in parents]
+            )
+        }
+
+        def function(inputs, noise):
+            return torch.tensor(table[tuple(int(inputs[p]) for p in parents)])
+
+        return function
@@ -1,6 +1,6 @@
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
-from counterfact.causal_models.variables import Variable, ExogenousNoise
-import numpy as np
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
 
 
 class Voting(StructuralCausalModel):
@@ -12,8 +12,11 @@ class Voting(StructuralCausalModel):
             + [Variable("winner", "bool")]
         )
 
-        def voter(inputs, noise):
-            return noise
+        def voter(var_name):
+            def voter_function(inputs, noise):
+                return noise[var_name]
+
+            return voter_function
 
         def winner(inputs, noise):
             return int(
@@ -24,11 +27,9 @@ class Voting(StructuralCausalModel):
         self.set_structural_functions(
             {
                 f"voter_{i}": StructuralFunction(
-                    voter,
+                    voter(f"voter_{i}"),
                     [],
-                    ExogenousNoise(
-                        f"u_voter_{i}", lambda: np.random.choice([0, 1], p=[0.5, 0.5])
-                    ),
+                    CategoricalNoise(f"u_voter_{i}", [0, 1], [0.5, 0.5]),
                 )
                 for i in range(1, n_voters + 1)
             }
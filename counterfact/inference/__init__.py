@@ -1,4 +1,25 @@
-from counterfact.inference.solver import *
-from counterfact.inference.binary_sat import *
-from counterfact.inference.random_search import *
-from counterfact.inference.exhaustive_search import *
+from counterfact.utils.lazy import attach
+
+# Solvers are imported on first use, so that using one solver does not import all of the others
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "solver": ["ACSolver"],
+        "binary_sat": ["BinarySAT"],
+        "random_search": ["RandomSearch"],
+        "exhaustive_search": ["HPExhaustiveSearch", "IVPExhaustiveSearch"],
+        "beam_search": ["HPBeamSearch"],
+        "lattice_search": ["HPLatticeSearch"],
+        "symmetry": ["find_exchangeable_variables", "SymmetricExhaustiveSearch"],
+        "monte_carlo": ["MonteCarloEstimator"],
+        "abduction": ["NoiseAbduction"],
+        "propagation": [
+            "MAX_FINITE_DOMAIN",
+            "PYTHON_OPS",
+            "Domain",
+            "DomainPropagation",
+            "expression_domain",
+        ],
+        "but_for": ["ButForMatrix"],
+    },
+)
@@ -0,0 +1,136 @@
+import itertools
+from typing import Dict, List
+import torch
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.utils.instrumentation import instrumentation
+
+
+class NoiseAbduction:
+
+    def __init__(self, env: StructuralCausalModel, noise_supports: Dict[str, list]):
+        """
+        Recover all configurations of the noise that are consistent with an observed, possibly partial, state
+        Structural functions are inverted over the finite noise supports with inverse tables, which map the values
+        of the parents of a variable to the noise values that produce each of its values. Variables are visited in
+        topological order, so each table lookup fixes the noise of one variable given the values of its parents,
+        and branches that contradict an observed value are pruned as soon as that variable is reached
+        Each structural function is assumed to only use the noise of its own variable
+        :param env: StructuralCausalModel
+        :param noise_supports: dict mapping variable names to lists of noise values, from
+        ACSolver.get_noise_supports
+        """
+        self.env = env
+        self.noise_supports = noise_supports
+        self.inverse_tables: Dict[str, Dict[tuple, dict]] = {
+            var: {} for var in env.topological_order
+        }
+
+    def get_inverse_table(self, var_name: str, parent_values: tuple):
+        """
+        Get the inverse table of a variable for the given values of its parents, building it if needed
+        :param var_name: name of the variable
+        :param parent_values: tuple of values of the parents of the variable, in the order of its parents
+        :return: dict mapping each value of the variable to a tuple of the value as a tensor and the list of noise
+        values that produce it, or [None] if the variable has no noise
+        """
+        table = self.inverse_tables[var_name]
+        if parent_values in table:
+            return table[parent_values]
+
+        structural_function = self.env.original_functions[var_name]
+        inputs = {
+            parent: torch.as_tensor(value)
+            for parent, value in zip(structural_function.parents, parent_values)
+        }
+        inverse = {}
+        for noise_value in self.noise_supports.get(var_name, [None]):
+            if instrumentation.enabled:
+                instrumentation.count("evaluate", var_name)
+            noise = {
+                var_name: (
+                    torch.as_tensor(noise_value)
+                    if noise_value is not None
+                    else torch.tensor(torch.nan)
+                )
+            }
+            output = torch.as_tensor(structural_function.evaluate(inputs, noise))
+            key = output.item()
+            if key not in inverse:
+                inverse[key] = (output, [])
+            inverse[key][1].append(noise_value)
+
+        table[parent_values] = inverse
+        return inverse
+
+    def abduce(self, observed: dict) -> List[dict]:
+        """
+        Find all states that agree with the observation, with the noise values that produce them
+        :param observed: dictionary of observed values of some or all variables
+        :return: list of dicts with
+            state: dictionary of values of all variables
+            noise: dict mapping every variable with noise to the list of its noise values consistent with the state
+        """
+        return list(self.iter_abduce(observed))
+
+    def iter_abduce(self, observed: dict):
+        """
+        Lazily generate all states that agree with the observation, with the noise values that produce them
+        States are generated by a depth-first search over the variables in topological order
+        :param observed: dictionary of observed values of some or all variables
+        :return: generator of dicts with state and noise, see abduce
+        """
+        for var in observed:
+            if var not in self.env.variables:
+                raise ValueError(f"Variable {var} not found.")
+        observed = {
+            var: value.item() if hasattr(value, "item") else value
+            for var, value in observed.items()
+        }
+
+        order = self.env.topological_order
+
+        def search(index: int, state: dict, noise: dict):
+            if index == len(order):
+                yield {"state": dict(state), "noise": dict(noise)}
+                return
+            var_name = order[index]
+            parents = self.env.original_functions[var_name].parents
+            inverse = self.get_inverse_table(
+                var_name, tuple(state[parent].item() for parent in parents)
+            )
+
+            # Observed variables only follow the branch that produces the observed value
+            if var_name in observed:
+                if observed[var_name] not in inverse:
+                    if instrumentation.enabled:
+                        instrumentation.count("abduction_pruned", var_name)
+                    return
+                branches = [inverse[observed[var_name]]]
+            else:
+                branches = inverse.values()
+
+            for value, noise_values in branches:
+                state[var_name] = value
+                if var_name in self.noise_supports:
+                    noise[var_name] = noise_values
+                yield from search(index + 1, state, noise)
+            state.pop(var_name, None)
+            noise.pop(var_name, None)
+
+        yield from search(0, {}, {})
+
+    def iter_noise_configurations(self, observed: dict):
+        """
+        Lazily generate every configuration of the noise that is consistent with the observation
+        :param observed: dictionary of observed values of some or all variables
+        :return: generator of dicts of tensors of noise values
+        """
+        for result in self.iter_abduce(observed):
+            noise_vars = list(result["noise"].keys())
+            for config in itertools.product(
+                *[result["noise"][var] for var in noise_vars]
+            ):
+                yield {
+                    var: torch.as_tensor(value)
+                    for var, value in zip(noise_vars, config)
+                }
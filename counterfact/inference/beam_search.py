@@ -0,0 +1,166 @@
+import itertools
+import math
+import numpy as np
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.inference.exhaustive_search import HPExhaustiveSearch
+from counterfact.utils.instrumentation import instrumentation
+
+
+class HPBeamSearch(HPExhaustiveSearch):
+
+    def __init__(
+        self,
+        env,
+        ac_defn,
+        beam_width: int = 8,
+        max_size: int = None,
+        n_flips: int = 64,
+        seed: int = None,
+        **kwargs,
+    ):
+        """
+        Search for actual causes among candidate events grown one variable at a time, keeping only the beam_width
+        most promising events of each size instead of enumerating all subsets of variables
+        Events are scored by the fraction of their alternative assignments that change the outcome, with all
+        candidates of a size evaluated together as counterfactual copies in a twin network. Every event in the
+        beam is checked with the full is_actual_cause test
+        :param env: StructuralCausalModel
+        :param ac_defn: ACDefinition
+        :param beam_width: number of events of each size that are checked and grown further
+        :param max_size: largest event size, defaults to all variables but one as in HPExhaustiveSearch
+        :param n_flips: number of alternative assignments above which the alternative assignments of an event
+        are sampled for its score
+        :param seed: seed for breaking ties between scores and sampling alternative assignments
+        :param kwargs: witness_store, twin_network, domain_propagation, but_for, but_for_pairs and
+        subevent_table, see HPExhaustiveSearch. Scores are always evaluated in a twin network
+        """
+        super().__init__(env, ac_defn, **kwargs)
+        self.beam_width = beam_width
+        self.max_size = max_size
+        self.n_flips = n_flips
+        self.seed = seed
+        self.scoring_network = (
+            self.twin_network if self.twin_network is not None else TwinNetwork(env)
+        )
+
+    def solve(self, state, outcome, noise=None):
+
+        # Collect the candidate variables in topological order
+        rng = np.random.default_rng(self.seed)
+        remaining_vars = [
+            var
+            for var in self.env.topological_order
+            if var in state and var not in outcome
+        ]
+        max_size = self.max_size
+        if max_size is None:
+            max_size = len(remaining_vars) - 1
+        actual_causes = {}
+        solver_kwargs = self.get_solver_kwargs(state, outcome, noise)
+
+        beam = [()]
+        for size in range(1, max_size + 1):
+
+            # Grow every event in the beam by one variable, generating each event once in topological order
+            candidates = []
+            generated = set()
+            for event_vars in beam:
+                for var in remaining_vars:
+                    if var in event_vars:
+                        continue
+                    candidate = tuple(
+                        v for v in remaining_vars if v in event_vars or v == var
+                    )
+                    if candidate in generated:
+                        continue
+                    generated.add(candidate)
+
+                    # Supersets of actual causes fail AC3 and cannot be actual causes
+                    if any(set(ac).issubset(candidate) for ac in actual_causes):
+                        continue
+                    candidates.append(candidate)
+            if len(candidates) == 0:
+                break
+
+            # Keep the highest scoring events, breaking ties in a random order
+            scores = self.score_events(candidates, state, outcome, noise, rng)
+            order = rng.permutation(len(candidates))
+            order = order[np.argsort(-scores[order], kind="stable")]
+            beam = [candidates[i] for i in order[: self.beam_width]]
+
+            # Check if the events in the beam are actual causes
+            for event_vars in beam:
+                event = {var: state[var] for var in event_vars}
+                is_actual_cause, info = self.ac_defn.is_actual_cause(
+                    self.env, event, outcome, state, noise, **solver_kwargs
+                )
+                if is_actual_cause:
+                    actual_causes[event_vars] = {"event": event, "info": info}
+            beam = [
+                event_vars for event_vars in beam if event_vars not in actual_causes
+            ]
+
+        return actual_causes
+
+    def score_events(self, events, state, outcome, noise, rng):
+        """
+        Score events by the fraction of their alternative assignments under which the outcome changes, evaluating
+        the alternative assignments of all events in batches of counterfactual copies
+        :param events: list of tuples of variable names
+        :param state: dictionary of values of all variables
+        :param outcome: dictionary of values of the outcome variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param rng: numpy random generator for sampling alternative assignments
+        :return: array of scores between 0 and 1, one per event
+        """
+        interventions = []
+        owners = []
+        for i, event_vars in enumerate(events):
+            for alt_assignment in self.get_alt_assignments(event_vars, state, rng):
+                interventions.append(dict(zip(event_vars, alt_assignment)))
+                owners.append(i)
+        if instrumentation.enabled:
+            instrumentation.count("beam_candidates_scored", n=len(events))
+
+        # Evaluate all alternative assignments under the same noise as counterfactual copies
+        noise = dict(noise) if noise is not None else {}
+        factual = self.env.get_state(noise)
+        batch_size = self.scoring_network.batch_size
+        changed = np.zeros(len(interventions), dtype=bool)
+        for start in range(0, len(interventions), batch_size):
+            _, counterfactuals = self.scoring_network.evaluate(
+                interventions[start : start + batch_size], noise, factual
+            )
+            changed[start : start + batch_size] = ~self.scoring_network.matches(
+                counterfactuals, outcome
+            )
+
+        owners = np.array(owners, dtype=int)
+        n_changed = np.bincount(owners[changed], minlength=len(events))
+        n_alt = np.bincount(owners, minlength=len(events))
+        return n_changed / np.maximum(n_alt, 1)
+
+    def get_alt_assignments(self, event_vars, state, rng):
+        """
+        Get the alternative assignments of the event variables, all of them if there are at most n_flips and a
+        sample of n_flips otherwise
+        :return: list of tuples of values, one per event variable, that differ from the state
+        """
+        supports = [self.env.get_support_values(var) for var in event_vars]
+        actual = tuple(_to_python(state[var]) for var in event_vars)
+        if math.prod(len(support) for support in supports) - 1 <= self.n_flips:
+            return [
+                assignment
+                for assignment in itertools.product(*supports)
+                if assignment != actual
+            ]
+        sizes = [len(support) for support in supports]
+        samples = rng.integers(0, sizes, size=(self.n_flips, len(sizes)))
+        alt_assignments = [
+            tuple(support[i] for support, i in zip(supports, row)) for row in samples
+        ]
+        return [assignment for assignment in alt_assignments if assignment != actual]
+
+
+def _to_python(value):
+    return value.item() if hasattr(value, "item") else value
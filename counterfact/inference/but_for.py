@@ -0,0 +1,124 @@
+import itertools
+from typing import Dict, List, Optional
+import numpy as np
+import torch
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.utils.instrumentation import instrumentation
+
+
+class ButForMatrix:
+
+    def __init__(
+        self,
+        env: StructuralCausalModel,
+        state: dict,
+        outcome: dict,
+        noise: Optional[Dict[str, torch.Tensor]] = None,
+        include_pairs: bool = False,
+        twin_network: TwinNetwork = None,
+    ):
+        """
+        Precompute which outcome variables change under every alternative value of every single variable, and
+        optionally of every pair of variables, in a state
+        All alternatives are evaluated as counterfactual copies in one batched pass of a twin network, and the
+        changes are stored as a boolean matrix with one row per alternative and one column per outcome variable.
+        Definitions use it to find alternative events that are necessary with an empty witness set before the
+        witness search, and solvers use it to order candidate events
+        :param env: StructuralCausalModel
+        :param state: dictionary of values of all variables
+        :param outcome: dictionary of values of the outcome variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param include_pairs: also evaluate all alternative assignments of every pair of variables
+        :param twin_network: TwinNetwork to evaluate the alternatives in, a new one is used if not given
+        """
+        self.state = {var: _to_python(value) for var, value in state.items()}
+        self.outcome_vars = list(outcome.keys())
+        self.variables = [
+            var for var in env.topological_order if var in state and var not in outcome
+        ]
+        self.max_size = 2 if include_pairs else 1
+
+        # Collect all assignments of every set of one or two variables that differ from the state
+        self.events: List[tuple] = []
+        self.alt_assignments: List[tuple] = []
+        supports = {var: env.get_support_values(var) for var in self.variables}
+        for size in range(1, self.max_size + 1):
+            for event_vars in itertools.combinations(self.variables, size):
+                actual = tuple(self.state[var] for var in event_vars)
+                for alt_assignment in itertools.product(
+                    *[supports[var] for var in event_vars]
+                ):
+                    if alt_assignment != actual:
+                        self.events.append(event_vars)
+                        self.alt_assignments.append(alt_assignment)
+        self.rows: Dict[frozenset, np.ndarray] = {}
+        for row, event_vars in enumerate(self.events):
+            self.rows.setdefault(frozenset(event_vars), []).append(row)
+        self.rows = {key: np.array(rows) for key, rows in self.rows.items()}
+
+        # Evaluate all alternatives under the same noise and compare each outcome variable to the state
+        if twin_network is None:
+            twin_network = TwinNetwork(env)
+        if instrumentation.enabled:
+            instrumentation.count("but_for_alternatives", n=len(self.events))
+        noise = dict(noise) if noise is not None else {}
+        factual = env.get_state(noise)
+        self.matrix = np.zeros((len(self.events), len(self.outcome_vars)), dtype=bool)
+        batch_size = twin_network.batch_size
+        for start in range(0, len(self.events), batch_size):
+            interventions = [
+                dict(zip(event_vars, alt_assignment))
+                for event_vars, alt_assignment in zip(
+                    self.events[start : start + batch_size],
+                    self.alt_assignments[start : start + batch_size],
+                )
+            ]
+            _, counterfactuals = twin_network.evaluate(interventions, noise, factual)
+            for column, var in enumerate(self.outcome_vars):
+                self.matrix[start : start + batch_size, column] = ~twin_network.matches(
+                    counterfactuals, {var: outcome[var]}
+                )
+
+    def covers(self, event_vars) -> bool:
+        """
+        Check if all alternatives of an event were evaluated
+        """
+        return len(event_vars) <= self.max_size and all(
+            var in self.state and var not in self.outcome_vars for var in event_vars
+        )
+
+    def get_alt_events(self, event_vars) -> List[dict]:
+        """
+        Get the alternative events under which the outcome changes without any witness
+        :param event_vars: list or tuple of variable names of an event covered by the matrix
+        :return: list of dictionaries of alternative values of the event variables
+        """
+        rows = self.rows.get(frozenset(event_vars), np.array([], dtype=int))
+        return [
+            dict(zip(self.events[row], self.alt_assignments[row]))
+            for row in rows[self.matrix[rows].any(axis=1)]
+        ]
+
+    def changes_outcome(self, event_vars) -> bool:
+        """
+        Check if any alternative of an event covered by the matrix changes the outcome without any witness
+        """
+        rows = self.rows.get(frozenset(event_vars))
+        return rows is not None and bool(self.matrix[rows].any())
+
+    def get_variable_scores(self) -> Dict[str, float]:
+        """
+        Fraction of the single variable alternatives of every variable that change the outcome
+        """
+        scores = {}
+        for var in self.variables:
+            rows = self.rows.get(frozenset([var]))
+            scores[var] = (
+                float(self.matrix[rows].any(axis=1).mean()) if rows is not None else 0.0
+            )
+        return scores
+
+
+def _to_python(value):
+    return value.item() if hasattr(value, "item") else value
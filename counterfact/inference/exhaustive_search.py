@@ -1,20 +1,53 @@
 import numpy as np
 from counterfact.causal_models.scm import StructuralCausalModel
-from counterfact.definitions import StructuralCausalModel
-from counterfact.definitions.ac_definition import (
-    ACDefinition,
-    FunctionalActualCause,
-    ModifiedHP,
-)
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.definitions.ac_definition import ACDefinition
+from counterfact.definitions.functional_ac import FunctionalActualCause
+from counterfact.definitions.modified_hp import ModifiedHP
+from counterfact.inference.but_for import ButForMatrix
+from counterfact.inference.propagation import DomainPropagation
 from counterfact.inference.solver import ACSolver
-from counterfact.utils import get_all_subsets
+from counterfact.utils import get_all_subsets, SubeventTable, WitnessStore
 
 
 class HPExhaustiveSearch(ACSolver):
 
-    def __init__(self, env, ac_defn):
+    def __init__(
+        self,
+        env,
+        ac_defn,
+        witness_store: WitnessStore = None,
+        twin_network: bool = False,
+        domain_propagation: bool = False,
+        but_for: bool = False,
+        but_for_pairs: bool = False,
+        subevent_table: SubeventTable = None,
+    ):
+        """
+        :param env: StructuralCausalModel
+        :param ac_defn: ACDefinition
+        :param witness_store: optional WitnessStore shared by all calls to solve, so that witness sets found for one
+        event are tried first for related events and states
+        :param twin_network: evaluate counterfactuals in batches with a TwinNetwork instead of intervening on and
+        resetting the model for each of them
+        :param domain_propagation: prune alternative events and witness sets that cannot change the outcome with
+        DomainPropagation before evaluating them
+        :param but_for: precompute a ButForMatrix of every state, which definitions use to find alternative events
+        that are necessary without a witness, and which orders candidate events of the same size
+        :param but_for_pairs: also evaluate alternatives of pairs of variables in the ButForMatrix
+        :param subevent_table: SubeventTable shared by all calls to solve, so the minimality check looks up events
+        that were already checked, a new table with the default size limit is used if not given
+        """
 
         super().__init__(env, ac_defn)
+        self.witness_store = witness_store
+        self.twin_network = TwinNetwork(env) if twin_network else None
+        self.domain_propagation = DomainPropagation(env) if domain_propagation else None
+        self.but_for = but_for or but_for_pairs
+        self.but_for_pairs = but_for_pairs
+        self.subevent_table = (
+            subevent_table if subevent_table is not None else SubeventTable()
+        )
 
         # Check if all variables are binary or discrete or int with finite support
         for var in env.variables:
@@ -30,6 +63,29 @@ class HPExhaustiveSearch(ACSolver):
                         f"Variable {var} is not int with finite support, cannot use exhaustive search"
                     )
 
+    def get_solver_kwargs(self, state=None, outcome=None, noise=None):
+        """
+        Collect the keyword arguments passed by the solver to the actual cause definition
+        The ButForMatrix is only built if the state and outcome are given, so this should be called once per state
+        """
+        kwargs = {"subevent_table": self.subevent_table}
+        if self.witness_store is not None:
+            kwargs["witness_store"] = self.witness_store
+        if self.twin_network is not None:
+            kwargs["twin_network"] = self.twin_network
+        if self.domain_propagation is not None:
+            kwargs["domain_propagation"] = self.domain_propagation
+        if self.but_for and state is not None and outcome is not None:
+            kwargs["but_for_matrix"] = ButForMatrix(
+                self.env,
+                state,
+                outcome,
+                noise,
+                include_pairs=self.but_for_pairs,
+                twin_network=self.twin_network,
+            )
+        return kwargs
+
     def solve(self, state, outcome, noise=None):
 
         # Collect lists for event, outcome, and remaining variables
@@ -41,6 +97,21 @@ class HPExhaustiveSearch(ACSolver):
         # Get all possible subsets of variables whose values can be candidate causes
         all_subsets = get_all_subsets(remaining_vars, shuffle_by_size=True)
 
+        # Check events that change the outcome without a witness first within each size
+        solver_kwargs = self.get_solver_kwargs(state, outcome, noise)
+        but_for_matrix = solver_kwargs.get("but_for_matrix")
+        if but_for_matrix is not None:
+            all_subsets = sorted(
+                all_subsets,
+                key=lambda subset: (
+                    len(subset),
+                    not (
+                        but_for_matrix.covers(subset)
+                        and but_for_matrix.changes_outcome(subset)
+                    ),
+                ),
+            )
+
         for subset in all_subsets:
             # Check if the event is a superset of a prior actual cause
             # If not, it will fail AC3 anyway and cannot be an actual cause
@@ -50,7 +121,7 @@ class HPExhaustiveSearch(ACSolver):
             # Check if the event is an actual cause
             event = {var: state[var] for var in subset}
             is_actual_cause, info = self.ac_defn.is_actual_cause(
-                self.env, event, outcome, state, noise
+                self.env, event, outcome, state, noise, **solver_kwargs
             )
             if is_actual_cause:
                 actual_causes[subset] = {"event": event, "info": info}
@@ -0,0 +1,93 @@
+from counterfact.inference.exhaustive_search import HPExhaustiveSearch
+from counterfact.utils.instrumentation import instrumentation
+
+
+class HPLatticeSearch(HPExhaustiveSearch):
+
+    def __init__(
+        self,
+        env,
+        ac_defn,
+        max_size: int = None,
+        **kwargs,
+    ):
+        """
+        Level-wise search over the lattice of candidate events, in the style of Apriori
+        An event that contains a necessary and sufficient subevent cannot be minimal, so candidates of each size
+        are only generated from pairs of candidates of the size below that share all but their last variable, and
+        only if none of their subevents one variable smaller was necessary and sufficient. All checked events are
+        recorded in the SubeventTable, so is_minimal does not check subevents again, and the search stops at the
+        first size without candidates
+        Finds the same actual causes as HPExhaustiveSearch
+        :param env: StructuralCausalModel
+        :param ac_defn: ACDefinition
+        :param max_size: largest event size, defaults to all variables but one as in HPExhaustiveSearch
+        :param kwargs: witness_store, twin_network, domain_propagation, but_for, but_for_pairs and
+        subevent_table, see HPExhaustiveSearch
+        """
+        super().__init__(env, ac_defn, **kwargs)
+        self.max_size = max_size
+
+    def solve(self, state, outcome, noise=None):
+
+        # Collect the candidate variables in topological order, so every event is a sorted tuple
+        remaining_vars = [
+            var
+            for var in self.env.topological_order
+            if var in state and var not in outcome
+        ]
+        max_size = self.max_size
+        if max_size is None:
+            max_size = len(remaining_vars) - 1
+        actual_causes = {}
+        solver_kwargs = self.get_solver_kwargs(state, outcome, noise)
+
+        candidates = [(var,) for var in remaining_vars]
+        for size in range(1, max_size + 1):
+            if len(candidates) == 0:
+                break
+            if instrumentation.enabled:
+                instrumentation.count("lattice_candidates", size, n=len(candidates))
+
+            # Check the candidates of this size, keeping those that are not necessary and sufficient
+            survivors = []
+            for subset in candidates:
+                event = {var: state[var] for var in subset}
+                is_actual_cause, info = self.ac_defn.is_actual_cause(
+                    self.env, event, outcome, state, noise, **solver_kwargs
+                )
+                if is_actual_cause:
+                    actual_causes[subset] = {"event": event, "info": info}
+                elif not (info["is_necessary"] and info["is_sufficient"]):
+                    survivors.append(subset)
+
+            candidates = self.generate_candidates(survivors)
+
+        return actual_causes
+
+    @staticmethod
+    def generate_candidates(survivors: list):
+        """
+        Generate the candidates one variable larger by joining surviving events that share all but their last
+        variable, keeping only candidates whose subevents one variable smaller all survived
+        :param survivors: list of sorted tuples of variable names of the same size
+        :return: list of sorted tuples of variable names
+        """
+        survivor_set = set(survivors)
+
+        # Group survivors by their prefix, the order of survivors within a group follows the variable order
+        groups = {}
+        for subset in survivors:
+            groups.setdefault(subset[:-1], []).append(subset[-1])
+
+        candidates = []
+        for prefix, last_vars in groups.items():
+            for i, first in enumerate(last_vars):
+                for second in last_vars[i + 1 :]:
+                    candidate = prefix + (first, second)
+                    if all(
+                        candidate[:j] + candidate[j + 1 :] in survivor_set
+                        for j in range(len(candidate) - 2)
+                    ):
+                        candidates.append(candidate)
+        return candidates
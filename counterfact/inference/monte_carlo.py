@@ -0,0 +1,216 @@
+from statistics import NormalDist
+from typing import Dict, Optional
+import numpy as np
+import torch
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.utils.instrumentation import instrumentation
+
+
+class MonteCarloEstimator:
+
+    def __init__(
+        self,
+        env: StructuralCausalModel,
+        batch_size: int = 1000,
+        max_samples: int = 100000,
+        ci_width: float = 0.02,
+        confidence: float = 0.95,
+        seed: Optional[int] = None,
+    ):
+        """
+        Monte-Carlo estimates of the probabilities of necessity and sufficiency for models whose noise space is
+        too large to enumerate
+        Factual and counterfactual worlds are sampled in paired batches that share the same noise, and batches
+        are drawn until the Wilson confidence interval of the estimate is narrower than ci_width
+        :param env: StructuralCausalModel
+        :param batch_size: number of noise samples per batch
+        :param max_samples: maximum number of noise samples, estimation stops here even if the interval is wider
+        :param ci_width: target width of the confidence interval
+        :param confidence: confidence level of the interval
+        :param seed: seed for sampling noise, which is drawn from generators owned by the estimator, so the
+        random draws of the rest of the process are not changed
+        """
+        self.env = env
+        self.batch_size = batch_size
+        self.max_samples = max_samples
+        self.ci_width = ci_width
+        self.confidence = confidence
+        self.rng = np.random.default_rng(seed)
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        else:
+            self.generator.seed()
+
+    def probability_of_necessity(
+        self, event: dict, outcome: dict, alt_event: Optional[dict] = None
+    ):
+        """
+        Estimate PN = P(Y_{x'} != y | X = x, Y = y), the probability that the outcome would not have occurred
+        without the event, given that both occurred
+        :param event: dictionary of values of the event variables, X = x
+        :param outcome: dictionary of values of the outcome variables, Y = y
+        :param alt_event: alternative values of the event variables x', defaults to flipping binary variables
+        :return: answer: estimate of PN
+        :return: info: dict with the confidence interval and the number of samples used
+        """
+        alt_event = self.get_alt_event(event, alt_event)
+
+        def condition(factual):
+            return _matches(factual, event) & _matches(factual, outcome)
+
+        def success(counterfactual):
+            return ~_matches(counterfactual, outcome)
+
+        return self.estimate(condition, alt_event, success)
+
+    def probability_of_sufficiency(
+        self, event: dict, outcome: dict, alt_event: Optional[dict] = None
+    ):
+        """
+        Estimate PS = P(Y_x = y | X = x', Y != y), the probability that the event would have produced the outcome,
+        given that neither occurred
+        :param event: dictionary of values of the event variables, X = x
+        :param outcome: dictionary of values of the outcome variables, Y = y
+        :param alt_event: alternative values of the event variables x', defaults to flipping binary variables
+        :return: answer: estimate of PS
+        :return: info: dict with the confidence interval and the number of samples used
+        """
+        alt_event = self.get_alt_event(event, alt_event)
+
+        def condition(factual):
+            return _matches(factual, alt_event) & ~_matches(factual, outcome)
+
+        def success(counterfactual):
+            return _matches(counterfactual, outcome)
+
+        return self.estimate(condition, event, success)
+
+    def estimate(self, condition, intervention: dict, success):
+        """
+        Estimate the probability of success in the world under the intervention, given the condition in the
+        factual world, by sampling paired batches with shared noise until the confidence interval is narrow enough
+        :param condition: function of a dict of factual samples, returning a boolean array of samples to keep
+        :param intervention: dictionary of values of the intervened variables in the counterfactual world
+        :param success: function of a dict of counterfactual samples, returning a boolean array of successes
+        :return: answer: estimate of the probability, nan if no sample satisfied the condition
+        :return: info: dict with the confidence interval, samples drawn, samples satisfying the condition,
+        successes and whether the target interval width was reached
+        """
+        n_samples = 0
+        n_conditioned = 0
+        n_successes = 0
+        low, high = 0.0, 1.0
+
+        while n_samples < self.max_samples:
+            batch_size = min(self.batch_size, self.max_samples - n_samples)
+            if instrumentation.enabled:
+                instrumentation.count("monte_carlo_samples", n=batch_size)
+
+            # Sample the factual world, then the counterfactual world with the same noise, without changing the model
+            noise = self.sample_noise(batch_size)
+            factual = self.env.sample(batch_size, noise=noise)
+            counterfactual = self.env.sample(
+                batch_size, noise=noise, intervention=intervention
+            )
+
+            keep = condition(factual)
+            n_samples += batch_size
+            n_conditioned += int(keep.sum())
+            n_successes += int((success(counterfactual) & keep).sum())
+
+            low, high = self.wilson_interval(n_successes, n_conditioned)
+            if n_conditioned > 0 and high - low <= self.ci_width:
+                break
+
+        estimate = n_successes / n_conditioned if n_conditioned > 0 else np.nan
+        info = {
+            "ci": (low, high),
+            "confidence": self.confidence,
+            "n_samples": n_samples,
+            "n_conditioned": n_conditioned,
+            "n_successes": n_successes,
+            "converged": n_conditioned > 0 and high - low <= self.ci_width,
+        }
+        return estimate, info
+
+    def sample_noise(self, n: int) -> Dict[str, torch.Tensor]:
+        """
+        Sample a batch of noise for every variable with a noise distribution
+        Torch distributions are sampled with the generator of the estimator where their type allows it, by
+        inverting their CDF or drawing from their probabilities, and with the global torch generator otherwise
+        """
+        noise = {}
+        for var_name, structural_function in self.env.original_functions.items():
+            noise_dist = structural_function.noise_dist
+            if noise_dist is None:
+                continue
+            if hasattr(noise_dist, "sample_batch"):
+                noise[var_name] = torch.as_tensor(noise_dist.sample_batch(n, self.rng))
+            else:
+                noise[var_name] = _sample_torch(noise_dist, n, self.generator)
+        return noise
+
+    def wilson_interval(self, n_successes: int, n_trials: int):
+        """
+        Wilson score interval for a binomial proportion
+        :return: tuple of lower and upper bounds, (0, 1) if there are no trials
+        """
+        if n_trials == 0:
+            return 0.0, 1.0
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        p = n_successes / n_trials
+        denominator = 1 + z**2 / n_trials
+        center = (p + z**2 / (2 * n_trials)) / denominator
+        margin = (
+            z * np.sqrt(p * (1 - p) / n_trials + z**2 / (4 * n_trials**2)) / denominator
+        )
+        return max(0.0, center - margin), min(1.0, center + margin)
+
+    def get_alt_event(self, event: dict, alt_event: Optional[dict] = None):
+        """
+        Get the alternative values of the event variables, flipping binary variables by default
+        """
+        if alt_event is not None:
+            return alt_event
+        alt_event = {}
+        for var, value in event.items():
+            if self.env.variables[var].var_type != "bool":
+                raise ValueError(
+                    f"An alternative value must be given for non-binary variable {var}."
+                )
+            alt_event[var] = 1 - int(value)
+        return alt_event
+
+
+def _sample_torch(noise_dist, n: int, generator: torch.Generator) -> torch.Tensor:
+    """
+    Draw n samples from a torch distribution with the given generator
+    """
+    if isinstance(noise_dist, torch.distributions.Bernoulli):
+        probs = noise_dist.probs.expand((n,) + noise_dist.batch_shape)
+        return torch.bernoulli(probs, generator=generator)
+    if isinstance(noise_dist, torch.distributions.Categorical):
+        probs = noise_dist.probs.reshape(-1, noise_dist.probs.shape[-1])
+        samples = torch.multinomial(probs, n, replacement=True, generator=generator)
+        return samples.T.reshape((n,) + noise_dist.batch_shape)
+    try:
+        uniform = torch.rand(
+            (n,) + noise_dist.batch_shape + noise_dist.event_shape,
+            generator=generator,
+        )
+        return noise_dist.icdf(uniform)
+    except NotImplementedError:
+        return noise_dist.sample((n,))
+
+
+def _matches(samples: Dict[str, torch.Tensor], assignment: dict) -> np.ndarray:
+    """
+    Boolean array of the samples that agree with the assignment on all of its variables
+    """
+    n = len(next(iter(samples.values())))
+    matches = np.ones(n, dtype=bool)
+    for var, value in assignment.items():
+        value = value.item() if hasattr(value, "item") else value
+        matches &= np.asarray(samples[var]) == value
+    return matches
@@ -0,0 +1,455 @@
+import itertools
+import math
+import operator
+from typing import Dict, List, Optional
+import numpy as np
+import torch
+from counterfact.causal_models.expressions import (
+    ARITHMETIC_OPS,
+    COMPARISON_OPS,
+    Expr,
+    ExpressionFunction,
+)
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.utils.instrumentation import instrumentation
+
+# Finite domains larger than this are widened to intervals
+MAX_FINITE_DOMAIN = 4096
+
+PYTHON_OPS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+}
+
+
+class Domain:
+    """
+    Set of values a variable can take, either a finite set of values or an interval [low, high]
+    """
+
+    __slots__ = ("values", "low", "high")
+
+    def __init__(self, values=None, low=None, high=None):
+        if values is not None and len(values) > MAX_FINITE_DOMAIN:
+            low, high, values = min(values), max(values), None
+        self.values = frozenset(values) if values is not None else None
+        if self.values is not None and not self.values:
+            self.low, self.high = np.inf, -np.inf
+        elif self.values is not None:
+            self.low, self.high = min(self.values), max(self.values)
+        else:
+            self.low, self.high = low, high
+
+    @classmethod
+    def interval(cls, low, high):
+        return cls(low=low, high=high)
+
+    @classmethod
+    def unknown(cls):
+        return cls(low=-np.inf, high=np.inf)
+
+    @property
+    def is_finite(self) -> bool:
+        return self.values is not None
+
+    def __len__(self):
+        if self.is_finite:
+            return len(self.values)
+        return MAX_FINITE_DOMAIN + 1
+
+    def is_singleton(self) -> bool:
+        return self.is_finite and len(self.values) == 1
+
+    def has_other_than(self, value) -> bool:
+        """
+        Check if the domain contains any value other than the given value
+        """
+        if self.is_finite:
+            return any(v != value for v in self.values)
+        return self.low != value or self.high != value
+
+    def union(self, other: "Domain") -> "Domain":
+        if self.is_finite and other.is_finite:
+            return Domain(self.values | other.values)
+        return Domain.interval(min(self.low, other.low), max(self.high, other.high))
+
+    def truth(self) -> "Domain":
+        """
+        Domain of the truth values of the values in the domain
+        """
+        if self.is_finite:
+            return Domain({int(bool(v)) for v in self.values})
+        if self.low > 0 or self.high < 0:
+            return Domain({1})
+        if self.low == 0 and self.high == 0:
+            return Domain({0})
+        return Domain({0, 1})
+
+    def __eq__(self, other):
+        if not isinstance(other, Domain):
+            return NotImplemented
+        return (self.values, self.low, self.high) == (
+            other.values,
+            other.low,
+            other.high,
+        )
+
+    def __repr__(self):
+        if self.is_finite:
+            return f"Domain({sorted(self.values)})"
+        return f"Domain([{self.low}, {self.high}])"
+
+
+class DomainPropagation:
+
+    def __init__(self, env: StructuralCausalModel, max_enumeration: int = 4096):
+        """
+        Propagate domains of possible values through the structural functions to rule out alternative events and
+        witness variables that cannot change the outcome, before any concrete evaluation
+        Intervened variables have a single value, variables that are not downstream of an intervention keep their
+        actual value, and the domain of every other variable is the image of its structural function over the
+        domains of its parents. Expressions are evaluated on domains directly, with interval arithmetic where
+        finite domains grow too large, and Python functions are enumerated over the product of the domains of
+        their parents, falling back to the whole support of the variable when the product is too large
+        Domains are supersets of the values that can occur, so pruning never removes a counterfactual that could
+        change the outcome. Propagation needs the noise, so nothing is pruned if it is not given
+        :param env: StructuralCausalModel
+        :param max_enumeration: maximum number of parent assignments a Python function is evaluated on
+        """
+        self.env = env
+        self.max_enumeration = max_enumeration
+        self.ancestors = {}
+
+    def propagate(
+        self,
+        intervention: dict,
+        state: dict,
+        noise: dict,
+        free_vars: Optional[list] = None,
+    ):
+        """
+        Find the domains of all variables under an intervention
+        :param intervention: dictionary of intervened values
+        :param state: dictionary of actual values of all variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param free_vars: variables that may or may not be fixed at their actual value, as in a witness set
+        :return: domains: dictionary of Domains of all variables
+        :return: changed: set of variables whose value can differ from their actual value
+        """
+        free_vars = set(free_vars) if free_vars is not None else set()
+        domains = {}
+        changed = set()
+        for var_name in self.env.topological_order:
+            actual = _to_number(state[var_name])
+            if var_name in intervention:
+                value = _to_number(intervention[var_name])
+                domains[var_name] = Domain({value})
+                if value != actual:
+                    changed.add(var_name)
+                continue
+
+            structural_function = self.env.original_functions[var_name]
+            if not any(parent in changed for parent in structural_function.parents):
+                domains[var_name] = Domain({actual})
+                continue
+
+            if instrumentation.enabled:
+                instrumentation.count("domain_propagations", var_name)
+            domain = self.get_image(var_name, domains, noise)
+            if domain.has_other_than(actual):
+                changed.add(var_name)
+            if var_name in free_vars:
+                domain = domain.union(Domain({actual}))
+            domains[var_name] = domain
+        return domains, changed
+
+    def get_image(self, var_name: str, domains: Dict[str, Domain], noise: dict):
+        """
+        Get the domain of the values of a structural function over the domains of its parents
+        """
+        structural_function = self.env.original_functions[var_name]
+        if isinstance(structural_function, ExpressionFunction):
+            noise_domains = {
+                var: Domain({_to_number(noise[var])})
+                for var in structural_function.expression.noise_variables()
+                if var in noise
+            }
+            return expression_domain(
+                structural_function.expression, domains, noise_domains
+            )
+
+        # Enumerate Python functions over all assignments of their parents if there are few enough
+        parents = structural_function.parents
+        parent_domains = [domains[parent] for parent in parents]
+        n_assignments = math.prod(len(domain) for domain in parent_domains)
+        if all(domain.is_finite for domain in parent_domains) and (
+            n_assignments <= self.max_enumeration
+        ):
+            try:
+                values = set()
+                for assignment in itertools.product(
+                    *[sorted(domain.values) for domain in parent_domains]
+                ):
+                    inputs = {
+                        parent: torch.as_tensor(value)
+                        for parent, value in zip(parents, assignment)
+                    }
+                    values.add(
+                        _to_number(structural_function.evaluate(inputs, dict(noise)))
+                    )
+                return Domain(values)
+            except (RuntimeError, TypeError, ValueError, KeyError, IndexError):
+                pass
+        return self.get_support_domain(var_name)
+
+    def get_support_domain(self, var_name: str) -> Domain:
+        """
+        Get the domain of all values in the support of a variable
+        """
+        var = self.env.variables[var_name]
+        if var.var_type == "int":
+            return Domain.interval(var.support[0], var.support[1])
+        if var.var_type in ["bool", "discrete"]:
+            return Domain(list(var.support))
+        return Domain.unknown()
+
+    def get_ancestors(self, var_names) -> set:
+        """
+        Get the ancestors of a set of variables in the original model, including the variables themselves
+        """
+        key = frozenset(var_names)
+        if key not in self.ancestors:
+            ancestors = set()
+            stack = list(var_names)
+            while stack:
+                var = stack.pop()
+                if var in ancestors:
+                    continue
+                ancestors.add(var)
+                stack.extend(self.env.get_parents(var))
+            self.ancestors[key] = ancestors
+        return self.ancestors[key]
+
+    def can_change_outcome(self, domains: Dict[str, Domain], outcome: dict) -> bool:
+        """
+        Check if any outcome variable can take a value other than its observed value
+        """
+        return any(
+            domains[var].has_other_than(_to_number(value))
+            for var, value in outcome.items()
+        )
+
+    def prune_alt_assignments(
+        self, event: dict, outcome: dict, state: dict, noise, event_combinations
+    ):
+        """
+        Remove alternative assignments of the event under which the outcome cannot change for any witness set
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param event_combinations: array of assignments of the event variables, in the order of the event
+        :return: array of the remaining assignments, in the same order
+        """
+        if noise is None:
+            return event_combinations
+        event_vars = list(event.keys())
+        free_vars = [
+            var for var in self.env.variables if var not in event and var not in outcome
+        ]
+        keep = []
+        for alt_assignment in event_combinations:
+            alt_event = dict(zip(event_vars, alt_assignment))
+            domains, _ = self.propagate(alt_event, state, noise, free_vars)
+            keep.append(self.can_change_outcome(domains, outcome))
+        if instrumentation.enabled:
+            instrumentation.count("alt_assignments_pruned", n=len(keep) - sum(keep))
+        return event_combinations[np.array(keep, dtype=bool)]
+
+    def prune_witness_sets(
+        self, alt_event: dict, outcome: dict, state: dict, noise, witness_sets: list
+    ):
+        """
+        Keep one witness set among those that only differ in variables that cannot change the outcome
+        Fixing a variable at its actual value has no effect if the alternative event cannot change its value, or
+        if it is not an ancestor of the outcome, so such witness sets give the same counterfactual
+        :param alt_event: dictionary of alternative values of the event variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :param witness_sets: list of candidate witness sets in the order they should be tried
+        :return: list of the first witness set of every group of equivalent witness sets, in the same order
+        """
+        if noise is None:
+            return witness_sets
+        free_vars = [
+            var
+            for var in self.env.variables
+            if var not in alt_event and var not in outcome
+        ]
+        _, changed = self.propagate(alt_event, state, noise, free_vars)
+        relevant = changed & self.get_ancestors(outcome.keys())
+        pruned = []
+        seen = set()
+        for witness_set in witness_sets:
+            key = frozenset(witness_set) & relevant
+            if key not in seen:
+                seen.add(key)
+                pruned.append(witness_set)
+        if instrumentation.enabled:
+            instrumentation.count(
+                "witness_sets_pruned", n=len(witness_sets) - len(pruned)
+            )
+        return pruned
+
+
+def expression_domain(
+    expr: Expr, domains: Dict[str, Domain], noise_domains: Dict[str, Domain]
+) -> Domain:
+    """
+    Evaluate an expression on domains of its variables and noise
+    Operations on small finite domains are evaluated exactly on every combination of values, and all other
+    operations use interval arithmetic
+    :param expr: Expr
+    :param domains: dictionary of Domains of the variables
+    :param noise_domains: dictionary of Domains of the noise, noise that is not given is unknown
+    :return: Domain containing every value the expression can take
+    """
+    op, args = expr.op, expr.args
+    if op == "var":
+        return domains[args[0]]
+    if op == "noise":
+        return noise_domains.get(args[0], Domain.unknown())
+    if op == "const":
+        return Domain({args[0]})
+    if op == "not":
+        return Domain(
+            {
+                1 - v
+                for v in expression_domain(args[0], domains, noise_domains)
+                .truth()
+                .values
+            }
+        )
+    if op in ["and", "or", "xor"]:
+        truths = [
+            expression_domain(arg, domains, noise_domains).truth().values
+            for arg in args
+        ]
+        if op == "and":
+            values = set()
+            if all(1 in t for t in truths):
+                values.add(1)
+            if any(0 in t for t in truths):
+                values.add(0)
+            return Domain(values)
+        if op == "or":
+            values = set()
+            if any(1 in t for t in truths):
+                values.add(1)
+            if all(0 in t for t in truths):
+                values.add(0)
+            return Domain(values)
+        parities = {0}
+        for t in truths:
+            parities = {p ^ v for p in parities for v in t}
+        return Domain(parities)
+    if op in COMPARISON_OPS or op in ARITHMETIC_OPS:
+        left = expression_domain(args[0], domains, noise_domains)
+        right = expression_domain(args[1], domains, noise_domains)
+        if left.is_finite and right.is_finite:
+            if len(left) * len(right) <= MAX_FINITE_DOMAIN:
+                return Domain(
+                    {
+                        int(result) if isinstance(result, bool) else result
+                        for result in (
+                            PYTHON_OPS[op](a, b)
+                            for a in left.values
+                            for b in right.values
+                        )
+                    }
+                )
+        if op in ARITHMETIC_OPS:
+            return _interval_arithmetic(op, left, right)
+        return _interval_comparison(op, left, right)
+    if op == "ite":
+        condition = expression_domain(args[0], domains, noise_domains).truth().values
+        if condition == {1}:
+            return expression_domain(args[1], domains, noise_domains)
+        if condition == {0}:
+            return expression_domain(args[2], domains, noise_domains)
+        return expression_domain(args[1], domains, noise_domains).union(
+            expression_domain(args[2], domains, noise_domains)
+        )
+    if op == "lookup":
+        keys, table, default = args
+        key_domains = [expression_domain(key, domains, noise_domains) for key in keys]
+        if (
+            all(domain.is_finite for domain in key_domains)
+            and math.prod(len(domain) for domain in key_domains) <= MAX_FINITE_DOMAIN
+        ):
+            values = set()
+            for key in itertools.product(*[domain.values for domain in key_domains]):
+                if key in table:
+                    values.add(table[key])
+                elif default is not None:
+                    values.add(default)
+            return Domain(values)
+        values = set(table.values())
+        if default is not None:
+            values.add(default)
+        return Domain(values)
+    raise ValueError(f"Unknown operator '{op}'.")
+
+
+def _interval_arithmetic(op: str, left: Domain, right: Domain) -> Domain:
+    if op == "add":
+        return Domain.interval(left.low + right.low, left.high + right.high)
+    if op == "sub":
+        return Domain.interval(left.low - right.high, left.high - right.low)
+    corners = [
+        a * b
+        for a in [left.low, left.high]
+        for b in [right.low, right.high]
+        if not (np.isinf(a) and b == 0) and not (np.isinf(b) and a == 0)
+    ] or [0]
+    if any(np.isinf(x) for x in [left.low, left.high, right.low, right.high]):
+        corners.append(0)
+    return Domain.interval(min(corners), max(corners))
+
+
+def _interval_comparison(op: str, left: Domain, right: Domain) -> Domain:
+    if op in ["gt", "ge"]:
+        op, left, right = {"gt": "lt", "ge": "le"}[op], right, left
+    values = set()
+    if op == "lt":
+        if left.low < right.high:
+            values.add(1)
+        if left.high >= right.low:
+            values.add(0)
+    elif op == "le":
+        if left.low <= right.high:
+            values.add(1)
+        if left.high > right.low:
+            values.add(0)
+    else:
+        overlap = left.low <= right.high and right.low <= left.high
+        all_equal = left.low == left.high == right.low == right.high
+        if op == "eq":
+            values.update({1} if overlap else set())
+            values.update(set() if all_equal else {0})
+        else:
+            values.update({0} if overlap else set())
+            values.update(set() if all_equal else {1})
+    return Domain(values)
+
+
+def _to_number(value):
+    return value.item() if hasattr(value, "item") else value
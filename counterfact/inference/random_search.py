@@ -41,7 +41,10 @@ class RandomSearch(ACSolver):
             attempted_events[size].add(event_tuple)
 
             # Check if the event is an actual cause without a witness set
-            if self.env.is_actual_cause(event, outcome, state, noise):
+            is_actual_cause, _ = self.ac_defn.is_actual_cause(
+                self.env, event, outcome, state, noise
+            )
+            if is_actual_cause:
                 actual_causes.append((event, []))
             else:
 
@@ -85,17 +88,21 @@ class RandomSearch(ACSolver):
                         # Add witness set to set of attempted witness sets
                         attempted_witness_sets[witness_size].add(witness_tuple)
 
-                        # Intervene on the witness set variables to set them to their actual values
+                        # Fix the witness set variables to their actual values
                         witness = {var: state[var] for var in witness_vars}
-                        self.env.intervene(witness)
 
-                        # Check if the event is an actual cause under the given witness
-                        if self.env.is_actual_cause(event, outcome, state, noise):
+                        # Check if the event is an actual cause under the given witness, without changing the model
+                        is_actual_cause, _ = self.ac_defn.is_actual_cause(
+                            self.env,
+                            event,
+                            outcome,
+                            state,
+                            noise,
+                            witness_set=list(witness_vars),
+                        )
+                        if is_actual_cause:
                             actual_causes.append((event, witness))
 
-                        # Reset the effect of the intervention on the witness set variables
-                        self.env.reset()
-
     def find_necessary_event(self, event, state, outcome, noise=None):
 
         # Collect lists for event, outcome, and remaining variables
@@ -187,9 +194,8 @@ class RandomSearch(ACSolver):
             for var_name in witness_set:
                 alt_event[var_name] = state[var_name]
 
-            # Intervene on the env to set the values in the alt event and witness set
-            self.env.intervene(alt_event)
+            # Query the model under the values in the alt event and witness set
+            alt_state = self.env.query(alt_event, noise)
 
             # Check if the event is necessary
-            alt_state = self.env.get_state(noise)
             alt_outcome = {var: alt_state[var] for var in outcome_vars}
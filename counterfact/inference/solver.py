@@ -1,10 +1,13 @@
-import pandas as pd
 import itertools
+import numpy as np
+import torch
 from typing import List
 from counterfact.causal_models.variables import Variable, ExogenousNoise
 from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
 from counterfact.definitions import ACDefinition
-from counterfact.inference import *
+from counterfact.inference.abduction import NoiseAbduction
+from counterfact.utils.instrumentation import instrumentation
+from counterfact.utils.search_order import assignment_key
 
 
 class ACSolver:
@@ -14,13 +17,19 @@ class ACSolver:
         self.ac_defn = ac_defn
 
     def solve_all_states(
-        self, env: StructuralCausalModel, ac_defn: ACDefinition, outcome_vars: List[str]
+        self,
+        env: StructuralCausalModel,
+        ac_defn: ACDefinition,
+        outcome_vars: List[str],
+        observed: dict = None,
     ):
         """
         Find all actual causes in all reachable states for a given outcome variable
         :param env: StructuralCausalModel
         :param ac_defn: ACDefinition
         :param outcome_vars: List of outcome variable names
+        :param observed: optional dictionary of observed values of some variables, only noise configurations that
+        are consistent with the observation are solved
         :return: dataframe containing states, outcomes and actual causes
         """
 
@@ -34,38 +43,17 @@ class ACSolver:
         col_tuples = (
             [("state", var) for var in state_vars if var not in outcome_vars]
             + [("outcome", var) for var in outcome_vars]
-            + [("actual_causes", "")]
+            + [("actual_causes", ""), ("probability", "")]
         )
+        # pandas is only needed for the table, so it is not imported with the package
+        import pandas as pd
+
         columns = pd.MultiIndex.from_tuples(col_tuples)
         ac_table = pd.DataFrame(columns=columns)
 
-        # Get supports and variable types for all variables that depend on exogenous noise
-        noise_supports = {}
-        for var_name, var in env.variables.items():
-            if var_name in env.structural_functions:
-                if env.structural_functions[var_name].noise_dist is not None:
-                    if var.var_type == "bool":
-                        noise_supports[var_name] = [0, 1]
-                    elif var.var_type == "int":
-                        noise_supports[var_name] = list(
-                            range(var.support[0], var.support[1] + 1)
-                        )
-                    elif var.var_type == "discrete":
-                        noise_supports[var_name] = var.support
-                    else:
-                        raise ValueError(
-                            f"get_all_actual_causes is only supported for discrete SCMs, {var_name} is {var.var_type}."
-                        )
-
-        # Get all possible configurations of noise variable values using itertools product
-        # Each configuration is a dict with variable names as keys and noise values as values
-        noise_configs = []
-        noise_vars = list(noise_supports.keys())
-        for noise_vals in itertools.product(*noise_supports.values()):
-            noise_configs.append(dict(zip(noise_vars, noise_vals)))
-
-        # For each value of noise variables, generate the state and find actual causes of the outcome
-        for noise in noise_configs:
+        # For each configuration of noise variables, generate the state and find actual causes of the outcome
+        # Configurations are generated lazily, along with their probabilities
+        for noise, prob in self.iter_noise_configurations(env, observed):
 
             # Get the state for the given noise configuration
             state = env.get_state(noise)
@@ -74,7 +62,8 @@ class ACSolver:
             for var in outcome_vars:
                 outcome[var] = state[var]
             # Find all actual causes for the outcome in the given state
-            actual_causes = self.solve(state, outcome, noise)
+            with instrumentation.span("solve"):
+                actual_causes = self.solve(state, outcome, noise)
 
             # Add the state, outcome and actual causes to the table
             # One column each for state, outcome, and actual causes
@@ -85,15 +74,196 @@ class ACSolver:
             # Always follow topological order
 
             combined_row = {
-                ("state", k): v for k, v in state.items() if k not in outcome_vars
+                ("state", k): v.item() if hasattr(v, "item") else v
+                for k, v in state.items()
+                if k not in outcome_vars
             }
-            combined_row.update({("outcome", k): v for k, v in outcome.items()})
+            combined_row.update(
+                {
+                    ("outcome", k): v.item() if hasattr(v, "item") else v
+                    for k, v in outcome.items()
+                }
+            )
             combined_row[("actual_causes", "")] = list(actual_causes.keys())
+            combined_row[("probability", "")] = prob
             # Add row to table
             ac_table = ac_table._append(combined_row, ignore_index=True)
 
         return ac_table
 
+    def get_cause_probabilities(
+        self,
+        env: StructuralCausalModel,
+        ac_defn: ACDefinition,
+        outcome_vars: List[str],
+        observed: dict = None,
+    ):
+        """
+        Find the exact probability of every actual cause of every outcome, over all configurations of the noise
+        Each configuration is weighted by its probability under the noise distributions, and the statistics are
+        accumulated while streaming over configurations, so memory does not grow with the number of configurations
+        :param env: StructuralCausalModel
+        :param ac_defn: ACDefinition
+        :param outcome_vars: List of outcome variable names
+        :param observed: optional dictionary of observed values of some variables, only noise configurations that
+        are consistent with the observation are counted, so all probabilities are joint with the observation
+        :return: dict with
+            cause_probabilities: P(event occurs, outcome occurs and the event is an actual cause of the outcome),
+                keyed by (event, outcome) where both are tuples of (variable, value) pairs
+            conditional_cause_probabilities: the same probabilities conditioned on the outcome
+            outcome_probabilities: P(outcome), keyed by outcome
+            total_probability: total probability of all configurations, which is 1, or the probability of the
+                observation if one is given
+            n_configurations: number of noise configurations with non-zero probability
+        """
+        cause_probs = {}
+        outcome_probs = {}
+        total_prob = 0.0
+        n_configs = 0
+
+        for noise, prob in self.iter_noise_configurations(env, observed):
+            if np.isnan(prob):
+                raise ValueError(
+                    "Cause probabilities need noise distributions with an enumerable support."
+                )
+            if prob == 0:
+                continue
+            n_configs += 1
+            total_prob += prob
+
+            # Get the state and outcome for the given noise configuration
+            state = env.get_state(noise)
+            outcome = {var: state[var] for var in outcome_vars}
+            outcome_key = assignment_key(outcome)
+            outcome_probs[outcome_key] = outcome_probs.get(outcome_key, 0.0) + prob
+
+            # Add the probability of the configuration to every actual cause found in it
+            with instrumentation.span("solve"):
+                actual_causes = self.solve(state, outcome, noise)
+            for actual_cause in actual_causes.values():
+                key = (assignment_key(actual_cause["event"]), outcome_key)
+                cause_probs[key] = cause_probs.get(key, 0.0) + prob
+
+        conditional_cause_probs = {
+            (event_key, outcome_key): prob / outcome_probs[outcome_key]
+            for (event_key, outcome_key), prob in cause_probs.items()
+        }
+        return {
+            "cause_probabilities": cause_probs,
+            "conditional_cause_probabilities": conditional_cause_probs,
+            "outcome_probabilities": outcome_probs,
+            "total_probability": total_prob,
+            "n_configurations": n_configs,
+        }
+
+    def iter_noise_configurations(
+        self, env: StructuralCausalModel, observed: dict = None
+    ):
+        """
+        Lazily generate all configurations of the noise variables with their probabilities
+        Noise variables are independent, so the probability of a configuration is the product of the
+        probabilities of its values, and the joint distribution is never materialized
+        :param env: StructuralCausalModel
+        :param observed: optional dictionary of observed values of some variables, only configurations that are
+        consistent with the observation are generated, found by NoiseAbduction without enumerating the others
+        :return: generator of (noise, probability) tuples, where noise is a dict of tensors and the probability
+        is nan if any noise distribution does not give probabilities
+        """
+        noise_supports = self.get_noise_supports(env)
+        noise_probs = self.get_noise_probabilities(env, noise_supports)
+        noise_vars = list(noise_supports.keys())
+        factors = [
+            list(
+                zip(
+                    noise_supports[var],
+                    (
+                        noise_probs[var]
+                        if noise_probs[var] is not None
+                        else [np.nan] * len(noise_supports[var])
+                    ),
+                )
+            )
+            for var in noise_vars
+        ]
+
+        # Only generate configurations that are consistent with the observation
+        if observed is not None:
+            value_probs = {
+                var: dict(factor) for var, factor in zip(noise_vars, factors)
+            }
+            abduction = NoiseAbduction(env, noise_supports)
+            for noise in abduction.iter_noise_configurations(observed):
+                prob = 1.0
+                for var, value in noise.items():
+                    prob *= value_probs[var][value.item()]
+                yield noise, prob
+            return
+
+        for config in itertools.product(*factors):
+            noise = {}
+            prob = 1.0
+            for var, (value, value_prob) in zip(noise_vars, config):
+                noise[var] = torch.as_tensor(value)
+                prob *= value_prob
+            yield noise, prob
+
+    def get_noise_supports(self, env: StructuralCausalModel):
+        """
+        Get the support of the exogenous noise of every variable that has a noise distribution
+        Distributions with an enumerable support, such as CategoricalNoise, give their exact support, otherwise
+        the noise support is taken to be the support of the variable itself
+        :param env: StructuralCausalModel
+        :return: dict mapping variable names to lists of noise values
+        """
+        noise_supports = {}
+        for var_name, var in env.variables.items():
+            if var_name in env.structural_functions:
+                noise_dist = env.structural_functions[var_name].noise_dist
+                if noise_dist is None:
+                    continue
+                if getattr(noise_dist, "has_enumerate_support", False):
+                    noise_supports[var_name] = [
+                        value.item() if hasattr(value, "item") else value
+                        for value in noise_dist.enumerate_support()
+                    ]
+                elif var.var_type == "bool":
+                    noise_supports[var_name] = [0, 1]
+                elif var.var_type == "int":
+                    noise_supports[var_name] = list(
+                        range(var.support[0], var.support[1] + 1)
+                    )
+                elif var.var_type == "discrete":
+                    noise_supports[var_name] = var.support
+                else:
+                    raise ValueError(
+                        f"get_all_actual_causes is only supported for discrete SCMs, {var_name} is {var.var_type}."
+                    )
+        return noise_supports
+
+    def get_noise_probabilities(self, env: StructuralCausalModel, noise_supports=None):
+        """
+        Get the probability of every value in the noise supports
+        :param env: StructuralCausalModel
+        :param noise_supports: dict mapping variable names to lists of noise values, from get_noise_supports
+        :return: dict mapping variable names to lists of probabilities, or None for variables whose noise
+        distribution does not have an enumerable support
+        """
+        if noise_supports is None:
+            noise_supports = self.get_noise_supports(env)
+        noise_probs = {}
+        for var_name, support in noise_supports.items():
+            noise_dist = env.structural_functions[var_name].noise_dist
+            if not getattr(noise_dist, "has_enumerate_support", False):
+                noise_probs[var_name] = None
+            elif hasattr(noise_dist, "prob"):
+                noise_probs[var_name] = [noise_dist.prob(value) for value in support]
+            else:
+                noise_probs[var_name] = [
+                    noise_dist.log_prob(torch.as_tensor(value)).exp().item()
+                    for value in support
+                ]
+        return noise_probs
+
     def get_actual_cause(
         self,
         state: dict,
@@ -0,0 +1,329 @@
+import itertools
+import math
+import numpy as np
+import torch
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.causal_models.expressions import Expr, ExpressionFunction
+from counterfact.definitions import ACDefinition
+from counterfact.inference.exhaustive_search import HPExhaustiveSearch
+
+
+def find_exchangeable_variables(
+    env: StructuralCausalModel, max_assignments: int = 64, seed: int = 0
+):
+    """
+    Partition the variables of an SCM into orbits of interchangeable variables
+    Two variables are interchangeable if they have the same type, support, parents and children,
+    the same structural function and noise distribution up to renaming of the two variables,
+    and if the structural function of every child is invariant to swapping their values
+    :param env: StructuralCausalModel
+    :param max_assignments: largest number of swaps checked for each pair of variables and child, above which
+    child invariance is checked on a random sample of the other parents
+    :param seed: seed for sampling parent assignments
+    :return: list of orbits, each a list of at least two variable names in topological order
+    """
+    rng = np.random.default_rng(seed)
+
+    # Group variables by type, support, parents and children
+    groups = {}
+    for var_name in env.topological_order:
+        var = env.variables[var_name]
+        key = (
+            var.var_type,
+            tuple(var.support) if var.support is not None else None,
+            frozenset(env.get_parents(var_name)),
+            frozenset(env.get_children(var_name)),
+        )
+        groups.setdefault(key, []).append(var_name)
+
+    # Within each group, add variables to the orbit of the first variable they can be swapped with
+    # Transpositions with a common member generate the full symmetric group, so the orbit is closed under permutation
+    orbits = []
+    for group in groups.values():
+        remaining = list(group)
+        while len(remaining) > 1:
+            representative = remaining.pop(0)
+            orbit = [representative]
+            for var_name in list(remaining):
+                if _is_swappable(env, representative, var_name, max_assignments, rng):
+                    orbit.append(var_name)
+                    remaining.remove(var_name)
+            if len(orbit) > 1:
+                orbits.append(orbit)
+
+    return orbits
+
+
+def _is_swappable(env, x, y, max_assignments, rng):
+    """
+    Check if swapping two variables with the same parents and children leaves the model unchanged
+    """
+    renaming = {x: y}
+    function_x = env.original_functions.get(x)
+    function_y = env.original_functions.get(y)
+    if function_x is None or function_y is None:
+        return function_x is function_y
+    if not _same_value(function_x.function, function_y.function, renaming):
+        return False
+    if not _same_noise(function_x.noise_dist, function_y.noise_dist, renaming):
+        return False
+
+    # The structural function of every child must be symmetric in the two variables
+    for child in env.get_children(x):
+        if not _is_symmetric(env, child, x, y, max_assignments, rng):
+            return False
+    return True
+
+
+def _is_symmetric(env, child, x, y, max_assignments, rng):
+    """
+    Check if the structural function of a child is invariant to swapping the values of two of its parents
+    Every check fixes the other parents to one context and swaps one pair of different values of the two parents,
+    which have the same support. All contexts are checked if there are few enough, and a random sample of them
+    otherwise, so the number of evaluations does not grow with the product of the supports of all parents
+    """
+    structural_function = env.original_functions[child]
+    supports = {
+        parent: [torch.tensor(value) for value in env.get_support_values(parent)]
+        for parent in structural_function.parents
+    }
+    other_parents = [parent for parent in supports if parent not in (x, y)]
+    noise_dist = structural_function.noise_dist
+    noise = {child: noise_dist.sample()} if noise_dist is not None else {}
+
+    # Swapping equal values leaves the inputs unchanged, so only pairs of different values are checked
+    value_pairs = list(itertools.combinations(supports[x], 2))
+    if not value_pairs:
+        return True
+
+    # Enumerate all contexts of the other parents, or a random sample of them if there are too many
+    max_contexts = max(1, max_assignments // len(value_pairs))
+    if math.prod(len(supports[parent]) for parent in other_parents) <= max_contexts:
+        contexts = itertools.product(*(supports[parent] for parent in other_parents))
+    else:
+        sizes = [len(supports[parent]) for parent in other_parents]
+        indices = rng.integers(0, sizes, size=(max_contexts, len(sizes)))
+        contexts = (
+            [supports[parent][i] for parent, i in zip(other_parents, row)]
+            for row in indices
+        )
+
+    for context in contexts:
+        inputs = dict(zip(other_parents, context))
+        for value_x, value_y in value_pairs:
+            output = structural_function.evaluate(
+                inputs | {x: value_x, y: value_y}, dict(noise)
+            )
+            swapped_output = structural_function.evaluate(
+                inputs | {x: value_y, y: value_x}, dict(noise)
+            )
+            if not _same_value(output, swapped_output):
+                return False
+    return True
+
+
+def _same_noise(noise_x, noise_y, renaming):
+    """
+    Check if two noise distributions are the same up to their names
+    """
+    if noise_x is None or noise_y is None:
+        return noise_x is noise_y
+    if noise_x is noise_y:
+        return True
+    if type(noise_x) is not type(noise_y):
+        return False
+    attributes_x = {k: v for k, v in vars(noise_x).items() if k != "name"}
+    attributes_y = {k: v for k, v in vars(noise_y).items() if k != "name"}
+    if attributes_x.keys() != attributes_y.keys():
+        return False
+    return all(
+        _same_value(attributes_x[k], attributes_y[k], renaming) for k in attributes_x
+    )
+
+
+def _same_value(value_x, value_y, renaming=None):
+    """
+    Check if two values are the same, where names of swapped variables in renaming are treated as equal
+    Functions are compared by their bytecode, constants and closures, and expressions by their structure
+    """
+    if value_x is value_y:
+        return True
+    if renaming and isinstance(value_x, str) and renaming.get(value_x) == value_y:
+        return True
+    if isinstance(value_x, Expr) and isinstance(value_y, Expr):
+        return _same_value(
+            (value_x.op, value_x.args), (value_y.op, value_y.args), renaming
+        )
+    if isinstance(value_x, ExpressionFunction):
+        if not isinstance(value_y, ExpressionFunction):
+            return False
+        return _same_value(value_x.expression, value_y.expression, renaming)
+    if hasattr(value_x, "__func__") and hasattr(value_x, "__self__"):
+        # Bound methods share their code, so compare the objects they are bound to
+        if getattr(value_y, "__func__", None) is not value_x.__func__:
+            return False
+        return _same_value(value_x.__self__, value_y.__self__, renaming)
+    if callable(value_x) and hasattr(value_x, "__code__"):
+        if not callable(value_y) or not hasattr(value_y, "__code__"):
+            return False
+        code_x, code_y = value_x.__code__, value_y.__code__
+        if code_x.co_code != code_y.co_code or code_x.co_names != code_y.co_names:
+            return False
+        if not _same_value(code_x.co_consts, code_y.co_consts, renaming):
+            return False
+        closure_x = [cell.cell_contents for cell in value_x.__closure__ or ()]
+        closure_y = [cell.cell_contents for cell in value_y.__closure__ or ()]
+        return _same_value(closure_x, closure_y, renaming)
+    if isinstance(value_x, (list, tuple)) and isinstance(value_y, (list, tuple)):
+        return len(value_x) == len(value_y) and all(
+            _same_value(a, b, renaming) for a, b in zip(value_x, value_y)
+        )
+    if isinstance(value_x, dict) and isinstance(value_y, dict):
+        return value_x.keys() == value_y.keys() and all(
+            _same_value(value_x[k], value_y[k], renaming) for k in value_x
+        )
+    if isinstance(value_x, (torch.Tensor, np.ndarray, int, float, bool, np.generic)):
+        try:
+            return bool(np.array_equal(np.asarray(value_x), np.asarray(value_y)))
+        except (TypeError, ValueError):
+            return False
+    try:
+        return bool(value_x == value_y)
+    except (TypeError, ValueError, RuntimeError):
+        return False
+
+
+def _as_key(value):
+    """
+    Convert a variable value to a hashable key
+    """
+    if isinstance(value, (torch.Tensor, np.ndarray, np.generic)):
+        return np.asarray(value).tolist()
+    return value
+
+
+def _rename(value, mapping):
+    """
+    Rename variables in the keys of (nested) dictionaries returned as info by the definitions
+    """
+    if isinstance(value, dict):
+        return {mapping.get(k, k): _rename(v, mapping) for k, v in value.items()}
+    return value
+
+
+class SymmetricExhaustiveSearch(HPExhaustiveSearch):
+
+    def __init__(
+        self,
+        env: StructuralCausalModel,
+        ac_defn: ACDefinition,
+        orbits: list = None,
+        **kwargs,
+    ):
+        """
+        Exhaustive search that only checks one representative per orbit of interchangeable variables
+        :param env: StructuralCausalModel
+        :param ac_defn: ACDefinition
+        :param orbits: list of orbits of interchangeable variables, detected automatically if not given
+        :param kwargs: witness_store, twin_network, domain_propagation, but_for, but_for_pairs and subevent_table,
+        see HPExhaustiveSearch
+        """
+        super().__init__(env, ac_defn, **kwargs)
+        self.orbits = orbits if orbits is not None else find_exchangeable_variables(env)
+
+    def get_symmetry_classes(self, state: dict, outcome: dict, noise: dict = None):
+        """
+        Split orbits into classes of candidate variables that can be permuted without changing the state or noise
+        :param state: dictionary of values of all observable variables
+        :param outcome: dictionary of values of the outcome variables
+        :param noise: dictionary of values of all exogenous noise variables
+        :return: list of classes, each a list of at least two variable names
+        """
+        classes = []
+        for orbit in self.orbits:
+            groups = {}
+            for var in orbit:
+                if var in outcome or var not in state:
+                    continue
+                noise_value = noise.get(var) if noise is not None else None
+                key = (repr(_as_key(state[var])), repr(_as_key(noise_value)))
+                groups.setdefault(key, []).append(var)
+            classes.extend([group for group in groups.values() if len(group) > 1])
+        return classes
+
+    def get_representatives(self, free_vars: list, classes: list, size: int):
+        """
+        Generate one subset of the given size for each orbit of subsets under permutations within classes
+        Representatives always use the first members of each class
+        :param free_vars: variables that do not belong to any class
+        :param classes: list of classes of interchangeable variables
+        :param size: size of the subsets
+        :return: generator of (free variables, counts per class) pairs
+        """
+        for n_free in range(min(size, len(free_vars)) + 1):
+            for free_subset in itertools.combinations(free_vars, n_free):
+                for counts in itertools.product(
+                    *[range(len(cls) + 1) for cls in classes]
+                ):
+                    if sum(counts) == size - n_free:
+                        yield free_subset, counts
+
+    def solve(self, state, outcome, noise=None):
+
+        # Collect lists for outcome and remaining variables
+        outcome_vars = list(outcome.keys())
+        remaining_vars = [var for var in state if var not in outcome_vars]
+        actual_causes = {}
+
+        # Variables that cannot be permuted are always enumerated explicitly
+        classes = self.get_symmetry_classes(state, outcome, noise)
+        class_vars = set(var for cls in classes for var in cls)
+        free_vars = [var for var in remaining_vars if var not in class_vars]
+        solver_kwargs = self.get_solver_kwargs(state, outcome, noise)
+
+        # Check subsets of increasing size, excluding the full set as in HPExhaustiveSearch
+        for size in range(1, len(remaining_vars)):
+            for free_subset, counts in self.get_representatives(
+                free_vars, classes, size
+            ):
+                members = [cls[:count] for cls, count in zip(classes, counts)]
+                subset = self._ordered(remaining_vars, free_subset, members)
+
+                # A superset of a prior actual cause will fail AC3 anyway and cannot be an actual cause
+                if any([set(ac).issubset(set(subset)) for ac in actual_causes]):
+                    continue
+
+                # Check if the representative event is an actual cause
+                event = {var: state[var] for var in subset}
+                is_actual_cause, info = self.ac_defn.is_actual_cause(
+                    self.env, event, outcome, state, noise, **solver_kwargs
+                )
+                if not is_actual_cause:
+                    continue
+
+                # Expand the representative to all events in its orbit
+                for images in itertools.product(
+                    *[
+                        itertools.combinations(cls, count)
+                        for cls, count in zip(classes, counts)
+                    ]
+                ):
+                    mapping = {}
+                    for cls, count, image in zip(classes, counts, images):
+                        others = [var for var in cls if var not in image]
+                        mapping.update(zip(cls, list(image) + others))
+                    image_subset = self._ordered(remaining_vars, free_subset, images)
+                    actual_causes[image_subset] = {
+                        "event": {var: state[var] for var in image_subset},
+                        "info": _rename(info, mapping),
+                    }
+
+        return actual_causes
+
+    @staticmethod
+    def _ordered(var_order, free_subset, members):
+        """
+        Combine free variables and class members into a subset ordered like the state
+        """
+        subset = set(free_subset).union(*[set(m) for m in members])
+        return tuple(var for var in var_order if var in subset)
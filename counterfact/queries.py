@@ -0,0 +1,389 @@
+import copy
+import math
+import time
+from collections.abc import Mapping
+from typing import Dict, Optional
+import numpy as np
+import torch
+from counterfact import examples
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.definitions import ModifiedHP, OriginalHP, DirectActualCause
+from counterfact.inference import HPExhaustiveSearch, HPBeamSearch, HPLatticeSearch
+from counterfact.utils import (
+    HeuristicSearchOrder,
+    RandomSearchOrder,
+    ResultCache,
+    get_definition_fingerprint,
+)
+
+# Models, definitions, solvers and search orders that queries can refer to by name
+# Models are looked up in counterfact.examples on first use, so that only the examples that are served are imported
+MODELS = list(examples.__all__)
+
+DEFINITIONS = {
+    "ModifiedHP": ModifiedHP,
+    "OriginalHP": OriginalHP,
+    "DirectActualCause": DirectActualCause,
+}
+
+SOLVERS = {
+    "HPExhaustiveSearch": HPExhaustiveSearch,
+    "HPBeamSearch": HPBeamSearch,
+    "HPLatticeSearch": HPLatticeSearch,
+}
+
+SEARCH_ORDERS = {
+    "random": RandomSearchOrder,
+    "heuristic": HeuristicSearchOrder,
+}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class Budget:
+
+    def __init__(self, max_queries: int = None, timeout: float = None):
+        """
+        Limit on the work done for one query, so that one expensive query cannot hold a worker indefinitely
+        The budget is charged for every evaluation of the model and checked at the same time, so a query stops at
+        the first evaluation after it runs out
+        :param max_queries: maximum number of evaluations of the model, unlimited if None
+        :param timeout: maximum wall time in seconds, unlimited if None
+        """
+        self.max_queries = max_queries
+        self.timeout = timeout
+        self.n_queries = 0
+        self.n_function_evaluations = 0
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+
+    @classmethod
+    def from_dict(cls, budget: Optional[dict], limit: Optional[dict] = None):
+        """
+        Create the budget of a query, capped by the limit of the server
+        :param budget: dict with optional max_queries and timeout requested by the query
+        :param limit: dict with optional max_queries and timeout that no query can exceed
+        :return: Budget
+        """
+        budget = budget or {}
+        limit = limit or {}
+        values = {}
+        for key in ["max_queries", "timeout"]:
+            candidates = [
+                value
+                for value in [budget.get(key), limit.get(key)]
+                if value is not None
+            ]
+            values[key] = min(candidates) if candidates else None
+        return cls(**values)
+
+    def charge(self, n: int = 1):
+        """
+        Charge evaluations of the model to the budget
+        :param n: number of evaluations
+        :raise BudgetExceeded: if the budget is used up
+        """
+        self.n_queries += n
+        if self.max_queries is not None and self.n_queries > self.max_queries:
+            raise BudgetExceeded(
+                f"Query exceeded its budget of {self.max_queries} model evaluations."
+            )
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded(f"Query exceeded its budget of {self.timeout}s.")
+
+    def charge_functions(self, n: int, n_variables: int):
+        """
+        Charge evaluations of single structural functions, such as the batched counterfactuals of a twin network,
+        where every n_variables of them count as one evaluation of the model
+        :param n: number of evaluations of structural functions
+        :param n_variables: number of variables of the model
+        :raise BudgetExceeded: if the budget is used up
+        """
+        self.n_function_evaluations += n
+        n_queries, self.n_function_evaluations = divmod(
+            self.n_function_evaluations, n_variables
+        )
+        self.charge(n_queries)
+
+
+class BudgetedModel:
+
+    def __init__(self, env: StructuralCausalModel, budget: Budget):
+        """
+        View of a model that is shared between queries, which charges every evaluation to the budget of one query
+        Definitions and solvers only read the model through query and get_state, so the view refuses interventions,
+        which would change the model for all other queries. Twin networks, but-for matrices, domain propagation and
+        abduction evaluate structural functions directly, so the structural functions are charged as well
+        :param env: StructuralCausalModel
+        :param budget: Budget of the query
+        """
+        self.env = env
+        self.budget = budget
+        n_variables = max(1, len(env.topological_order))
+        self.structural_functions = BudgetedFunctions(
+            env.structural_functions, budget, n_variables
+        )
+        self.original_functions = BudgetedFunctions(
+            env.original_functions, budget, n_variables
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def query(self, intervention=None, noise=None):
+        self.budget.charge()
+        return self.env.query(intervention, noise)
+
+    def get_state(self, noise=None):
+        self.budget.charge()
+        return self.env.get_state(noise)
+
+    def get_compact_state(self, noise=None):
+        self.budget.charge()
+        return self.env.get_compact_state(noise)
+
+    def do(self, var_name, value):
+        raise RuntimeError("Shared models cannot be intervened on, use query instead.")
+
+    def intervene(self, intervention):
+        raise RuntimeError("Shared models cannot be intervened on, use query instead.")
+
+    def reset(self):
+        raise RuntimeError("Shared models cannot be reset.")
+
+
+class BudgetedFunctions(Mapping):
+
+    def __init__(self, functions: dict, budget: Budget, n_variables: int):
+        """
+        View of the structural functions of a model that charges every evaluation to the budget of one query
+        The view of a function is a shallow copy of it with its own evaluate method, so it is still an instance of
+        the class of the function and code that checks for expressions treats it the same. Batched evaluations,
+        including those of evaluate_samples, are charged one evaluation per sample
+        :param functions: dictionary mapping variable names to structural functions
+        :param budget: Budget of the query
+        :param n_variables: number of variables of the model
+        """
+        self.functions = functions
+        self.budget = budget
+        self.n_variables = n_variables
+        self.views = {}
+
+    def __getitem__(self, var_name):
+        if var_name not in self.views:
+            self.views[var_name] = self.get_view(self.functions[var_name])
+        return self.views[var_name]
+
+    def __iter__(self):
+        return iter(self.functions)
+
+    def __len__(self):
+        return len(self.functions)
+
+    def get_view(self, structural_function):
+        view = copy.copy(structural_function)
+        evaluate = view.evaluate
+
+        def budgeted_evaluate(inputs, noise=None):
+            self.budget.charge_functions(_n_samples(inputs, noise), self.n_variables)
+            return evaluate(inputs, noise)
+
+        view.evaluate = budgeted_evaluate
+        return view
+
+
+def load_model(name: str, kwargs: dict = None) -> StructuralCausalModel:
+    """
+    Build a model and evaluate it once, so that the first query on it does not pay for lazy initialization
+    :param name: name of the model class in MODELS
+    :param kwargs: constructor arguments of the model
+    :return: StructuralCausalModel
+    """
+    if name not in MODELS:
+        raise ValueError(f"Model {name} not found.")
+    env = getattr(examples, name)(**(kwargs or {}))
+    env.query()
+    return env
+
+
+def get_state_and_noise(env, solver, request: dict):
+    """
+    Get the state and noise of a query
+    If the noise is not given, it is abduced from the state, taking the first noise configuration that is
+    consistent with a partial state
+    :param env: StructuralCausalModel
+    :param solver: ACSolver
+    :param request: dict with noise, or state, or both
+    :return: state: dictionary of values of all variables
+    :return: noise: dictionary of values of all exogenous noise variables
+    """
+    observed = request.get("state") or {}
+    if "noise" in request:
+        noise = {var: torch.as_tensor(value) for var, value in request["noise"].items()}
+    elif observed:
+        configuration = next(solver.iter_noise_configurations(env, observed), None)
+        if configuration is None:
+            raise ValueError("The state is not consistent with the model.")
+        noise = configuration[0]
+    else:
+        raise ValueError("A query needs a state or noise.")
+
+    state = env.get_state(noise)
+    for var, value in observed.items():
+        if var not in state:
+            raise ValueError(f"Variable {var} not found.")
+        if _to_python(state[var]) != value:
+            raise ValueError("The state is not consistent with the noise.")
+    return state, noise
+
+
+def solve_query(env, solver, state: dict, outcome: dict, noise: dict) -> dict:
+    """
+    Find the actual causes of the outcome in a state with a solver
+    :return: dict with the status and the actual causes in order of size as dictionaries of values of variables,
+    with the info of each
+    """
+    actual_causes = solver.solve(state, outcome, noise)
+    order = {var: i for i, var in enumerate(env.topological_order)}
+    events = sorted(
+        [
+            (sorted(event_vars, key=order.get), event_vars)
+            for event_vars in actual_causes
+        ],
+        key=lambda item: (len(item[0]), [order[v] for v in item[0]]),
+    )
+    return {
+        "status": "ok",
+        "actual_causes": [
+            {var: _to_python(state[var]) for var in event_vars}
+            for event_vars, _ in events
+        ],
+        "info": [_to_json(actual_causes[key]["info"]) for _, key in events],
+    }
+
+
+def run_query(
+    models: Dict[str, StructuralCausalModel],
+    request: dict,
+    limit: dict = None,
+    cache: ResultCache = None,
+) -> dict:
+    """
+    Find the actual causes of the outcome of a query on one of the given models
+    A query is a dict with
+        id: optional identifier that is copied to the result
+        model: name of the model in models
+        state: dictionary of observed values of some or all variables
+        noise: dictionary of values of the exogenous noise variables, abduced from the state if not given
+        outcome: list of outcome variable names, or dictionary of values of the outcome variables
+        definition: name of the definition in DEFINITIONS, defaults to ModifiedHP
+        search_order: name of the search order in SEARCH_ORDERS, defaults to heuristic
+        seed: seed of the search order
+        solver: name of the solver in SOLVERS, defaults to HPExhaustiveSearch
+        solver_kwargs: keyword arguments of the solver
+        budget: dict with optional max_queries and timeout, see Budget
+    The model is shared between queries and is never intervened on, so queries can run in parallel threads
+    :param models: dict mapping model names to models
+    :param request: query
+    :param limit: dict with optional max_queries and timeout that caps the budget of every query
+    :param cache: optional ResultCache to reuse the results of earlier queries from, and to store new results in
+    :return: dict with the id, status (ok, budget_exceeded or error), the actual causes in order of size as
+    dictionaries of values of variables with the info of each, or the error, whether the result came from the
+    cache, the number of model evaluations and the wall time
+    """
+    start = time.perf_counter()
+    result = {"id": request.get("id")}
+    budget = None
+    try:
+        if request.get("model") not in models:
+            raise ValueError(f"Model {request.get('model')} not found.")
+        budget = Budget.from_dict(request.get("budget"), limit)
+        env = BudgetedModel(models[request["model"]], budget)
+
+        # Build a new definition and solver for every query, so that queries share no mutable state but the model
+        search_order = SEARCH_ORDERS[request.get("search_order", "heuristic")](
+            request.get("seed")
+        )
+        ac_defn = DEFINITIONS[request.get("definition", "ModifiedHP")](
+            search_order=search_order
+        )
+        solver = SOLVERS[request.get("solver", "HPExhaustiveSearch")](
+            env, ac_defn, **request.get("solver_kwargs", {})
+        )
+
+        state, noise = get_state_and_noise(env, solver, request)
+        outcome = request["outcome"]
+        if not isinstance(outcome, dict):
+            outcome = {var: state[var] for var in outcome}
+
+        # Reuse the result of the same query on the same model and definition if it is in the cache
+        cached_result = None
+        if cache is not None:
+            fingerprint = cache.get_model_fingerprint(models[request["model"]])
+            cache.check_model(request["model"], fingerprint)
+            key = cache.get_key(
+                fingerprint,
+                get_definition_fingerprint(ac_defn),
+                request.get("solver", "HPExhaustiveSearch"),
+                request.get("solver_kwargs", {}),
+                request.get("search_order", "heuristic"),
+                request.get("seed"),
+                {k: v for k, v in _to_json(noise).items() if v is not None},
+                _to_json(outcome),
+            )
+            cached_result = cache.get(key)
+
+        if cached_result is not None:
+            result.update(cached_result)
+            result["cached"] = True
+        else:
+            solved = solve_query(env, solver, state, outcome, noise)
+            result.update(solved)
+            result["cached"] = False
+            if cache is not None:
+                cache.add(key, request["model"], fingerprint, solved)
+    except BudgetExceeded as e:
+        result["status"] = "budget_exceeded"
+        result["error"] = str(e)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{e.__class__.__name__}: {e}"
+    result["n_queries"] = budget.n_queries if budget is not None else 0
+    result["wall_time"] = time.perf_counter() - start
+    return result
+
+
+def _to_json(value):
+    """
+    Convert tensors, arrays, states and containers in a result to JSON serializable values
+    """
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, (torch.Tensor, np.ndarray, np.generic)):
+        return _to_json(value.tolist())
+    if hasattr(value, "to_dict"):
+        return _to_json(value.to_dict())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _n_samples(inputs: dict, noise: dict = None) -> int:
+    """
+    Number of samples in inputs and noise that may be batched along their first dimension
+    """
+    n_samples = 1
+    for values in [inputs, noise or {}]:
+        for value in values.values():
+            if getattr(value, "ndim", 0) > 0:
+                n_samples = max(n_samples, len(value))
+    return n_samples
+
+
+def _to_python(value):
+    return value.item() if hasattr(value, "item") else value
@@ -0,0 +1,240 @@
+"""
+Serve actual cause queries on models that are built once and kept in memory
+
+Usage:
+    python -m counterfact.server --models RockThrowing Voting:n_voters=5 --port 8765
+    python -m counterfact.server --models voting5=Voting:n_voters=5 --unix-socket /tmp/counterfact.sock
+
+Every line sent to the server is a JSON query, see counterfact.queries.run_query, and every line sent back is the
+JSON result of one query. Queries on one connection run in parallel on a pool of worker threads, and their results
+are sent back as soon as they finish, so results can arrive in a different order than the queries
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from counterfact.causal_models.scm import StructuralCausalModel
+from counterfact.queries import load_model, run_query
+from counterfact.utils import ResultCache
+
+# Longest query line that is accepted, in bytes
+MAX_LINE_LENGTH = 2**24
+
+
+async def read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    Read a line, skipping the rest of a line that is longer than the limit of the reader
+    :param reader: asyncio.StreamReader
+    :return: line, empty at the end of the stream, or None if the line was too long
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        n_consumed = e.consumed
+
+    # Discard the line in pieces until its end, which may not have arrived yet
+    while True:
+        try:
+            await reader.readexactly(n_consumed)
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            n_consumed = e.consumed
+
+
+def parse_model_spec(spec: str):
+    """
+    Parse a model given on the command line as [alias=]Name[:key=value,...]
+    Values are parsed as JSON where possible and kept as strings otherwise
+    :param spec: model specification
+    :return: alias: name that queries use for the model, the whole spec if no alias is given
+    :return: name: name of the model class
+    :return: kwargs: constructor arguments of the model
+    """
+    head, _, arguments = spec.partition(":")
+    alias, _, name = head.rpartition("=")
+    kwargs = {}
+    for argument in filter(None, arguments.split(",")):
+        key, _, value = argument.partition("=")
+        try:
+            kwargs[key] = json.loads(value)
+        except json.JSONDecodeError:
+            kwargs[key] = value
+    return alias or spec, name, kwargs
+
+
+class QueryServer:
+
+    def __init__(
+        self,
+        models: Dict[str, StructuralCausalModel],
+        n_workers: int = 4,
+        limit: dict = None,
+        cache: ResultCache = None,
+        max_pending: int = 64,
+    ):
+        """
+        Asyncio server that runs actual cause queries on a pool of worker threads
+        All queries on a model share the same instance, which is safe because definitions only read models through
+        StructuralCausalModel.query. Every query gets a new definition and solver and its own budget, so a query
+        can only use up its own budget and not the workers of other queries
+        :param models: dict mapping the names that queries use to models
+        :param n_workers: number of worker threads
+        :param limit: dict with optional max_queries and timeout that caps the budget of every query
+        :param cache: optional ResultCache shared by all queries
+        :param max_pending: largest number of queries of one connection that are running or waiting for a worker,
+        above which the server stops reading from the connection until one of them finishes
+        """
+        self.models = models
+        self.limit = limit
+        self.cache = cache
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=n_workers)
+
+    async def run_query(self, request: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, run_query, self.models, request, self.limit, self.cache
+        )
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """
+        Read queries from a connection until it is closed, and write the result of each query when it finishes
+        A line that is not a query, or that is too long, is answered with an error and the connection stays open
+        """
+        lock = asyncio.Lock()
+        pending = asyncio.Semaphore(self.max_pending)
+
+        async def respond(line: Optional[bytes]):
+            try:
+                try:
+                    if line is None:
+                        raise ValueError(
+                            f"Line is longer than {MAX_LINE_LENGTH} bytes."
+                        )
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A query must be a JSON object.")
+                except ValueError as e:
+                    result = {
+                        "id": None,
+                        "status": "error",
+                        "error": f"Invalid query: {e}",
+                    }
+                else:
+                    result = await self.run_query(request)
+                async with lock:
+                    writer.write(json.dumps(result).encode() + b"\n")
+                    await writer.drain()
+            finally:
+                pending.release()
+
+        tasks = set()
+        try:
+            while (line := await read_line(reader)) != b"":
+                if line is not None and not line.strip():
+                    continue
+                await pending.acquire()
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            for task in list(tasks):
+                task.cancel()
+        finally:
+            writer.close()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, unix_socket: str = None
+    ):
+        """
+        Start listening on a TCP port of a host, or on a Unix socket if one is given
+        :return: asyncio.Server
+        """
+        if unix_socket is not None:
+            return await asyncio.start_unix_server(
+                self.handle_connection, path=unix_socket, limit=MAX_LINE_LENGTH
+            )
+        return await asyncio.start_server(
+            self.handle_connection, host=host, port=port, limit=MAX_LINE_LENGTH
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(server: QueryServer, host: str, port: int, unix_socket: str = None):
+    listener = await server.start(host, port, unix_socket)
+    addresses = ", ".join(str(socket.getsockname()) for socket in listener.sockets)
+    print(f"Serving {', '.join(server.models)} on {addresses}", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        required=True,
+        help="models to load, as [alias=]Name[:key=value,...]",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="listen on a Unix socket instead")
+    parser.add_argument("--workers", type=int, default=4, help="worker threads")
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=64,
+        help="largest number of unfinished queries of one connection",
+    )
+    parser.add_argument(
+        "--max-queries",
+        type=int,
+        help="largest number of model evaluations any query can use",
+    )
+    parser.add_argument(
+        "--timeout", type=float, help="largest wall time in seconds of any query"
+    )
+    parser.add_argument("--cache", help="SQLite file to cache results in")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        help="largest number of cached results",
+    )
+    args = parser.parse_args(argv)
+
+    models = {}
+    for spec in args.models:
+        alias, name, kwargs = parse_model_spec(spec)
+        models[alias] = load_model(name, kwargs)
+    server = QueryServer(
+        models,
+        n_workers=args.workers,
+        limit={"max_queries": args.max_queries, "timeout": args.timeout},
+        cache=ResultCache(args.cache, args.cache_size) if args.cache else None,
+        max_pending=args.max_pending,
+    )
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
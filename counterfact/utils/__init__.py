@@ -1,5 +1,29 @@
-from counterfact.utils.export import *
-from counterfact.utils.subsets import *
+from counterfact.utils.lazy import attach
+
+# Submodules are imported on first use, so that importing the package does not import pandas and networkx
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "export": ["to_latex_math_mode", "make_latex_table"],
+        "instrumentation": ["Instrumentation", "instrumentation", "instrument"],
+        "subsets": ["powerset", "get_all_subevents", "get_all_subsets"],
+        "search_order": [
+            "assignment_key",
+            "SearchOrder",
+            "RandomSearchOrder",
+            "HeuristicSearchOrder",
+        ],
+        "witness_store": ["WitnessStore"],
+        "subevent_table": ["SubeventTable"],
+        "result_cache": [
+            "ResultCache",
+            "get_model_fingerprint",
+            "get_function_fingerprint",
+            "get_definition_fingerprint",
+        ],
+    },
+)
+__all__.append("add_info")
 
 
 def add_info(info, updates):
@@ -1,5 +1,8 @@
 import os
-import pandas as pd
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def to_latex_math_mode(value):
@@ -8,7 +11,7 @@ def to_latex_math_mode(value):
     return value
 
 
-def make_latex_table(df: pd.DataFrame, filename: str, var_names: dict):
+def make_latex_table(df: "pd.DataFrame", filename: str, var_names: dict):
     """
     Make a formatted latex table from a dataframe and save it to file
     :param df: pd.DataFrame containing states, outcomes, and actual causes
@@ -16,6 +19,8 @@ def make_latex_table(df: pd.DataFrame, filename: str, var_names: dict):
     :param var_names: dict mapping variable names to human-readable names
     :return:
     """
+    # Imported here, so that importing counterfact.utils does not import pandas
+    import pandas as pd
 
     # Get the number of state and outcome variables
     num_state_vars = sum([1 for col in df.columns if col[0] == "state"])
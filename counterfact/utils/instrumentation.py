@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class _Span:
+    """
+    Context manager that times a block of code and records it as a complete event in the trace
+    """
+
+    __slots__ = ("instrumentation", "name", "args", "start")
+
+    def __init__(self, instrumentation, name, args):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        self.instrumentation.add_span(self.name, self.start, end, self.args)
+        return False
+
+
+class _NullSpan:
+    """
+    Context manager that does nothing, used when instrumentation is disabled
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Instrumentation:
+
+    def __init__(self):
+        """
+        Opt-in counters and timers for the hot paths of the models, definitions and solvers
+        Call sites check the enabled flag before recording anything, so the overhead when disabled is a single
+        attribute lookup. Recording is guarded by a lock, since queries may be answered in several threads
+        """
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all recorded counts, timings and trace events
+        """
+        with self.lock:
+            self.counters = defaultdict(int)
+            self.keyed_counters = defaultdict(lambda: defaultdict(int))
+            self.timings = defaultdict(
+                lambda: {"calls": 0, "total_time": 0.0, "max_time": 0.0}
+            )
+            self.trace_events = []
+            self.start_time = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def count(self, name: str, key: str = None, n: int = 1):
+        """
+        Increment a counter
+        :param name: name of the counter, e.g. "evaluate"
+        :param key: optional key to count separately, e.g. the name of the evaluated variable
+        :param n: amount to increment by
+        """
+        with self.lock:
+            self.counters[name] += n
+            if key is not None:
+                self.keyed_counters[name][key] += n
+
+    def span(self, name: str, **args):
+        """
+        Time a block of code, for use as a context manager
+        :param name: name of the timed section, e.g. "is_necessary"
+        :param args: additional arguments stored with the trace event
+        :return: context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def add_span(self, name: str, start: float, end: float, args: dict = None):
+        """
+        Record a timed section
+        :param name: name of the timed section
+        :param start: start time from time.perf_counter
+        :param end: end time from time.perf_counter
+        :param args: additional arguments stored with the trace event
+        """
+        duration = end - start
+        with self.lock:
+            timing = self.timings[name]
+            timing["calls"] += 1
+            timing["total_time"] += duration
+            timing["max_time"] = max(timing["max_time"], duration)
+            self.trace_events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.start_time) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args or {},
+                }
+            )
+
+    def get_report(self):
+        """
+        Get a structured report of all recorded counts and timings
+        :return: dict with total counts, counts per key (e.g. per variable) and timings per section
+        """
+        with self.lock:
+            timings = {}
+            for name, timing in self.timings.items():
+                timings[name] = dict(timing)
+                timings[name]["mean_time"] = timing["total_time"] / timing["calls"]
+            return {
+                "counters": dict(self.counters),
+                "keyed_counters": {
+                    name: dict(counts) for name, counts in self.keyed_counters.items()
+                },
+                "timings": timings,
+                "elapsed_time": time.perf_counter() - self.start_time,
+            }
+
+    def to_chrome_trace(self, filename: str = None):
+        """
+        Export the recorded timings as a Chrome trace, which can be opened in chrome://tracing or Perfetto
+        Final counter values are added as counter events at the end of the trace
+        :param filename: optional file to write the trace to as JSON
+        :return: dict in the Chrome trace event format
+        """
+        with self.lock:
+            end = (time.perf_counter() - self.start_time) * 1e6
+            counter_events = [
+                {
+                    "name": name,
+                    "ph": "C",
+                    "ts": end,
+                    "pid": os.getpid(),
+                    "args": dict(counts),
+                }
+                for name, counts in self.keyed_counters.items()
+            ]
+            trace = {
+                "traceEvents": self.trace_events + counter_events,
+                "displayTimeUnit": "ms",
+                "otherData": {"counters": dict(self.counters)},
+            }
+        if filename is not None:
+            with open(filename, "w") as f:
+                json.dump(trace, f)
+        return trace
+
+
+instrumentation = Instrumentation()
+
+
+@contextmanager
+def instrument(reset: bool = True):
+    """
+    Enable instrumentation within a block of code
+    Usage:
+        with instrument() as profile:
+            solver.solve(state, outcome, noise)
+        report = profile.get_report()
+    :param reset: clear previously recorded counts and timings before enabling
+    :return: the global Instrumentation object
+    """
+    if reset:
+        instrumentation.reset()
+    was_enabled = instrumentation.enabled
+    instrumentation.enable()
+    try:
+        yield instrumentation
+    finally:
+        if not was_enabled:
+            instrumentation.disable()
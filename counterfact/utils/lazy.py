@@ -0,0 +1,33 @@
+import importlib
+import sys
+from typing import Dict, List
+
+
+def attach(package_name: str, submodules: Dict[str, List[str]]):
+    """
+    Make the public names of the submodules of a package available as attributes of the package, importing a
+    submodule only the first time one of its names is used, as in PEP 562
+    Importing the package then does not import the dependencies of all of its submodules, while
+    from package import name and from package import * keep working
+    :param package_name: __name__ of the package
+    :param submodules: dict mapping submodule names to the public names they define
+    :return: __getattr__, __dir__ and __all__ for the package
+    """
+    names = {
+        name: submodule for submodule, names in submodules.items() for name in names
+    }
+
+    def __getattr__(name):
+        if name not in names:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        module = importlib.import_module(f"{package_name}.{names[name]}")
+        value = getattr(module, name)
+
+        # Store the value on the package, so that later lookups do not go through __getattr__
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package_name])) | set(names))
+
+    return __getattr__, __dir__, list(names)
@@ -0,0 +1,300 @@
+import hashlib
+import inspect
+import json
+import sqlite3
+import threading
+import time
+import weakref
+from functools import lru_cache
+from typing import Optional
+import numpy as np
+import torch
+
+# Number of inserts after which the running count of results is recounted, to include other processes
+RECOUNT_INTERVAL = 1000
+
+# Number of cache hits whose last use is buffered before it is written without waiting for an insert
+TOUCH_BUFFER_SIZE = 256
+
+
+class ResultCache:
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        """
+        SQLite store of query results that persists across processes and restarts
+        Results are stored under keys that include the fingerprint of the model and the definition, so a changed
+        model or definition never reuses old results, and the results of an earlier fingerprint of a model are
+        deleted the first time the model is checked. The database is opened in WAL mode with one connection per
+        thread, so readers in other threads and processes are not blocked by a writer. When there are more than
+        max_entries results, the least recently used are evicted. The number of results is kept as a running
+        count, which is recounted every RECOUNT_INTERVAL inserts to include results added by other processes. Cache
+        hits only read the database, their last use is buffered and written together with the next insert, or once
+        TOUCH_BUFFER_SIZE hits are buffered
+        :param path: path of the SQLite database file
+        :param max_entries: maximum number of stored results, unlimited if None
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        self.model_fingerprints = weakref.WeakKeyDictionary()
+        self.checked_models = {}
+        connection = self.get_connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, model TEXT, fingerprint TEXT, "
+            "result TEXT, last_used REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_model ON results (model)"
+        )
+        self.count_lock = threading.Lock()
+        self.touched = {}
+        self.n_entries = len(self)
+        self.n_inserts = 0
+
+    def __getstate__(self):
+        return {"path": self.path, "max_entries": self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["max_entries"])
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current thread, opening it if needed
+        """
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get_model_fingerprint(self, env) -> str:
+        """
+        Get the fingerprint of a model, computed once per model instance
+        """
+        if env not in self.model_fingerprints:
+            self.model_fingerprints[env] = get_model_fingerprint(env)
+        return self.model_fingerprints[env]
+
+    def check_model(self, model_name: str, fingerprint: str):
+        """
+        Delete the results of a model that were stored under a different fingerprint, once per model name
+        :param model_name: name of the model that queries use
+        :param fingerprint: current fingerprint of the model
+        """
+        if self.checked_models.get(model_name) == fingerprint:
+            return
+        cursor = self.get_connection().execute(
+            "DELETE FROM results WHERE model = ? AND fingerprint != ?",
+            (model_name, fingerprint),
+        )
+        with self.count_lock:
+            self.n_entries = max(0, self.n_entries - cursor.rowcount)
+        self.checked_models[model_name] = fingerprint
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a stored result and mark it as recently used
+        :param key: key from get_key
+        :return: result dict, or None if there is no result for the key
+        """
+        connection = self.get_connection()
+        row = connection.execute(
+            "SELECT result FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        with self.count_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[key] = time.time()
+            flush = len(self.touched) >= TOUCH_BUFFER_SIZE
+        if flush:
+            self.flush_touched()
+        return json.loads(row[0])
+
+    def flush_touched(self):
+        """
+        Write the buffered last use of cache hits to the database
+        """
+        with self.count_lock:
+            touched, self.touched = self.touched, {}
+        if touched:
+            self.get_connection().executemany(
+                "UPDATE results SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in touched.items()],
+            )
+
+    def add(self, key: str, model_name: str, fingerprint: str, result: dict):
+        """
+        Store a result, evicting the least recently used results if the cache is full
+        :param key: key from get_key
+        :param model_name: name of the model that queries use
+        :param fingerprint: fingerprint of the model
+        :param result: JSON serializable result dict
+        """
+        self.flush_touched()
+        connection = self.get_connection()
+        exists = connection.execute(
+            "SELECT 1 FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (key, model_name, fingerprint, json.dumps(result), time.time()),
+        )
+
+        # Update the running count, and recount now and then to include the inserts of other processes
+        with self.count_lock:
+            self.n_inserts += 1
+            if self.n_inserts % RECOUNT_INTERVAL == 0:
+                self.n_entries = len(self)
+            elif exists is None:
+                self.n_entries += 1
+            if self.max_entries is None:
+                return
+            n_evicted = self.n_entries - self.max_entries
+            if n_evicted > 0:
+                cursor = connection.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                    (n_evicted,),
+                )
+                self.n_entries -= cursor.rowcount
+
+    def __len__(self):
+        return (
+            self.get_connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        )
+
+    @staticmethod
+    def get_key(*parts) -> str:
+        """
+        Hash JSON serializable parts of a query into a key
+        """
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+
+def get_model_fingerprint(env) -> str:
+    """
+    Hash everything that determines the results of queries on a model: the variables in topological order, their
+    types and supports, and the parents, noise distribution and code of their structural functions
+    Functions are hashed by their source and bytecode, together with the values they close over, so two models
+    built from the same function with different captured values have different fingerprints
+    :param env: StructuralCausalModel
+    :return: hex digest
+    """
+    parts = []
+    for var_name in env.topological_order:
+        variable = env.variables[var_name]
+        structural_function = env.structural_functions.get(var_name)
+        part = [
+            var_name,
+            _stable_repr(variable["var_type"]),
+            _stable_repr(variable["support"]),
+        ]
+        if structural_function is not None:
+            part += [
+                list(structural_function.parents),
+                _stable_repr(structural_function.noise_dist),
+                get_function_fingerprint(structural_function),
+            ]
+        parts.append(part)
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def get_function_fingerprint(structural_function) -> str:
+    """
+    Hash the code of a structural function, the compiled source for expressions and the source, bytecode and
+    closure of the Python function otherwise
+    """
+    source = getattr(structural_function, "python_source", None)
+    if source is not None:
+        return hashlib.sha256(source.encode()).hexdigest()
+    return hashlib.sha256(
+        _stable_repr(structural_function.function).encode()
+    ).hexdigest()
+
+
+def get_definition_fingerprint(ac_defn) -> str:
+    """
+    Hash the source of the classes of a definition and the values of its settings
+    """
+    parts = [_get_class_fingerprint(cls) for cls in type(ac_defn).__mro__]
+    parts.append(
+        {
+            name: _stable_repr(value)
+            for name, value in sorted(vars(ac_defn).items())
+            if name != "rng"
+        }
+    )
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _get_class_fingerprint(cls) -> str:
+    try:
+        source = inspect.getsource(cls)
+    except (OSError, TypeError):
+        source = f"{cls.__module__}.{cls.__qualname__}"
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _stable_repr(value, depth: int = 0) -> str:
+    """
+    Representation of a value that does not change between processes, which excludes memory addresses
+    """
+    if depth > 8:
+        return type(value).__qualname__
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return repr(value)
+    if isinstance(value, np.generic):
+        return repr(value.item())
+    if isinstance(value, (np.ndarray, torch.Tensor)):
+        array = (
+            value.detach().cpu().numpy() if isinstance(value, torch.Tensor) else value
+        )
+        digest = hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest()
+        return f"array({array.dtype}, {array.shape}, {digest})"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_stable_repr(v, depth + 1) for v in value) + "]"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(_stable_repr(v, depth + 1) for v in value)) + "}"
+    if isinstance(value, dict):
+        items = sorted(
+            f"{_stable_repr(k, depth + 1)}: {_stable_repr(v, depth + 1)}"
+            for k, v in value.items()
+        )
+        return "{" + ", ".join(items) + "}"
+    if inspect.iscode(value):
+        consts = [_stable_repr(const, depth + 1) for const in value.co_consts]
+        return f"code({value.co_code.hex()}, {consts}, {list(value.co_names)})"
+    if callable(value) and hasattr(value, "__code__"):
+        try:
+            source = inspect.getsource(value)
+        except (OSError, TypeError):
+            source = ""
+        closure = []
+        for cell in value.__closure__ or []:
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                continue
+            if contents is not value:
+                closure.append(_stable_repr(contents, depth + 1))
+        return (
+            f"function({source}, {_stable_repr(value.__code__, depth + 1)}, {closure})"
+        )
+
+    # Objects with their own representation, such as distributions, unless it contains a memory address
+    text = repr(value)
+    if " at 0x" in text:
+        return type(value).__qualname__
+    return text
@@ -0,0 +1,205 @@
+import weakref
+from collections import OrderedDict
+import numpy as np
+import networkx as nx
+from counterfact.utils.subsets import powerset
+
+
+def assignment_key(assignment: dict):
+    """
+    Convert a dictionary of variable values to a hashable key
+    Tensor and numpy values are converted to Python scalars so that equal values give equal keys
+    :param assignment: dictionary of values of a set of variables
+    :return: tuple of (variable name, value) pairs sorted by variable name
+    """
+    return tuple(
+        sorted(
+            (var, value.item() if hasattr(value, "item") else value)
+            for var, value in assignment.items()
+        )
+    )
+
+
+class SearchOrder:
+
+    def __init__(self, seed=None):
+        """
+        Strategy for the order in which alternative assignments and witness sets are tried
+        :param seed: seed for the random number generator, for reproducible runs
+        """
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def order_alt_assignments(
+        self, env, event: dict, outcome: dict, state: dict, alt_assignments
+    ):
+        """
+        Order the alternative assignments of the event variables
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param alt_assignments: array with one row per assignment of the event variables, in the order of the event
+        :return: array of alternative assignments in the order they should be tried
+        """
+        return alt_assignments
+
+    def order_witness_sets(
+        self, env, event: dict, outcome: dict, state: dict, remaining_vars: list
+    ):
+        """
+        Order the candidate witness sets
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param remaining_vars: variables that are neither in the event nor in the outcome
+        :return: list of tuples of variable names in the order they should be tried
+        """
+        return list(powerset(self._sorted(env, remaining_vars)))
+
+    def record_witness(self, env, event: dict, outcome: dict, state: dict, witness_set):
+        """
+        Record a witness set under which the event was found to be necessary
+        :param env: StructuralCausalModel
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param witness_set: tuple of variable names in the witness set
+        """
+        pass
+
+    @staticmethod
+    def _sorted(env, var_names: list):
+        """
+        Sort variables in topological order, so that seeded runs do not depend on set iteration order
+        """
+        return sorted(var_names, key=lambda var: env.topological_order.index(var))
+
+    def _shuffle(self, items: list):
+        """
+        Shuffle a list using the random number generator of the strategy
+        """
+        return [items[i] for i in self.rng.permutation(len(items))]
+
+
+class RandomSearchOrder(SearchOrder):
+    """
+    Shuffle the alternative assignments, and shuffle the witness sets within each size
+    The empty witness set is not tried, as in the original exhaustive definitions
+    """
+
+    def order_alt_assignments(self, env, event, outcome, state, alt_assignments):
+        return self.rng.permutation(alt_assignments)
+
+    def order_witness_sets(self, env, event, outcome, state, remaining_vars):
+        witness_sets = []
+        remaining_vars = self._sorted(env, remaining_vars)
+        for size in range(1, len(remaining_vars)):
+            witness_sets.extend(
+                self._shuffle(list(powerset(remaining_vars, length=size)))
+            )
+        return witness_sets
+
+
+class HeuristicSearchOrder(SearchOrder):
+    """
+    Try the cheapest and most promising counterfactuals first
+    Alternative assignments that flip all binary event variables come first, followed by those that change the
+    most event variables. The empty witness set (but-for test) is tried first, followed by witness sets that
+    succeeded for earlier events in the same state, and then the remaining witness sets by increasing size and
+    increasing graph distance to the outcome
+    """
+
+    def __init__(self, seed=None, include_full=False, max_states: int = 1024):
+        """
+        :param seed: seed for the random number generator used to break ties
+        :param include_full: also try the witness set containing all remaining variables
+        :param max_states: number of states and outcomes whose successful witness sets are kept, the least
+        recently used are forgotten first
+        """
+        super().__init__(seed)
+        self.include_full = include_full
+        self.max_states = max_states
+        self.successful_witnesses = OrderedDict()
+        self.distances = weakref.WeakKeyDictionary()
+
+    def order_alt_assignments(self, env, event, outcome, state, alt_assignments):
+        event_vars = list(event.keys())
+        original_assignment = [event[var] for var in event_vars]
+        binary = [env.variables[var].var_type == "bool" for var in event_vars]
+
+        # Break ties randomly, then sort stably by the heuristic score
+        alt_assignments = self.rng.permutation(alt_assignments)
+        scores = []
+        for alt_assignment in alt_assignments:
+            changed = [
+                bool(a != o) for a, o in zip(alt_assignment, original_assignment)
+            ]
+            flips_all_binary = all(c for c, b in zip(changed, binary) if b)
+            scores.append((not flips_all_binary, -sum(changed)))
+        order = sorted(range(len(alt_assignments)), key=lambda i: scores[i])
+        return alt_assignments[order]
+
+    def order_witness_sets(self, env, event, outcome, state, remaining_vars):
+        upper_bound = (
+            len(remaining_vars) + 1 if self.include_full else len(remaining_vars)
+        )
+        distances = self.get_distances(env, outcome)
+
+        # Witness sets that worked for earlier events come right after the but-for test
+        previous = [
+            witness_set
+            for witness_set in self.successful_witnesses.get(
+                (assignment_key(state), assignment_key(outcome)), []
+            )
+            if witness_set and set(witness_set).issubset(remaining_vars)
+        ]
+        previous_sets = [frozenset(witness_set) for witness_set in previous]
+
+        # Remaining witness sets by size, then by distance of their variables to the outcome
+        witness_sets = [()] + previous
+        for size in range(1, upper_bound):
+            subsets = self._shuffle(
+                list(powerset(self._sorted(env, remaining_vars), length=size))
+            )
+            subsets = sorted(
+                subsets, key=lambda s: sum(distances.get(var, np.inf) for var in s)
+            )
+            witness_sets.extend(
+                [s for s in subsets if frozenset(s) not in previous_sets]
+            )
+        return witness_sets
+
+    def record_witness(self, env, event, outcome, state, witness_set):
+        key = (assignment_key(state), assignment_key(outcome))
+        witnesses = self.successful_witnesses.setdefault(key, [])
+        self.successful_witnesses.move_to_end(key)
+        while len(self.successful_witnesses) > self.max_states:
+            self.successful_witnesses.popitem(last=False)
+        witness_set = tuple(witness_set)
+        if witness_set in witnesses:
+            witnesses.remove(witness_set)
+        witnesses.insert(0, witness_set)
+
+    def get_distances(self, env, outcome: dict):
+        """
+        Get the length of the shortest undirected path from every variable to the closest outcome variable
+        :param env: StructuralCausalModel
+        :param outcome: dictionary of values of the outcome variables
+        :return: dict mapping variable names to distances
+        """
+        # Distances are kept per model object, so they are dropped with the model and never reused by another
+        distances = self.distances.setdefault(env, {})
+        key = tuple(sorted(outcome.keys()))
+        if key not in distances:
+            graph = nx.Graph()
+            graph.add_nodes_from(env.variables.keys())
+            for var_name in env.variables:
+                graph.add_edges_from(
+                    (parent, var_name) for parent in env.get_parents(var_name)
+                )
+            distances[key] = nx.multi_source_dijkstra_path_length(
+                graph, list(outcome.keys())
+            )
+        return distances[key]
@@ -0,0 +1,74 @@
+import math
+from typing import Optional
+from counterfact.utils.search_order import assignment_key
+
+
+class SubeventTable:
+
+    def __init__(self, max_entries: int = 100000):
+        """
+        Table of whether events are both necessary and sufficient for an outcome, keyed by state, noise, outcome
+        and event
+        Solvers share one table between all checks of candidate events, so the minimality check (AC3) looks up
+        the results of subevents that were already checked instead of checking them again. Results depend on the
+        definition, so a table should only be shared by solvers that use the same definition
+        :param max_entries: maximum number of stored results, the oldest are evicted first, unlimited if None
+        """
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lookups = 0
+        self.hits = 0
+
+    @staticmethod
+    def get_key(event: dict, outcome: dict, state: dict, noise: dict = None):
+        """
+        Hashable key of an event in a state, under the noise, for an outcome
+        Variables without noise get nan noise during evaluation, which never compares equal, so it is left out
+        """
+        noise_key = tuple(
+            (var, value)
+            for var, value in assignment_key(noise if noise is not None else {})
+            if not (isinstance(value, float) and math.isnan(value))
+        )
+        return (
+            assignment_key(state),
+            noise_key,
+            assignment_key(outcome),
+            assignment_key(event),
+        )
+
+    def get(
+        self, event: dict, outcome: dict, state: dict, noise: dict = None
+    ) -> Optional[bool]:
+        """
+        Look up whether the event is necessary and sufficient for the outcome in the state
+        :return: bool, or None if the event was not checked yet
+        """
+        self.lookups += 1
+        result = self.entries.get(self.get_key(event, outcome, state, noise))
+        if result is not None:
+            self.hits += 1
+        return result
+
+    def add(
+        self,
+        event: dict,
+        outcome: dict,
+        state: dict,
+        noise: dict,
+        necessary_and_sufficient: bool,
+    ):
+        """
+        Record whether the event is necessary and sufficient for the outcome in the state
+        """
+        self.entries[self.get_key(event, outcome, state, noise)] = bool(
+            necessary_and_sufficient
+        )
+
+        # Evict the oldest results, dicts keep the order in which keys were added
+        if self.max_entries is not None:
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+    def __len__(self):
+        return len(self.entries)
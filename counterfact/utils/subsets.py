@@ -37,7 +37,7 @@ def powerset(
 
     if reverse:
         return chain.from_iterable(
-            combinations(s, r) for r in range(upper_bound, lower_bound, -1)
+            combinations(s, r) for r in range(upper_bound - 1, lower_bound - 1, -1)
         )
     return chain.from_iterable(
         combinations(s, r) for r in range(lower_bound, upper_bound)
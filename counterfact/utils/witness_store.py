@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from counterfact.utils.search_order import assignment_key
+
+
+class WitnessStore:
+
+    def __init__(self, max_candidates: int = 5, max_entries: int = 10000):
+        """
+        Store of witness sets that made events necessary, keyed by outcome and candidate event
+        Definitions consult the store before enumerating all witness sets, trying the witness sets of the most
+        similar events first. Entries are kept across solves, so witnesses found in one state are reused in others
+        :param max_candidates: maximum number of stored witness sets returned by a lookup
+        :param max_entries: maximum number of stored events in a state, the least recently added are evicted first,
+        unlimited if None
+        """
+        self.max_candidates = max_candidates
+        self.max_entries = max_entries
+        self.entries = {}
+        self.order = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.candidates_tried = 0
+
+    def add(self, event: dict, outcome: dict, state: dict, witness_set):
+        """
+        Store a witness set under which the event was necessary for the outcome
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param witness_set: tuple of variable names in the witness set
+        """
+        key = (assignment_key(outcome), assignment_key(event), assignment_key(state))
+        outcome_entries = self.entries.setdefault(key[0], {})
+        event_entries = outcome_entries.setdefault(key[1], {})
+        witness_sets = event_entries.setdefault(key[2], [])
+        if tuple(witness_set) not in witness_sets:
+            witness_sets.append(tuple(witness_set))
+
+        # Evict the events in the states that were least recently added to
+        self.order[key] = None
+        self.order.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self.order) > self.max_entries:
+                self.remove(*self.order.popitem(last=False)[0])
+
+    def remove(self, outcome_key, event_key, state_key):
+        """
+        Remove the witness sets of an event in a state, and any dicts that become empty
+        """
+        outcome_entries = self.entries[outcome_key]
+        event_entries = outcome_entries[event_key]
+        del event_entries[state_key]
+        if not event_entries:
+            del outcome_entries[event_key]
+        if not outcome_entries:
+            del self.entries[outcome_key]
+
+    def lookup(self, event: dict, outcome: dict, state: dict, remaining_vars: list):
+        """
+        Find stored witness sets for the outcome, ordered by the similarity of their events and states
+        :param event: dictionary of values of a given set of variables
+        :param outcome: dictionary of values of the outcome variables
+        :param state: dictionary of values of all observable variables
+        :param remaining_vars: variables that can be in a witness set for this event
+        :return: list of tuples of variable names
+        """
+        self.lookups += 1
+        outcome_entries = self.entries.get(assignment_key(outcome), {})
+        event_items = set(assignment_key(event))
+        state_items = set(assignment_key(state))
+
+        # Score every stored witness set by the similarity of its event and state to the query
+        scores = {}
+        for event_key, event_entries in outcome_entries.items():
+            event_similarity = self.similarity(event_items, set(event_key))
+            for state_key, witness_sets in event_entries.items():
+                state_similarity = self.similarity(state_items, set(state_key))
+                score = event_similarity + 0.5 * state_similarity
+                for witness_set in witness_sets:
+                    if not set(witness_set).issubset(remaining_vars):
+                        continue
+                    key = frozenset(witness_set)
+                    if key not in scores or score > scores[key][0]:
+                        scores[key] = (score, witness_set)
+
+        candidates = sorted(scores.values(), key=lambda x: -x[0])
+        return [witness_set for _, witness_set in candidates[: self.max_candidates]]
+
+    @staticmethod
+    def similarity(items_a: set, items_b: set):
+        """
+        Jaccard similarity of two sets of (variable, value) pairs
+        """
+        if not items_a and not items_b:
+            return 1.0
+        return len(items_a & items_b) / len(items_a | items_b)
+
+    def record_hit(self, n_tried: int):
+        """
+        Record a lookup whose witness sets made the event necessary
+        :param n_tried: number of stored witness sets tried
+        """
+        self.hits += 1
+        self.candidates_tried += n_tried
+
+    def record_miss(self, n_tried: int):
+        """
+        Record a lookup that did not find a witness, so the definition falls back to enumerating witness sets
+        :param n_tried: number of stored witness sets tried
+        """
+        self.misses += 1
+        self.candidates_tried += n_tried
+
+    def get_stats(self):
+        """
+        Get lookup statistics for the store
+        :return: dict with number of lookups, hits, misses, hit rate, stored witness sets tried and stored entries
+        """
+        n_entries = sum(
+            len(witness_sets)
+            for outcome_entries in self.entries.values()
+            for event_entries in outcome_entries.values()
+            for witness_sets in event_entries.values()
+        )
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "candidates_tried": self.candidates_tried,
+            "entries": n_entries,
+        }
+
+    def clear(self):
+        """
+        Remove all stored witness sets and reset the statistics
+        """
+        self.entries.clear()
+        self.order.clear()
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.candidates_tried = 0
@@ -0,0 +1,77 @@
+import itertools
+import pytest
+import torch
+from counterfact.examples import RockThrowing, Voting
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch, NoiseAbduction
+from counterfact.utils import HeuristicSearchOrder
+
+
+class TestAbductionRockThrowing:
+
+    def test_1(self):
+        # A full observation is produced by exactly one noise configuration
+        env = RockThrowing()
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        abduction = NoiseAbduction(env, solver.get_noise_supports(env))
+        noise = {"suzy_throws": torch.tensor(0), "billy_throws": torch.tensor(1)}
+        state = env.get_state(dict(noise))
+        configurations = list(abduction.iter_noise_configurations(state))
+        assert len(configurations) == 1
+        assert {var: int(v) for var, v in configurations[0].items()} == {
+            "suzy_throws": 0,
+            "billy_throws": 1,
+        }
+
+    def test_2(self):
+        # A partial observation keeps every configuration that agrees with it
+        env = RockThrowing()
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        abduction = NoiseAbduction(env, solver.get_noise_supports(env))
+        results = abduction.abduce({"bottle_shatters": 1})
+        assert len(results) == 3
+        assert all(int(r["state"]["bottle_shatters"]) == 1 for r in results)
+        assert abduction.abduce({"suzy_throws": 0, "suzy_hits": 1}) == []
+        with pytest.raises(ValueError):
+            abduction.abduce({"carol_throws": 1})
+
+    def test_3(self):
+        # Solvers only solve the configurations that are consistent with the observation
+        env = RockThrowing()
+        ac_defn = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        solver = HPExhaustiveSearch(env, ac_defn)
+        observed = {"billy_hits": 0, "bottle_shatters": 1}
+        ac_table = solver.solve_all_states(env, ac_defn, ["bottle_shatters"], observed)
+        assert len(ac_table) == 2
+        assert (ac_table[("state", "suzy_throws")] == 1).all()
+        result = solver.get_cause_probabilities(
+            env, ac_defn, ["bottle_shatters"], observed
+        )
+        assert result["total_probability"] == pytest.approx(0.5)
+        assert result["conditional_cause_probabilities"][
+            ((("suzy_throws", 1),), (("bottle_shatters", 1),))
+        ] == pytest.approx(1.0)
+
+
+class TestAbductionVoting:
+
+    def test_1(self):
+        # Observing the winner keeps every majority of voters, without enumerating the others
+        env = Voting(n_voters=5)
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        configurations = list(
+            solver.iter_noise_configurations(env, {"winner": 1, "voter_1": 0})
+        )
+        assert len(configurations) == 5
+        assert sum(prob for _, prob in configurations) == pytest.approx(5 / 32)
+
+    def test_2(self):
+        # States are generated lazily, so the first ones are found without enumerating all 2^40 of them
+        env = Voting(n_voters=40)
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        abduction = NoiseAbduction(env, solver.get_noise_supports(env))
+        results = list(itertools.islice(abduction.iter_abduce({"voter_1": 0}), 3))
+        assert len(results) == 3
+        assert all(int(r["state"]["voter_1"]) == 0 for r in results)
+        configuration = next(abduction.iter_noise_configurations({"voter_2": 1}))
+        assert int(configuration["voter_2"]) == 1
@@ -0,0 +1,55 @@
+import io
+import itertools
+import json
+from counterfact.batch import model_key, run_batch, run_chunk
+
+
+class TestBatchRockThrowing:
+
+    queries = [
+        {
+            "model": "RockThrowing",
+            "state": {"suzy_throws": suzy, "billy_throws": billy},
+            "outcome": ["bottle_shatters"],
+        }
+        for suzy, billy in itertools.product([0, 1], [0, 1])
+    ]
+
+    def test_1(self):
+        # Queries of the same model with the same constructor arguments share a model
+        assert model_key({"model": "Voting", "kwargs": {"n_voters": 3}}) == model_key(
+            {"model": "Voting", "kwargs": {"n_voters": 3}, "state": {}}
+        )
+        assert model_key({"model": "Voting"}) != model_key(
+            {"model": "Voting", "kwargs": {"n_voters": 3}}
+        )
+        results = run_chunk(
+            [{**query, "id": i} for i, query in enumerate(self.queries)]
+        )
+        assert [result["id"] for result in results] == [0, 1, 2, 3]
+        assert results[3]["actual_causes"] == [{"suzy_throws": 1}, {"suzy_hits": 1}]
+
+    def test_2(self):
+        # Every line gets one result line, with the line number as id if the query has none
+        lines = [json.dumps(query) for query in self.queries * 5]
+        lines += ["not json", json.dumps({"model": "Bottle", "state": {}})]
+        output = io.StringIO()
+        summary = run_batch(lines, output, n_workers=2, chunk_size=3, threads=True)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert summary == {"n_queries": 22, "ok": 20, "error": 2}
+        assert sorted(result["id"] for result in results) == list(range(1, 23))
+        by_id = {result["id"]: result for result in results}
+        assert by_id[4]["actual_causes"] == by_id[20]["actual_causes"]
+
+    def test_3(self):
+        # Worker processes give the same results as worker threads
+        lines = [json.dumps(query) for query in self.queries]
+        actual_causes = {}
+        for threads in [True, False]:
+            output = io.StringIO()
+            run_batch(lines, output, n_workers=2, chunk_size=1, threads=threads)
+            results = [json.loads(line) for line in output.getvalue().splitlines()]
+            actual_causes[threads] = {
+                result["id"]: result["actual_causes"] for result in results
+            }
+        assert actual_causes[True] == actual_causes[False]
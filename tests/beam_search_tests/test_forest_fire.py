@@ -0,0 +1,53 @@
+import torch
+from counterfact.examples import ForestFireRainStorm, RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPBeamSearch, HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+from counterfact.utils.instrumentation import instrument
+
+
+def get_causes(table):
+    return [
+        sorted(sorted(cause) for cause in causes) for causes in table["actual_causes"]
+    ]
+
+
+class TestBeamSearchForestFire:
+
+    def test_1(self):
+        # A beam wide enough to keep every event finds the same actual causes as exhaustive search
+        env = ForestFireRainStorm()
+        definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        exhaustive = HPExhaustiveSearch(env, definition).solve_all_states(
+            env, definition, ["fire_in_june"]
+        )
+        beam = HPBeamSearch(env, definition, beam_width=100, seed=0).solve_all_states(
+            env, definition, ["fire_in_june"]
+        )
+        assert get_causes(exhaustive) == get_causes(beam)
+
+    def test_2(self):
+        # The same seed gives the same results, and a narrow beam checks fewer events
+        env = ForestFireRainStorm()
+        tables = []
+        for _ in range(2):
+            definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            with instrument() as profile:
+                tables.append(
+                    HPBeamSearch(
+                        env, definition, beam_width=2, seed=1
+                    ).solve_all_states(env, definition, ["fire_in_june"])
+                )
+        assert get_causes(tables[0]) == get_causes(tables[1])
+        n_states = len(tables[0])
+        assert profile.get_report()["timings"]["solve"]["calls"] == n_states
+
+    def test_3(self):
+        # Single events whose flip changes the outcome are scored first
+        env = RockThrowing()
+        definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        solver = HPBeamSearch(env, definition, beam_width=1, max_size=1, seed=0)
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        state = env.get_state(dict(noise))
+        actual_causes = solver.solve(state, {"bottle_shatters": 1}, noise)
+        assert list(actual_causes.keys()) in [[("suzy_throws",)], [("suzy_hits",)]]
@@ -0,0 +1,57 @@
+import torch
+from counterfact.examples import ForestFireRainStorm, RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import ButForMatrix, HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+from counterfact.utils.instrumentation import instrument
+
+
+class TestButForMatrixRockThrowing:
+
+    noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+
+    def test_1(self):
+        # Suzy's rock preempts Billy's, so no single variable changes the outcome on its own
+        env = RockThrowing()
+        state = env.get_state(dict(self.noise))
+        matrix = ButForMatrix(env, state, {"bottle_shatters": 1}, dict(self.noise))
+        assert matrix.matrix.shape == (4, 1)
+        assert matrix.get_variable_scores() == {
+            "suzy_throws": 0.0,
+            "billy_throws": 0.0,
+            "suzy_hits": 0.0,
+            "billy_hits": 0.0,
+        }
+        assert matrix.get_alt_events(["suzy_throws"]) == []
+        assert not matrix.covers(["suzy_throws", "billy_hits"])
+
+    def test_2(self):
+        # With pairs, stopping Suzy's throw while Billy's rock does not hit changes the outcome
+        env = RockThrowing()
+        state = env.get_state(dict(self.noise))
+        matrix = ButForMatrix(
+            env, state, {"bottle_shatters": 1}, dict(self.noise), include_pairs=True
+        )
+        assert matrix.covers(["suzy_throws", "billy_hits"])
+        assert matrix.matrix.shape == (4 + 6 * 3, 1)
+        assert matrix.get_alt_events(["billy_throws", "billy_hits"]) == []
+        assert matrix.get_alt_events(["suzy_throws", "billy_hits"]) == [
+            {"suzy_throws": 0, "billy_hits": 0}
+        ]
+
+    def test_3(self):
+        # The matrix does not change the actual causes, and necessity is found without a witness search
+        env = ForestFireRainStorm()
+        tables = []
+        for but_for in [False, True]:
+            definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            solver = HPExhaustiveSearch(env, definition, but_for=but_for)
+            with instrument() as profile:
+                table = solver.solve_all_states(env, definition, ["fire_in_june"])
+            tables.append(
+                [sorted(sorted(c) for c in causes) for causes in table["actual_causes"]]
+            )
+        assert tables[0] == tables[1]
+        assert (
+            profile.get_report()["keyed_counters"]["witness_sets_tried"]["but_for"] > 0
+        )
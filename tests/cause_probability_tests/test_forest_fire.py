@@ -0,0 +1,43 @@
+import pytest
+from counterfact.causal_models.noise import BernoulliNoise
+from counterfact.examples import BinaryAnd, ForestFireDisjunctive
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+
+
+class TestCauseProbabilitiesForestFire:
+
+    def test_1(self):
+        # Lightning and arson are independent with different probabilities
+        env = ForestFireDisjunctive()
+        env.original_functions["lightning"].noise_dist = BernoulliNoise("u", p=0.1)
+        env.original_functions["arson"].noise_dist = BernoulliNoise("u", p=0.3)
+        env.reset()
+        ac_defn = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        solver = HPExhaustiveSearch(env, ac_defn)
+        result = solver.get_cause_probabilities(env, ac_defn, ["fire"])
+        assert result["n_configurations"] == 4
+        assert result["total_probability"] == pytest.approx(1.0)
+
+        # Each cause is weighted by the probability of the states where it is a cause
+        fire = (("fire", 1),)
+        no_fire = (("fire", 0),)
+        assert result["outcome_probabilities"][fire] == pytest.approx(0.37)
+        causes = result["cause_probabilities"]
+        assert causes[((("arson", 1),), fire)] == pytest.approx(0.9 * 0.3)
+        assert causes[((("lightning", 1),), fire)] == pytest.approx(0.1 * 0.7)
+        assert causes[((("arson", 0),), no_fire)] == pytest.approx(0.9 * 0.7)
+        conditional = result["conditional_cause_probabilities"]
+        assert conditional[((("arson", 1),), fire)] == pytest.approx(0.27 / 0.37)
+        assert conditional[((("arson", 0),), no_fire)] == pytest.approx(1.0)
+
+    def test_2(self):
+        # States are weighted by the same probabilities in the table of all states
+        env = BinaryAnd()
+        ac_defn = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        solver = HPExhaustiveSearch(env, ac_defn)
+        ac_table = solver.solve_all_states(env, ac_defn, ["y"])
+        result = solver.get_cause_probabilities(env, ac_defn, ["y"])
+        assert ac_table[("probability", "")].sum() == pytest.approx(1.0)
+        assert result["cause_probabilities"][((("a", 1),), (("y", 1),))] == 0.25
@@ -0,0 +1,61 @@
+import torch
+from counterfact.examples import RockThrowing
+from counterfact.definitions import DirectActualCause
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+from counterfact.utils.instrumentation import instrument
+
+
+class TestDirectSufficiencyRockThrowing:
+
+    noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+
+    def test_1(self):
+        # Suzy throwing is not directly sufficient, since her rock can be stopped from hitting the bottle
+        env = RockThrowing()
+        state = env.get_compact_state(dict(self.noise))
+        with instrument() as profile:
+            sufficient, info = DirectActualCause().is_sufficient(
+                env, {"suzy_throws": 1}, {"bottle_shatters": 1}, state, dict(self.noise)
+            )
+        assert not sufficient
+        assert info["ac2b_counterexample"] == {"suzy_hits": 0, "billy_hits": 0}
+        assert info["ac2b_counterexample_source"] == "heuristic"
+        assert info["ac2b_alt_outcome"] == {"bottle_shatters": 0}
+
+        # The counterexample is a single change of the actual values of the parents of the outcome
+        assert profile.get_report()["counters"]["sufficiency_assignments_tried"] == 2
+
+    def test_2(self):
+        # Suzy's rock hitting the bottle is directly sufficient, only the other parent of the outcome is enumerated
+        env = RockThrowing()
+        state = env.get_compact_state(dict(self.noise))
+        for counterexample_guided in [True, False]:
+            definition = DirectActualCause(counterexample_guided=counterexample_guided)
+            with instrument() as profile:
+                sufficient, info = definition.is_sufficient(
+                    env,
+                    {"suzy_hits": 1},
+                    {"bottle_shatters": 1},
+                    state,
+                    dict(self.noise),
+                )
+            assert sufficient
+            assert (
+                profile.get_report()["counters"]["sufficiency_assignments_tried"] == 2
+            )
+
+    def test_3(self):
+        # Counterexample guidance does not change the actual causes
+        tables = []
+        for counterexample_guided in [True, False]:
+            env = RockThrowing()
+            definition = DirectActualCause(
+                search_order=HeuristicSearchOrder(seed=0),
+                counterexample_guided=counterexample_guided,
+                seed=0,
+            )
+            solver = HPExhaustiveSearch(env, definition)
+            table = solver.solve_all_states(env, definition, ["bottle_shatters"])
+            tables.append([sorted(causes) for causes in table["actual_causes"]])
+        assert tables[0] == tables[1]
@@ -0,0 +1,76 @@
+import torch
+from counterfact.examples import Voting
+from counterfact.definitions import DirectActualCause
+
+
+class TestSampledSufficiencyVoting:
+
+    n_voters = 15
+    noise = {f"voter_{i}": torch.tensor(1) for i in range(1, n_voters + 1)}
+
+    def test_1(self):
+        # A majority of votes is sufficient, which is checked on samples of the other votes
+        env = Voting(self.n_voters)
+        state = env.get_compact_state(dict(self.noise))
+        definition = DirectActualCause(
+            counterexample_guided=False, sampling_tolerance=0.1, seed=0
+        )
+        event = {f"voter_{i}": 1 for i in range(1, 9)}
+        sufficient, info = definition.is_sufficient(
+            env, event, {"winner": 1}, state, dict(self.noise)
+        )
+        assert sufficient
+        assert info["ac2b_sampled"]
+        assert info["ac2b_n_samples"] == 30
+        assert info["ac2b_confidence"] == 0.95
+
+    def test_2(self):
+        # A single vote is not sufficient, and a sampled intervention on the other votes shows it
+        env = Voting(self.n_voters)
+        state = env.get_compact_state(dict(self.noise))
+        definition = DirectActualCause(
+            counterexample_guided=False, sampling_tolerance=0.1, seed=0
+        )
+        sufficient, info = definition.is_sufficient(
+            env, {"voter_1": 1}, {"winner": 1}, state, dict(self.noise)
+        )
+        assert not sufficient
+        assert info["ac2b_counterexample_source"] == "sampling"
+        assert info["ac2b_alt_outcome"] == {"winner": 0}
+        assert sum(info["ac2b_counterexample"].values()) < 7
+
+    def test_3(self):
+        # Few remaining interventions are enumerated exactly
+        env = Voting(self.n_voters)
+        state = env.get_compact_state(dict(self.noise))
+        definition = DirectActualCause(sampling_tolerance=0.1)
+        event = {f"voter_{i}": 1 for i in range(1, 12)}
+        sufficient, info = definition.is_sufficient(
+            env, event, {"winner": 1}, state, dict(self.noise)
+        )
+        assert sufficient
+        assert "ac2b_sampled" not in info
+
+    def test_4(self):
+        # Sampled checks on the same model share one twin network
+        env = Voting(self.n_voters)
+        state = env.get_compact_state(dict(self.noise))
+        definition = DirectActualCause(
+            counterexample_guided=False, sampling_tolerance=0.1, seed=0
+        )
+        definition.is_actual_cause(
+            env, {"voter_1": 1}, {"winner": 1}, state, dict(self.noise)
+        )
+        network = definition.sampling_network
+        assert network is not None and network.env is env
+        definition.is_sufficient(
+            env, {"voter_2": 1}, {"winner": 1}, state, dict(self.noise)
+        )
+        assert definition.sampling_network is network
+
+        # A different model gets its own network
+        other = Voting(self.n_voters)
+        definition.is_sufficient(
+            other, {"voter_2": 1}, {"winner": 1}, state, dict(self.noise)
+        )
+        assert definition.sampling_network.env is other
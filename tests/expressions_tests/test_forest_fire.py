@@ -0,0 +1,125 @@
+import itertools
+import pytest
+import torch
+from counterfact.causal_models.expressions import (
+    ExpressionFunction,
+    Lookup,
+    Var,
+    Xor,
+)
+from counterfact.examples import ForestFireRainStorm, Mover1D
+
+
+def satisfying_assignments(cnf):
+    """
+    Enumerate all assignments of the atoms of a small CNF that satisfy every clause
+    """
+    atoms = list(cnf.atoms)
+    for values in itertools.product([0, 1], repeat=len(atoms)):
+        assignment = dict(zip(atoms, values))
+        if all(
+            any(assignment[atoms[abs(lit) - 1]] == (lit > 0) for lit in clause)
+            for clause in cnf.clauses
+        ):
+            yield assignment
+
+
+class TestExpressionsForestFire:
+
+    def test_1(self):
+        # The ported expression agrees with the original Python function on every input
+        def fire_in_june(inputs):
+            return int(
+                inputs["june_electric_storm"]
+                and (inputs["april_showers"] or not inputs["may_electric_storm"])
+            )
+
+        env = ForestFireRainStorm()
+        function = env.structural_functions["fire_in_june"]
+        supports = {var: [0, 1] for var in env.variables}
+        truth_table = function.truth_table(supports)
+        assert len(truth_table) == 8
+        for row, value in truth_table.items():
+            inputs = dict(zip(function.parents, row))
+            assert value == fire_in_june(inputs)
+            assert function(inputs) == value
+
+    def test_2(self):
+        # Models of the CNF are exactly the rows of the truth table
+        env = ForestFireRainStorm()
+        function = env.structural_functions["fire_in_june"]
+        supports = {var: [0, 1] for var in env.variables}
+        truth_table = function.truth_table(supports)
+        cnf = function.to_cnf("fire_in_june", supports)
+        models = list(satisfying_assignments(cnf))
+        assert len(models) == len(truth_table)
+        for model in models:
+            row = tuple(model[var] for var in function.parents)
+            assert model["fire_in_june"] == truth_table[row]
+        assert cnf.to_dimacs().startswith(f"p cnf {len(cnf.atoms)} ")
+
+
+class TestExpressionsMover1D:
+
+    def test_1(self):
+        # Batched evaluation agrees with scalar evaluation
+        env = Mover1D(world_length=4)
+        function = env.structural_functions["next_mover_pos"]
+        inputs = {
+            "mover": torch.tensor([0, 1, 2, 2]),
+            "obstacle": torch.tensor([1, 1, 3, 0]),
+        }
+        outputs = function.evaluate(inputs)
+        assert outputs.tolist() == [0, 2, 2, 3]
+        for i in range(4):
+            scalar_inputs = {var: values[i] for var, values in inputs.items()}
+            assert function(scalar_inputs) == outputs[i]
+
+    def test_2(self):
+        # Non-binary expressions are encoded one-hot from their truth table
+        env = Mover1D(world_length=3)
+        function = env.structural_functions["next_mover_pos"]
+        supports = {
+            "mover": [0, 1, 2],
+            "obstacle": [0, 1, 2],
+            "next_mover_pos": [0, 1, 2, 3],
+        }
+        truth_table = function.truth_table(supports)
+        cnf = function.to_cnf("next_mover_pos", supports)
+        for model in satisfying_assignments(cnf):
+            values = {
+                var: [v for v in support if model[(var, v)]]
+                for var, support in supports.items()
+            }
+            assert all(len(v) == 1 for v in values.values())
+            row = (values["mover"][0], values["obstacle"][0])
+            assert values["next_mover_pos"][0] == truth_table[row]
+
+
+class TestExpressionFunction:
+
+    def test_1(self):
+        # Lookups, arithmetic and xor compile to the same values in both backends
+        expression = Lookup([Var("a"), Var("b")], {(0, 0): 3, (1, 1): 5}, default=0)
+        function = ExpressionFunction(expression * 2 - Xor(Var("a"), Var("b")))
+        assert function.parents == ["a", "b"]
+        assert function.truth_table({"a": [0, 1], "b": [0, 1]}) == {
+            (0, 0): 6,
+            (0, 1): -1,
+            (1, 0): -1,
+            (1, 1): 10,
+        }
+        assert function({"a": torch.tensor(1.0), "b": torch.tensor(1.0)}) == 10
+
+        # Parents must include every variable in the expression, and expressions cannot be used as booleans
+        with pytest.raises(ValueError):
+            ExpressionFunction(Var("a") & Var("b"), parents=["a"])
+        with pytest.raises(TypeError):
+            Var("a") and Var("b")
+
+    def test_2(self):
+        # Xor of more than two arguments is their parity in both backends
+        function = ExpressionFunction(Xor(Var("a"), Var("b"), Var("c")))
+        inputs = {"a": torch.tensor(1), "b": torch.tensor(0), "c": torch.tensor(2)}
+        assert function(inputs) == 0
+        assert function.evaluate_batch({"a": [1], "b": [0], "c": [2]}, {})[0] == 0
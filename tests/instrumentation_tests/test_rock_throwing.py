@@ -0,0 +1,98 @@
+import json
+import threading
+import torch
+from counterfact.examples import RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils.instrumentation import instrument, instrumentation
+
+
+class TestInstrumentationRockThrowing:
+
+    noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+    outcome = {"bottle_shatters": 1}
+
+    def test_1(self):
+        # Counts are recorded in total and per key
+        env = RockThrowing()
+        with instrument() as profile:
+            env.get_state(dict(self.noise))
+            profile.count("custom", "a", n=2)
+            profile.count("custom", "b")
+        report = profile.get_report()
+        assert report["counters"]["get_state"] == 1
+        assert report["counters"]["evaluate"] == sum(
+            report["keyed_counters"]["evaluate"].values()
+        )
+        assert set(report["keyed_counters"]["evaluate"]) == set(env.variables)
+        assert report["counters"]["custom"] == 3
+        assert report["keyed_counters"]["custom"] == {"a": 2, "b": 1}
+
+    def test_2(self):
+        # The report has the timings of every section checked by is_actual_cause
+        env = RockThrowing()
+        state = env.get_state(dict(self.noise))
+        with instrument() as profile:
+            ModifiedHP().is_actual_cause(
+                env, {"suzy_throws": 1}, self.outcome, state, dict(self.noise)
+            )
+        timings = profile.get_report()["timings"]
+        for name in ["is_factual", "is_sufficient", "is_necessary", "is_minimal"]:
+            assert timings[name]["calls"] == 1
+            assert timings[name]["mean_time"] == timings[name]["total_time"]
+            assert timings[name]["max_time"] >= 0
+
+    def test_3(self, tmp_path):
+        # The Chrome trace has a complete event per span and a counter event per keyed counter
+        env = RockThrowing()
+        with instrument() as profile:
+            with profile.span("outer", label="test"):
+                env.get_state(dict(self.noise))
+        filename = tmp_path / "trace.json"
+        trace = profile.to_chrome_trace(str(filename))
+        with open(filename) as f:
+            assert json.load(f) == json.loads(json.dumps(trace))
+
+        complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        assert [event["name"] for event in complete] == ["outer"]
+        assert complete[0]["args"] == {"label": "test"}
+        assert complete[0]["dur"] >= 0
+        counters = {
+            event["name"]: event["args"]
+            for event in trace["traceEvents"]
+            if event["ph"] == "C"
+        }
+        assert (
+            counters["evaluate"] == profile.get_report()["keyed_counters"]["evaluate"]
+        )
+        assert trace["otherData"]["counters"]["get_state"] == 1
+
+    def test_4(self):
+        # Nothing is recorded while instrumentation is disabled
+        env = RockThrowing()
+        instrumentation.reset()
+        assert not instrumentation.enabled
+        HPExhaustiveSearch(env, ModifiedHP()).solve_all_states(
+            env, None, ["bottle_shatters"]
+        )
+        report = instrumentation.get_report()
+        assert report["counters"] == {}
+        assert report["keyed_counters"] == {}
+        assert report["timings"] == {}
+        assert instrumentation.to_chrome_trace()["traceEvents"] == []
+
+    def test_5(self):
+        # Counts from several threads are not lost
+        def count():
+            for _ in range(10000):
+                instrumentation.count("threads", "key")
+
+        with instrument() as profile:
+            threads = [threading.Thread(target=count) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        report = profile.get_report()
+        assert report["counters"]["threads"] == 80000
+        assert report["keyed_counters"]["threads"] == {"key": 80000}
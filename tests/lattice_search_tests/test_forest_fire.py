@@ -0,0 +1,40 @@
+from counterfact.examples import ForestFireRainStorm
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch, HPLatticeSearch
+from counterfact.utils import HeuristicSearchOrder
+from counterfact.utils.instrumentation import instrument
+
+
+class TestLatticeSearchForestFire:
+
+    def test_1(self):
+        # The level-wise search finds the same actual causes as exhaustive search
+        env = ForestFireRainStorm()
+        tables = []
+        for solver_class in [HPExhaustiveSearch, HPLatticeSearch]:
+            definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            table = solver_class(env, definition).solve_all_states(
+                env, definition, ["fire_in_june"]
+            )
+            tables.append(
+                [sorted(sorted(c) for c in causes) for causes in table["actual_causes"]]
+            )
+        assert tables[0] == tables[1]
+
+    def test_2(self):
+        # Candidates are only generated from surviving events of the size below
+        survivors = [("a", "b"), ("a", "c"), ("a", "d"), ("b", "c")]
+        assert HPLatticeSearch.generate_candidates(survivors) == [("a", "b", "c")]
+
+    def test_3(self):
+        # Supersets of necessary and sufficient events are never checked
+        env = ForestFireRainStorm()
+        n_checked = []
+        for solver_class in [HPExhaustiveSearch, HPLatticeSearch]:
+            definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            with instrument() as profile:
+                solver_class(env, definition).solve_all_states(
+                    env, definition, ["fire_in_june"]
+                )
+            n_checked.append(profile.get_report()["timings"]["is_factual"]["calls"])
+        assert n_checked[1] < n_checked[0]
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+import pytest
+import torch
+import counterfact.definitions
+import counterfact.examples
+import counterfact.utils
+from counterfact.examples import RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+
+
+class TestLazyImportRockThrowing:
+
+    def test_1(self):
+        # Importing the packages does not import their submodules or heavy dependencies
+        code = (
+            "import sys, counterfact, counterfact.utils, counterfact.inference, "
+            "counterfact.definitions, counterfact.examples; "
+            "print([m for m in ['torch', 'pyro', 'pandas', 'networkx', "
+            "'counterfact.inference.solver', 'counterfact.examples.rock_throwing'] "
+            "if m in sys.modules])"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert process.stdout.strip() == "[]"
+
+    def test_2(self):
+        # Lazily imported names are listed and are the same objects as in their submodules
+        from counterfact.definitions.modified_hp import ModifiedHP as Definition
+        from counterfact.examples.rock_throwing import RockThrowing as Example
+
+        assert counterfact.definitions.ModifiedHP is Definition
+        assert counterfact.examples.RockThrowing is Example
+        assert "ModifiedHP" in dir(counterfact.definitions)
+        assert "add_info" in counterfact.utils.__all__
+        assert set(counterfact.examples.__all__) <= set(dir(counterfact.examples))
+        with pytest.raises(AttributeError):
+            counterfact.utils.not_a_name
+
+    def test_3(self):
+        # Lazily imported examples, definitions and solvers find the actual causes
+        env = RockThrowing()
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        state = env.get_state(dict(noise))
+        solver = HPExhaustiveSearch(
+            env, ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        )
+        actual_causes = solver.solve(
+            state, {"bottle_shatters": state["bottle_shatters"]}, dict(noise)
+        )
+        assert sorted(sorted(event) for event in actual_causes) == [
+            ["suzy_hits"],
+            ["suzy_throws"],
+        ]
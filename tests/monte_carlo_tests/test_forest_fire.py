@@ -0,0 +1,70 @@
+import pytest
+import torch
+from counterfact.examples import (
+    ForestFireConjunctive,
+    ForestFireDisjunctive,
+    RockThrowing,
+)
+from counterfact.inference import MonteCarloEstimator
+
+
+class TestMonteCarloForestFire:
+
+    def test_1(self):
+        # Arson is necessary for the fire only if there was no lightning, and always sufficient
+        env = ForestFireDisjunctive()
+        estimator = MonteCarloEstimator(env, batch_size=500, ci_width=0.1, seed=0)
+        pn, info = estimator.probability_of_necessity({"arson": 1}, {"fire": 1})
+        assert info["ci"][0] <= 0.5 <= info["ci"][1]
+        assert info["converged"]
+        assert info["n_samples"] <= estimator.max_samples
+        ps, info = estimator.probability_of_sufficiency({"arson": 1}, {"fire": 1})
+        assert ps == 1.0
+
+    def test_2(self):
+        # Arson is always necessary for the fire, and sufficient only with lightning
+        env = ForestFireConjunctive()
+        estimator = MonteCarloEstimator(env, batch_size=500, ci_width=0.1, seed=0)
+        pn, info = estimator.probability_of_necessity({"arson": 1}, {"fire": 1})
+        assert pn == 1.0
+        ps, info = estimator.probability_of_sufficiency({"arson": 1}, {"fire": 1})
+        assert ps == pytest.approx(0.5, abs=0.1)
+        assert info["ci"][1] - info["ci"][0] <= 0.1
+
+    def test_3(self):
+        # Sampling stops at max_samples when the interval cannot be made narrow enough
+        env = ForestFireDisjunctive()
+        estimator = MonteCarloEstimator(
+            env, batch_size=100, max_samples=300, ci_width=0.01, seed=0
+        )
+        pn, info = estimator.probability_of_necessity({"arson": 1}, {"fire": 1})
+        assert info["n_samples"] == 300
+        assert not info["converged"]
+
+    def test_4(self):
+        # Estimation does not change the model and keeps the interventions already on it
+        env = ForestFireDisjunctive()
+        env.intervene({"lightning": 1})
+        functions = env.structural_functions
+        estimator = MonteCarloEstimator(env, batch_size=500, ci_width=0.1, seed=0)
+        pn, info = estimator.probability_of_necessity({"arson": 1}, {"fire": 1})
+        assert pn == 0.0
+        assert info["n_conditioned"] > 0
+        assert set(env.interventions) == {"lightning"}
+        assert env.structural_functions is functions
+
+    def test_5(self):
+        # Seeded estimates of torch noise are reproducible and leave the global torch generator alone
+        env = RockThrowing()
+        event, outcome = {"suzy_throws": 1}, {"bottle_shatters": 1}
+        torch.manual_seed(1)
+        expected = torch.rand(1)
+        torch.manual_seed(1)
+        first = MonteCarloEstimator(env, seed=0).probability_of_sufficiency(
+            event, outcome
+        )
+        assert torch.rand(1) == expected
+        second = MonteCarloEstimator(env, seed=0).probability_of_sufficiency(
+            event, outcome
+        )
+        assert first == second
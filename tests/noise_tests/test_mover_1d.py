@@ -0,0 +1,55 @@
+import copy
+import numpy as np
+import pytest
+import torch
+from counterfact.causal_models.noise import BernoulliNoise, CategoricalNoise
+from counterfact.examples import BinaryAnd, Mover1D
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+
+
+class TestCategoricalNoise:
+
+    def test_1(self):
+        # Support and probabilities are exact, and batches are drawn from the supplied generator
+        noise = CategoricalNoise("u_major", [0, 1, 2], [0.2, 0.3, 0.5])
+        assert noise.enumerate_support() == [0, 1, 2]
+        assert noise.items() == [(0, 0.2), (1, 0.3), (2, 0.5)]
+        assert noise.prob(torch.tensor(2)) == 0.5
+        assert noise.prob(3) == 0.0
+        samples = noise.sample_batch(10000, np.random.default_rng(0))
+        same_samples = noise.sample_batch(10000, np.random.default_rng(0))
+        assert np.array_equal(samples, same_samples)
+        assert set(samples.tolist()) == {0, 1, 2}
+        assert abs(np.mean(samples == 2) - 0.5) < 0.05
+
+        # Samples are tensors with the requested shape, and the noise is shared across model resets
+        assert noise.sample().shape == ()
+        assert noise.sample((3, 4)).shape == (3, 4)
+        assert copy.deepcopy(noise) is noise
+        assert BernoulliNoise("u", p=0.25).items() == [(0, 0.75), (1, 0.25)]
+        with pytest.raises(ValueError):
+            CategoricalNoise("u", [0, 1], [0.5, 0.6])
+        with pytest.raises(ValueError):
+            CategoricalNoise("u", [0, 0])
+
+
+class TestNoiseSupportsMover1D:
+
+    def test_1(self):
+        # Noise supports come from the noise distributions, not from the supports of the variables
+        env = Mover1D(world_length=4)
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        noise_supports = solver.get_noise_supports(env)
+        assert noise_supports == {"mover": [0, 1, 2], "obstacle": [0, 1, 2, 3]}
+        noise_probs = solver.get_noise_probabilities(env, noise_supports)
+        assert noise_probs["mover"] == pytest.approx([1 / 3] * 3)
+        assert noise_probs["obstacle"] == pytest.approx([1 / 4] * 4)
+
+    def test_2(self):
+        # Every state is weighted by the probability of its noise configuration
+        env = BinaryAnd()
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        ac_table = solver.solve_all_states(env, ModifiedHP(), ["y"])
+        assert len(ac_table) == 4
+        assert ac_table[("probability", "")].tolist() == pytest.approx([0.25] * 4)
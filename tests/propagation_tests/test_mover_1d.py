@@ -0,0 +1,87 @@
+import numpy as np
+import torch
+from counterfact.causal_models.expressions import Lookup, Var
+from counterfact.examples import Mover1D, RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import (
+    Domain,
+    DomainPropagation,
+    HPExhaustiveSearch,
+    expression_domain,
+)
+from counterfact.utils import HeuristicSearchOrder
+from counterfact.utils.instrumentation import instrument
+
+
+class TestDomainsMover1D:
+
+    def test_1(self):
+        # Small domains are evaluated exactly and large ones with interval arithmetic
+        domains = {"a": Domain([1, 2]), "b": Domain.interval(0, 10000)}
+        assert expression_domain(Var("a") * 3, domains, {}) == Domain([3, 6])
+        assert expression_domain(Var("a") - Var("b"), domains, {}) == Domain.interval(
+            -9999, 2
+        )
+        assert expression_domain(Var("b") >= 0, domains, {}) == Domain([1])
+        assert expression_domain(Var("b").eq(Var("a")), domains, {}) == Domain([0, 1])
+
+        # Lookups on too many key combinations use the values of the table instead of enumerating them, even when
+        # the number of combinations does not fit in 64 bits
+        keys = [Var(f"k{i}") for i in range(6)]
+        domains = {f"k{i}": Domain(range(4096)) for i in range(6)}
+        lookup = Lookup(keys, {(0,) * 6: 7}, default=3)
+        assert expression_domain(lookup, domains, {}) == Domain([3, 7])
+
+    def test_2(self):
+        # Only an obstacle right in front of the mover can change where it moves
+        env = Mover1D(world_length=1000)
+        noise = {"mover": torch.tensor(400), "obstacle": torch.tensor(10)}
+        state = env.get_state(dict(noise))
+        event = {"obstacle": state["obstacle"]}
+        outcome = {"next_mover_pos": state["next_mover_pos"]}
+        propagation = DomainPropagation(env)
+        alt_assignments = np.arange(0, 1001).reshape(-1, 1)
+        pruned = propagation.prune_alt_assignments(
+            event, outcome, state, noise, alt_assignments
+        )
+        assert pruned.tolist() == [[401]]
+
+        # The event is necessary either way, with far fewer evaluations of the model
+        evaluations = []
+        for kwargs in [{}, {"domain_propagation": propagation}]:
+            ac_defn = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            with instrument() as profile:
+                necessary, info = ac_defn.is_necessary(
+                    env, event, outcome, state, dict(noise), **kwargs
+                )
+            assert necessary
+            assert info["ac2a_alt_event"] == {"obstacle": 401}
+            evaluations.append(profile.get_report()["counters"]["evaluate"])
+        assert evaluations[1] < evaluations[0]
+
+    def test_3(self):
+        # Witness sets that only differ in variables the alternative event cannot change are tried once
+        env = RockThrowing()
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        state = env.get_state(dict(noise))
+        propagation = DomainPropagation(env)
+        witness_sets = [(), ("billy_throws",), ("billy_hits",), ("suzy_hits",)]
+        pruned = propagation.prune_witness_sets(
+            {"suzy_throws": 0},
+            {"bottle_shatters": 1},
+            state,
+            noise,
+            witness_sets,
+        )
+        assert pruned == [(), ("billy_hits",), ("suzy_hits",)]
+
+        # Solving with propagation finds the same causes
+        causes = []
+        for domain_propagation in [False, True]:
+            ac_defn = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            solver = HPExhaustiveSearch(
+                env, ac_defn, domain_propagation=domain_propagation
+            )
+            ac_table = solver.solve_all_states(env, ac_defn, ["bottle_shatters"])
+            causes.append([sorted(c) for c in ac_table["actual_causes"]])
+        assert causes[0] == causes[1]
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import torch
+from counterfact.examples import RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+
+
+class TestQueryRockThrowing:
+
+    noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+    outcome = {"bottle_shatters": 1}
+
+    def test_1(self):
+        # A query gives the same state as intervening, and leaves the model and noise unchanged
+        env = RockThrowing()
+        structural_functions = env.structural_functions
+        noise = dict(self.noise)
+        state = env.query({"suzy_hits": 0}, noise)
+        assert env.interventions == {}
+        assert env.structural_functions is structural_functions
+        assert noise == self.noise
+
+        env.intervene({"suzy_hits": 0})
+        expected = env.get_state(dict(self.noise))
+        env.reset()
+        assert {var: int(value) for var, value in state.items()} == {
+            var: int(value) for var, value in expected.items()
+        }
+        assert int(state["billy_hits"]) == 1
+        assert int(state["bottle_shatters"]) == 1
+
+    def test_2(self):
+        # Queries are applied on top of the interventions of the model, and unknown variables are rejected
+        env = RockThrowing()
+        env.intervene({"billy_throws": 0})
+        state = env.query({"suzy_hits": 0}, dict(self.noise))
+        assert int(state["bottle_shatters"]) == 0
+        assert env.interventions.keys() == {"billy_throws"}
+        with pytest.raises(ValueError):
+            env.query({"rock": 1}, dict(self.noise))
+
+    def test_3(self):
+        # Threads searching for actual causes on one shared model find the same causes as a sequential search
+        env = RockThrowing()
+        structural_functions = env.structural_functions
+        noises = [
+            {"suzy_throws": torch.tensor(s), "billy_throws": torch.tensor(b)}
+            for s in [0, 1]
+            for b in [0, 1]
+        ]
+
+        def solve(noise):
+            definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+            state = env.get_state(dict(noise))
+            actual_causes = HPExhaustiveSearch(env, definition).solve(
+                state, {"bottle_shatters": state["bottle_shatters"]}, dict(noise)
+            )
+            return sorted(sorted(event) for event in actual_causes)
+
+        expected = [solve(noise) for noise in noises]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(solve, noises * 4))
+        assert results == expected * 4
+        assert env.interventions == {}
+        assert env.structural_functions is structural_functions
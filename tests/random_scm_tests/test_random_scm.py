@@ -0,0 +1,49 @@
+import pytest
+import torch
+from counterfact.examples import RandomSCM
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+
+
+class TestRandomSCM:
+
+    def test_1(self):
+        # The longest path has depth edges, and no variable has more than max_in_degree parents
+        env = RandomSCM(n_nodes=30, max_in_degree=3, depth=5, seed=0)
+        assert len(env.variables) == 30
+        assert len(env.layers) == 6
+        assert env.layers[-1] == ["y"]
+        for k, layer in enumerate(env.layers[1:], start=1):
+            for var in layer:
+                parents = env.get_parents(var)
+                assert 1 <= len(parents) <= 3
+                assert any(parent in env.layers[k - 1] for parent in parents)
+        with pytest.raises(ValueError):
+            RandomSCM(n_nodes=3, depth=3)
+
+    def test_2(self):
+        # The same seed gives the same model, and all values are in the support of their variables
+        var_types = ("bool", "int", "discrete")
+        env = RandomSCM(n_nodes=20, var_types=var_types, seed=1)
+        same_env = RandomSCM(n_nodes=20, var_types=var_types, seed=1)
+        for i in range(3):
+            noise = {
+                var: torch.tensor(env.get_support_values(var)[i % 2])
+                for var in env.layers[0]
+            }
+            state = env.get_state(dict(noise))
+            same_state = same_env.get_state(dict(noise))
+            for var, value in state.items():
+                assert int(value) == int(same_state[var])
+                assert int(value) in env.get_support_values(var)
+
+    def test_3(self):
+        # Generated models plug into the solvers
+        env = RandomSCM(n_nodes=5, depth=2, seed=2)
+        noise = {var: torch.tensor(1) for var in env.layers[0]}
+        state = env.get_state(dict(noise))
+        env.reset()
+        outcome = {var: state[var] for var in env.outcome_vars}
+        solver = HPExhaustiveSearch(env, ModifiedHP())
+        actual_causes = solver.solve(state, outcome, noise)
+        assert len(actual_causes) > 0
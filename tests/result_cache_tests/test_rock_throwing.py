@@ -0,0 +1,117 @@
+import pickle
+import threading
+import time
+from counterfact.causal_models.scm import StructuralFunction
+from counterfact.definitions import ModifiedHP, DirectActualCause
+from counterfact.examples import RockThrowing, Voting
+from counterfact.queries import load_model, run_query
+from counterfact.utils import (
+    ResultCache,
+    get_definition_fingerprint,
+    get_model_fingerprint,
+)
+
+
+class TestResultCacheRockThrowing:
+
+    query = {
+        "model": "RockThrowing",
+        "state": {"suzy_throws": 1, "billy_throws": 1},
+        "outcome": ["bottle_shatters"],
+    }
+
+    def test_1(self):
+        # Fingerprints are the same for the same model and change with its functions and constructor arguments
+        assert get_model_fingerprint(RockThrowing()) == get_model_fingerprint(
+            RockThrowing()
+        )
+        assert get_model_fingerprint(Voting(3)) != get_model_fingerprint(Voting(5))
+        env = RockThrowing()
+        env.set_structural_function(
+            "bottle_shatters",
+            StructuralFunction(
+                lambda inputs, noise: inputs["suzy_hits"] * inputs["billy_hits"],
+                ["suzy_hits", "billy_hits"],
+            ),
+        )
+        assert get_model_fingerprint(env) != get_model_fingerprint(RockThrowing())
+        assert get_definition_fingerprint(ModifiedHP()) == get_definition_fingerprint(
+            ModifiedHP()
+        )
+        assert get_definition_fingerprint(
+            DirectActualCause()
+        ) != get_definition_fingerprint(DirectActualCause(sampling_tolerance=0.1))
+
+    def test_2(self, tmp_path):
+        # Results are reused across cache instances with their info, but not for other definitions
+        models = {"RockThrowing": load_model("RockThrowing")}
+        path = str(tmp_path / "results.db")
+        result = run_query(models, self.query, cache=ResultCache(path))
+        assert result["cached"] is False
+        cache = pickle.loads(pickle.dumps(ResultCache(path)))
+        cached_result = run_query(models, self.query, cache=cache)
+        assert cached_result["cached"] is True
+        assert cached_result["actual_causes"] == result["actual_causes"]
+        assert cached_result["info"] == result["info"]
+        assert cached_result["info"][0]["is_necessary"] is True
+        query = {**self.query, "definition": "DirectActualCause"}
+        assert run_query(models, query, cache=cache)["cached"] is False
+        assert (cache.hits, cache.misses, len(cache)) == (1, 1, 2)
+
+    def test_3(self, tmp_path):
+        # Results of an old fingerprint of a model are deleted, and the least recently used results are evicted
+        cache = ResultCache(str(tmp_path / "results.db"), max_entries=2)
+        cache.add("a", "RockThrowing", "old", {"status": "ok"})
+        cache.add("b", "Voting", "old", {"status": "ok"})
+        cache.check_model("RockThrowing", "new")
+        assert cache.get("a") is None
+        assert cache.get("b") == {"status": "ok"}
+        cache.add("c", "Voting", "old", {"status": "ok"})
+        time.sleep(0.01)
+        cache.get("b")
+        time.sleep(0.01)
+        cache.add("d", "Voting", "old", {"status": "ok"})
+        assert len(cache) == 2
+        assert cache.get("c") is None
+        assert cache.get("b") is not None
+
+    def test_4(self, tmp_path):
+        # Inserts keep a running count of the results instead of counting them every time
+        cache = ResultCache(str(tmp_path / "results.db"), max_entries=3)
+        statements = []
+        cache.get_connection().set_trace_callback(statements.append)
+        for key in ["a", "b", "a", "c", "d", "e"]:
+            cache.add(key, "Voting", "old", {"status": "ok"})
+            time.sleep(0.01)
+        assert not any("COUNT" in statement for statement in statements)
+        assert cache.n_entries == len(cache) == 3
+        assert cache.get("b") is None
+        cache.check_model("Voting", "new")
+        assert cache.n_entries == len(cache) == 0
+
+    def test_5(self, tmp_path):
+        # Cache hits only read the database, and their last use is written with the next insert
+        path = str(tmp_path / "results.db")
+        cache = ResultCache(path, max_entries=2)
+        cache.add("a", "Voting", "old", {"status": "ok"})
+        time.sleep(0.01)
+        cache.add("b", "Voting", "old", {"status": "ok"})
+        statements = []
+        cache.get_connection().set_trace_callback(statements.append)
+        assert cache.get("a") is not None
+        assert cache.get("c") is None
+        assert not any("UPDATE" in statement for statement in statements)
+        cache.add("c", "Voting", "old", {"status": "ok"})
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+
+        # Hits and misses from several threads are all counted
+        threads = [
+            threading.Thread(target=lambda: [cache.get("a") for _ in range(50)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert (cache.hits, cache.misses) == (202, 2)
@@ -0,0 +1,102 @@
+import gc
+import pytest
+import numpy as np
+from counterfact.examples import RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.utils import HeuristicSearchOrder, RandomSearchOrder, assignment_key
+
+
+class TestHeuristicSearchOrderRockThrowing:
+
+    def test_1(self):
+        # The but-for test comes first and witness sets close to the outcome come before distant ones
+        env = RockThrowing()
+        search_order = HeuristicSearchOrder(seed=0)
+        state = {
+            "suzy_throws": 1,
+            "billy_throws": 1,
+            "suzy_hits": 1,
+            "billy_hits": 0,
+            "bottle_shatters": 1,
+        }
+        event = {"suzy_throws": 1}
+        outcome = {"bottle_shatters": 1}
+        remaining_vars = ["billy_throws", "suzy_hits", "billy_hits"]
+        witness_sets = search_order.order_witness_sets(
+            env, event, outcome, state, remaining_vars
+        )
+        assert witness_sets[0] == ()
+        assert set(witness_sets[1:3]) == {("suzy_hits",), ("billy_hits",)}
+        assert witness_sets[3] == ("billy_throws",)
+
+    def test_2(self):
+        # Alternative assignments that flip every binary variable come first
+        env = RockThrowing()
+        search_order = HeuristicSearchOrder(seed=0)
+        event = {"suzy_throws": 1, "billy_throws": 0}
+        alt_assignments = np.array([[0, 0], [1, 0], [0, 1], [1, 1]])
+        ordered = search_order.order_alt_assignments(
+            env, event, {}, event, alt_assignments
+        )
+        assert ordered[0].tolist() == [0, 1]
+
+    def test_3(self):
+        # Seeded strategies give reproducible orders
+        env = RockThrowing()
+        remaining_vars = ["billy_throws", "suzy_hits", "billy_hits", "suzy_throws"]
+        orders = [
+            RandomSearchOrder(seed=1).order_witness_sets(
+                env, {}, {"bottle_shatters": 1}, {}, remaining_vars
+            )
+            for _ in range(2)
+        ]
+        assert orders[0] == orders[1]
+
+    def test_4(self):
+        # Witness sets that succeeded for an earlier event are reused
+        env = RockThrowing()
+        search_order = HeuristicSearchOrder(seed=0)
+        state = {
+            "suzy_throws": 1,
+            "billy_throws": 1,
+            "suzy_hits": 1,
+            "billy_hits": 0,
+            "bottle_shatters": 1,
+        }
+        outcome = {"bottle_shatters": 1}
+        search_order.record_witness(
+            env, {"suzy_hits": 1}, outcome, state, ("billy_throws", "billy_hits")
+        )
+        witness_sets = search_order.order_witness_sets(
+            env,
+            {"suzy_throws": 1},
+            outcome,
+            state,
+            ["billy_throws", "suzy_hits", "billy_hits"],
+        )
+        assert witness_sets[:2] == [(), ("billy_throws", "billy_hits")]
+        assert len(witness_sets) == len(set(map(frozenset, witness_sets)))
+
+    def test_5(self):
+        # Graph distances are dropped with their model, and witness sets are kept for a bounded number of states
+        search_order = HeuristicSearchOrder(seed=0, max_states=2)
+        outcome = {"bottle_shatters": 1}
+        env = RockThrowing()
+        distances = search_order.get_distances(env, outcome)
+        assert distances["billy_throws"] == 2
+        assert search_order.get_distances(env, outcome) is distances
+        del env
+        gc.collect()
+        assert len(search_order.distances) == 0
+
+        env = RockThrowing()
+        states = [{"suzy_throws": i, "bottle_shatters": 1} for i in range(3)]
+        for state in states:
+            search_order.record_witness(
+                env, {"suzy_hits": 1}, outcome, state, ("billy_hits",)
+            )
+        assert len(search_order.successful_witnesses) == 2
+        assert (
+            assignment_key(states[0]),
+            assignment_key(outcome),
+        ) not in search_order.successful_witnesses
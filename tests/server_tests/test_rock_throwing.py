@@ -0,0 +1,136 @@
+import asyncio
+import json
+import pytest
+import torch
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.queries import (
+    BudgetedModel,
+    Budget,
+    BudgetExceeded,
+    load_model,
+    run_query,
+)
+from counterfact import server as server_module
+from counterfact.server import QueryServer, parse_model_spec
+
+
+class TestServerRockThrowing:
+
+    query = {
+        "id": 1,
+        "model": "RockThrowing",
+        "state": {"suzy_throws": 1, "billy_throws": 1},
+        "outcome": ["bottle_shatters"],
+    }
+
+    def test_1(self):
+        # Queries abduce the noise from the state and find the same causes as the given noise
+        models = {"RockThrowing": load_model("RockThrowing")}
+        result = run_query(models, self.query)
+        assert result["status"] == "ok"
+        assert result["actual_causes"] == [{"suzy_throws": 1}, {"suzy_hits": 1}]
+        noise_result = run_query(
+            models, {**self.query, "noise": {"suzy_throws": 1, "billy_throws": 1}}
+        )
+        assert noise_result["actual_causes"] == result["actual_causes"]
+        assert run_query(models, {**self.query, "model": "Voting"})["status"] == "error"
+
+    def test_2(self):
+        # A query stops when its budget is used up, and shared models cannot be intervened on
+        models = {"RockThrowing": load_model("RockThrowing")}
+        result = run_query(models, {**self.query, "budget": {"max_queries": 200}})
+        assert result["status"] == "ok"
+        result = run_query(
+            models, {**self.query, "budget": {"max_queries": 200}}, {"max_queries": 5}
+        )
+        assert result["status"] == "budget_exceeded"
+        assert result["n_queries"] == 6
+        with pytest.raises(RuntimeError):
+            BudgetedModel(models["RockThrowing"], Budget()).intervene({"suzy_hits": 0})
+        assert models["RockThrowing"].interventions == {}
+
+    def test_3(self):
+        # Results of all queries on a connection are sent back when they finish
+        alias, name, kwargs = parse_model_spec("rock=RockThrowing")
+        assert (alias, name, kwargs) == ("rock", "RockThrowing", {})
+        assert parse_model_spec("Voting:n_voters=5") == (
+            "Voting:n_voters=5",
+            "Voting",
+            {"n_voters": 5},
+        )
+        server = QueryServer({alias: load_model(name, kwargs)}, n_workers=2)
+
+        async def send_queries(queries):
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for query in queries:
+                writer.write(query.encode() + b"\n")
+            writer.write_eof()
+            results = [json.loads(line) async for line in reader]
+            listener.close()
+            return results
+
+        queries = [
+            json.dumps({**self.query, "id": i, "model": "rock"}) for i in range(4)
+        ]
+        results = asyncio.run(send_queries(queries + ["[1, 2]"]))
+        server.close()
+        ids = [result["id"] for result in results if result["id"] is not None]
+        assert sorted(ids) == [0, 1, 2, 3]
+        assert sum(result["status"] == "ok" for result in results) == 4
+        assert sum(result["status"] == "error" for result in results) == 1
+
+    def test_4(self):
+        # Structural functions that solvers evaluate directly, as in twin networks, are charged to the budget
+        env = BudgetedModel(load_model("RockThrowing"), Budget(max_queries=10))
+        twin_network = TwinNetwork(env)
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        twin_network.evaluate([{"suzy_throws": 0}], dict(noise))
+        assert env.budget.n_queries == 1
+        assert env.budget.n_function_evaluations > 0
+        with pytest.raises(BudgetExceeded):
+            twin_network.evaluate([{"suzy_throws": 0}] * 100, dict(noise))
+        assert type(env.structural_functions["suzy_hits"]) is type(
+            env.env.structural_functions["suzy_hits"]
+        )
+
+        models = {"RockThrowing": env.env}
+        for solver_kwargs in [
+            {"twin_network": True},
+            {"but_for": True},
+            {"domain_propagation": True},
+        ]:
+            query = {**self.query, "solver_kwargs": solver_kwargs}
+            assert run_query(models, query)["status"] == "ok"
+            result = run_query(models, {**query, "budget": {"max_queries": 3}})
+            assert result["status"] == "budget_exceeded"
+
+    def test_5(self):
+        # A line that is too long is answered with an error, and later queries on the connection still run
+        server = QueryServer(
+            {"RockThrowing": load_model("RockThrowing")}, n_workers=2, max_pending=1
+        )
+
+        async def send_lines(lines):
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for line in lines:
+                writer.write(line.encode() + b"\n")
+            writer.write_eof()
+            results = [json.loads(line) async for line in reader]
+            listener.close()
+            return results
+
+        limit = server_module.MAX_LINE_LENGTH
+        server_module.MAX_LINE_LENGTH = 1024
+        try:
+            queries = [json.dumps({**self.query, "id": i}) for i in range(3)]
+            results = asyncio.run(send_lines(["x" * 5000] + queries))
+        finally:
+            server_module.MAX_LINE_LENGTH = limit
+            server.close()
+        assert len(results) == 4
+        assert sorted(r["id"] for r in results if r["status"] == "ok") == [0, 1, 2]
+        assert "longer than" in results[0]["error"]
@@ -0,0 +1,143 @@
+import pytest
+import torch
+import numpy as np
+from counterfact.causal_models.scm import StructuralCausalModel, StructuralFunction
+from counterfact.causal_models.state import State
+from counterfact.causal_models.variables import Variable
+from counterfact.causal_models.noise import CategoricalNoise
+from counterfact.examples import RockThrowing
+from counterfact.definitions import ModifiedHP, OriginalHP, DirectActualCause
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+
+
+class Paint(StructuralCausalModel):
+    """
+    The paint dries if it is red and the dose of hardener is high, with discrete variables that are not integers
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.add_variables(
+            [
+                Variable("color", "discrete", ["red", "blue"]),
+                Variable("dose", "discrete", [0.5, 1.5]),
+                Variable("dries", "bool"),
+            ]
+        )
+
+        def color(inputs, noise):
+            return noise["color"]
+
+        def dose(inputs, noise):
+            return noise["dose"]
+
+        def dries(inputs, noise):
+            return int(inputs["color"] == "red" and inputs["dose"] > 1)
+
+        self.set_structural_functions(
+            {
+                "color": StructuralFunction(
+                    color, [], CategoricalNoise("u_color", ["red", "blue"], [0.5, 0.5])
+                ),
+                "dose": StructuralFunction(
+                    dose, [], CategoricalNoise("u_dose", [0.5, 1.5], [0.5, 0.5])
+                ),
+                "dries": StructuralFunction(dries, ["color", "dose"], None),
+            }
+        )
+
+
+class TestStateRockThrowing:
+
+    def test_1(self):
+        # Compact states read like dicts and agree with the dict of tensors they are built from
+        env = RockThrowing()
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        state = env.get_compact_state(dict(noise))
+        env.reset()
+        dict_state = env.get_state(dict(noise))
+        assert list(state.keys()) == env.topological_order
+        assert len(state) == 5
+        assert "suzy_hits" in state
+        for var, value in dict_state.items():
+            assert state[var] == int(value)
+            assert isinstance(state[var], int)
+        assert state == State.from_dict(dict_state, env.topological_order)
+        assert state.to_dict() == {var: int(v) for var, v in dict_state.items()}
+
+    def test_2(self):
+        # Equal states have equal hashes and can be used as cache keys
+        state = State.from_dict({"a": torch.tensor(1), "b": 0, "y": torch.tensor(0.0)})
+        same_state = State(["a", "b", "y"], [1, 0, 0])
+        other_state = State(["a", "b", "y"], [1, 1, 1])
+        assert state == same_state
+        assert hash(state) == hash(same_state)
+        assert len({state, same_state, other_state}) == 2
+        assert State(["a"], [1.0]).array.dtype == np.int64
+        with pytest.raises(ValueError):
+            state.array[0] = 0
+
+    def test_3(self):
+        # Assignments are compared against the state as a whole
+        state = State(["a", "b", "y"], [1, 0, 1])
+        assert state.matches({"a": 1, "y": torch.tensor(1)})
+        assert not state.matches({"a": 1, "b": torch.tensor(1)})
+        assert state.mismatches({"a": 0, "b": 0, "y": 0}) == ["a", "y"]
+        assert state.matches({})
+
+        # Factuality checks accept compact states
+        factual, info = ModifiedHP().is_factual(None, {"a": 1}, {"y": 0}, state)
+        assert not factual
+        assert info["incorrect_outcomes"] == {"y": 0}
+
+    def test_4(self):
+        # States with string and fractional values keep them, and the definitions can check them
+        state = State(["color", "dose", "dries"], ["red", 1.5, 1])
+        assert state["color"] == "red" and state["dose"] == 1.5 and state["dries"] == 1
+        assert state == State(["color", "dose", "dries"], ["red", 1.5, 1])
+        assert hash(state) == hash(State(["color", "dose", "dries"], ["red", 1.5, 1]))
+        assert state.mismatches({"color": "blue", "dose": 1.5}) == ["color"]
+
+        env = Paint()
+        noise = {"color": "red", "dose": 1.5}
+        state = env.get_compact_state(dict(noise))
+        assert state.to_dict() == {"color": "red", "dose": 1.5, "dries": 1}
+        for definition in [ModifiedHP, OriginalHP]:
+            ac_defn = definition(search_order=HeuristicSearchOrder(seed=0))
+            factual, _ = ac_defn.is_factual(env, {"color": "red"}, {"dries": 1}, state)
+            assert factual
+            sufficient, _ = ac_defn.is_sufficient(
+                env, {"dose": 1.5}, {"dries": 1}, state, dict(noise)
+            )
+            assert sufficient
+        sufficient, info = DirectActualCause().is_sufficient(
+            env, {"dose": 1.5}, {"dries": 1}, state, dict(noise)
+        )
+        assert not sufficient
+        assert info["ac2b_counterexample"] == {"color": "blue"}
+
+        solver = HPExhaustiveSearch(
+            env, ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        )
+        actual_causes = solver.solve(state, {"dries": 1}, dict(noise))
+        assert sorted(actual_causes) == [("color",), ("dose",)]
+
+    def test_5(self, capsys):
+        # Factuality of a dict of tensors is checked on a compact state, and mismatches are reported in the info
+        env = RockThrowing()
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(0)}
+        state = env.get_state(dict(noise))
+        factual, info = ModifiedHP().is_factual(
+            env,
+            {"suzy_throws": 1, "billy_throws": 1},
+            {"bottle_shatters": torch.tensor(1)},
+            state,
+        )
+        assert not factual
+        assert info == {"incorrect_events": {"billy_throws": 1}}
+        assert capsys.readouterr().out == ""
+        factual, info = ModifiedHP().is_factual(
+            env, {"suzy_throws": 1}, {"bottle_shatters": 1}, state
+        )
+        assert factual and info == {}
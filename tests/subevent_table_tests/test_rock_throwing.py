@@ -0,0 +1,66 @@
+import torch
+from counterfact.examples import ForestFireRainStorm, RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder, SubeventTable, get_all_subevents
+from counterfact.utils.instrumentation import instrument
+
+
+class TestSubeventTableRockThrowing:
+
+    noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+    outcome = {"bottle_shatters": 1}
+
+    def test_1(self):
+        # Minimality checks all proper subevents, largest first, and leaves the model unchanged
+        event = {"suzy_throws": 1, "suzy_hits": 1, "billy_hits": 0}
+        subevents = get_all_subevents(event, reverse=True)
+        assert [len(subevent) for subevent in subevents] == [2, 2, 2, 1, 1, 1]
+
+        env = RockThrowing()
+        original_functions = env.original_functions
+        state = env.get_state(dict(self.noise))
+        result, info = ModifiedHP(search_order=HeuristicSearchOrder(seed=0)).is_minimal(
+            env, event, self.outcome, state, dict(self.noise)
+        )
+        assert result is False
+        assert len(info["ac3_smaller_cause"]) < len(event)
+        assert env.original_functions is original_functions
+        assert env.structural_functions.keys() == original_functions.keys()
+
+    def test_2(self):
+        # Known results of subevents are looked up instead of checked again
+        env = RockThrowing()
+        state = env.get_state(dict(self.noise))
+        event = {"suzy_throws": 1, "billy_hits": 0}
+        table = SubeventTable()
+        table.add({"suzy_throws": 1}, self.outcome, state, self.noise, False)
+        table.add({"billy_hits": 0}, self.outcome, state, self.noise, True)
+        with instrument() as profile:
+            result, info = ModifiedHP().is_minimal(
+                env, event, self.outcome, state, dict(self.noise), subevent_table=table
+            )
+        assert result is False
+        assert info["ac3_smaller_cause"] == {"billy_hits": 0}
+        assert "evaluate" not in profile.get_report()["counters"]
+        assert table.hits == 2
+
+    def test_3(self):
+        # The solver shares one table between all minimality checks
+        env = ForestFireRainStorm()
+        definition = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        solver = HPExhaustiveSearch(env, definition)
+        solver.solve_all_states(env, definition, ["fire_in_june"])
+        assert solver.subevent_table.hits > 0
+        assert solver.subevent_table.hits == solver.subevent_table.lookups
+
+    def test_4(self):
+        # The table keeps at most max_entries results, evicting the oldest first
+        table = SubeventTable(max_entries=2)
+        for var in ["suzy_throws", "billy_throws", "suzy_hits"]:
+            table.add({var: 1}, self.outcome, {}, self.noise, True)
+        assert len(table) == 2
+        assert table.get({"suzy_throws": 1}, self.outcome, {}, self.noise) is None
+        assert table.get({"suzy_hits": 1}, self.outcome, {}, self.noise) is True
+        env = RockThrowing()
+        assert HPExhaustiveSearch(env, ModifiedHP()).subevent_table.max_entries > 0
@@ -0,0 +1,76 @@
+import pytest
+import torch
+from counterfact.examples import Voting, ObedientGang, RockThrowing
+from counterfact.definitions import ModifiedHP
+from counterfact.inference import (
+    HPExhaustiveSearch,
+    SymmetricExhaustiveSearch,
+    find_exchangeable_variables,
+)
+
+
+class TestExchangeableVariables:
+
+    def test_1(self):
+        # All voters are interchangeable, the winner is not
+        env = Voting(n_voters=11)
+        orbits = find_exchangeable_variables(env)
+        assert len(orbits) == 1
+        assert set(orbits[0]) == {f"voter_{i}" for i in range(1, 12)}
+
+    def test_2(self):
+        # Gang members are interchangeable, the leader is their parent and cannot be swapped with them
+        env = ObedientGang(n_members=3)
+        orbits = find_exchangeable_variables(env)
+        assert len(orbits) == 1
+        assert set(orbits[0]) == {"gang_member_0", "gang_member_1", "gang_member_2"}
+
+    def test_3(self):
+        # Suzy and Billy play different roles, so there is no symmetry
+        env = RockThrowing()
+        assert find_exchangeable_variables(env) == []
+
+    def test_4(self):
+        # With many voters the number of parent assignments overflows int64, and only a sample of them is checked
+        env = Voting(n_voters=64)
+        orbits = find_exchangeable_variables(env)
+        assert len(orbits) == 1
+        assert set(orbits[0]) == {f"voter_{i}" for i in range(1, 65)}
+
+
+class TestSymmetricExhaustiveSearch:
+
+    def test_1(self):
+        # Voters with the same vote fall into the same class
+        env = Voting(n_voters=11)
+        solver = SymmetricExhaustiveSearch(env, ModifiedHP())
+        state = {f"voter_{i}": int(i <= 6) for i in range(1, 12)}
+        state["winner"] = 1
+        classes = solver.get_symmetry_classes(state, {"winner": 1})
+        assert sorted(len(cls) for cls in classes) == [5, 6]
+
+        # Only one representative per combination of class counts is checked
+        representatives = [
+            rep
+            for size in range(1, 11)
+            for rep in solver.get_representatives([], classes, size)
+        ]
+        assert len(representatives) == 7 * 6 - 2
+
+    def test_2(self):
+        # Without symmetries the result is the same as the plain exhaustive search
+        env = RockThrowing()
+        state = {
+            "suzy_throws": 1,
+            "billy_throws": 1,
+            "suzy_hits": 1,
+            "billy_hits": 0,
+            "bottle_shatters": 1,
+        }
+        outcome = {"bottle_shatters": 1}
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        expected = HPExhaustiveSearch(env, ModifiedHP()).solve(state, outcome, noise)
+        result = SymmetricExhaustiveSearch(env, ModifiedHP()).solve(
+            state, outcome, noise
+        )
+        assert set(map(frozenset, result)) == set(map(frozenset, expected))
@@ -0,0 +1,71 @@
+import pytest
+import torch
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.examples import RockThrowing
+from counterfact.definitions import DirectActualCause, ModifiedHP, OriginalHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder
+from counterfact.utils.instrumentation import instrument
+
+
+class TestTwinNetworkRockThrowing:
+
+    def test_1(self):
+        # Every counterfactual copy agrees with intervening on the model and evaluating it
+        env = RockThrowing()
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        interventions = [
+            {"suzy_throws": 0},
+            {"suzy_hits": 0},
+            {"suzy_throws": 0, "billy_hits": 0},
+            {},
+        ]
+        factual, counterfactuals = TwinNetwork(env).evaluate(interventions, noise)
+        for index, intervention in enumerate(interventions):
+            env.reset()
+            env.intervene(intervention)
+            state = env.get_state(dict(noise))
+            copy = TwinNetwork.get_state(counterfactuals, index)
+            assert {v: int(state[v]) for v in state} == {v: int(copy[v]) for v in copy}
+        env.reset()
+        assert factual == env.get_state(dict(noise))
+
+    def test_2(self):
+        # Variables that are not downstream of an intervention are shared with the factual world
+        env = RockThrowing()
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        twin_network = TwinNetwork(env)
+        factual = env.get_state(dict(noise))
+        with instrument() as profile:
+            twin_network.evaluate([{"billy_throws": 0}] * 3, noise, factual)
+        evaluated = profile.get_report()["keyed_counters"].get("evaluate", {})
+        assert "suzy_hits" not in evaluated
+        assert evaluated["billy_hits"] == 3
+
+        # Billy's rock does not hit the bottle either way, so the outcome is not evaluated again
+        assert "bottle_shatters" not in evaluated
+
+        # The outcome holds in every copy, since Suzy's rock still shatters the bottle
+        index, alt_state = twin_network.first_mismatch(
+            [{"billy_throws": 0}, {"suzy_throws": 0}], {"bottle_shatters": 1}, noise
+        )
+        assert index is None
+        index, alt_state = twin_network.first_mismatch(
+            [{"billy_throws": 0}, {"suzy_throws": 0, "billy_hits": 0}],
+            {"bottle_shatters": 1},
+            noise,
+        )
+        assert index == 1
+        assert int(alt_state["bottle_shatters"]) == 0
+
+    @pytest.mark.parametrize("ac_defn", [ModifiedHP, OriginalHP, DirectActualCause])
+    def test_3(self, ac_defn):
+        # Solving with a twin network finds the same causes as intervening on the model
+        env = RockThrowing()
+        causes = []
+        for twin_network in [False, True]:
+            defn = ac_defn(search_order=HeuristicSearchOrder(seed=0))
+            solver = HPExhaustiveSearch(env, defn, twin_network=twin_network)
+            ac_table = solver.solve_all_states(env, defn, ["bottle_shatters"])
+            causes.append([sorted(c) for c in ac_table["actual_causes"]])
+        assert causes[0] == causes[1]
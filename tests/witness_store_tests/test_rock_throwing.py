@@ -0,0 +1,134 @@
+import pytest
+import torch
+from counterfact.examples import RockThrowing
+from counterfact.causal_models.twin_network import TwinNetwork
+from counterfact.definitions import DirectActualCause, ModifiedHP
+from counterfact.inference import HPExhaustiveSearch
+from counterfact.utils import HeuristicSearchOrder, WitnessStore, assignment_key
+
+
+class TestWitnessStoreRockThrowing:
+
+    def test_1(self):
+        # Witness sets of the most similar event come first
+        store = WitnessStore()
+        state = {"suzy_throws": 1, "billy_throws": 1, "suzy_hits": 1, "billy_hits": 0}
+        outcome = {"bottle_shatters": 1}
+        store.add({"suzy_hits": 1}, outcome, state, ("billy_throws",))
+        store.add({"suzy_throws": 1}, outcome, state, ("billy_hits",))
+        candidates = store.lookup(
+            {"suzy_throws": 1}, outcome, state, ["billy_throws", "billy_hits"]
+        )
+        assert candidates == [("billy_hits",), ("billy_throws",)]
+
+        # Witness sets that overlap with the event are not returned
+        candidates = store.lookup(
+            {"suzy_throws": 1}, outcome, state, ["billy_throws", "suzy_hits"]
+        )
+        assert candidates == [("billy_throws",)]
+
+        # Witness sets for other outcomes are not returned
+        assert store.lookup({"suzy_throws": 1}, {"bottle_shatters": 0}, state, []) == []
+
+    def test_2(self):
+        # Solving the same state twice reuses the witness sets found the first time
+        env = RockThrowing()
+        store = WitnessStore()
+        solver = HPExhaustiveSearch(env, ModifiedHP(), witness_store=store)
+        state = {
+            "suzy_throws": 1,
+            "billy_throws": 1,
+            "suzy_hits": 1,
+            "billy_hits": 0,
+            "bottle_shatters": 1,
+        }
+        outcome = {"bottle_shatters": 1}
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        first = solver.solve(state, outcome, noise)
+        hits = store.get_stats()["hits"]
+        second = solver.solve(state, outcome, noise)
+        stats = store.get_stats()
+        assert set(first.keys()) == set(second.keys())
+        assert stats["entries"] > 0
+        assert stats["hits"] > hits
+        assert 0 < stats["hit_rate"] <= 1
+
+    def test_3(self):
+        # A witness set found in the store is stored for the new event and recorded by the search order
+        env = RockThrowing()
+        store = WitnessStore()
+        ac_defn = ModifiedHP(search_order=HeuristicSearchOrder(seed=0))
+        state = {
+            "suzy_throws": 1,
+            "billy_throws": 1,
+            "suzy_hits": 1,
+            "billy_hits": 0,
+            "bottle_shatters": 1,
+        }
+        outcome = {"bottle_shatters": 1}
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        store.add({"suzy_hits": 1}, outcome, state, ("billy_hits",))
+        necessary, info = ac_defn.is_necessary(
+            env, {"suzy_throws": 1}, outcome, state, noise, witness_store=store
+        )
+        assert necessary
+        assert info["ac2a_witness_source"] == "witness_store"
+        assert store.get_stats()["hits"] == 1
+        assert store.lookup(
+            {"suzy_throws": 1}, outcome, state, ["billy_throws", "billy_hits"]
+        ) == [("billy_hits",)]
+        assert store.entries[assignment_key(outcome)][
+            assignment_key({"suzy_throws": 1})
+        ][assignment_key(state)] == [("billy_hits",)]
+        assert ac_defn.search_order.successful_witnesses[
+            (assignment_key(state), assignment_key(outcome))
+        ] == [("billy_hits",)]
+
+    def test_4(self):
+        # Sufficiency of stored witnesses is checked with the same arguments as in the full search
+        env = RockThrowing()
+        store = WitnessStore()
+        twin_network = TwinNetwork(env)
+        ac_defn = DirectActualCause(search_order=HeuristicSearchOrder(seed=0))
+        calls = []
+        is_sufficient = ac_defn.is_sufficient
+
+        def record_sufficiency(*args, **kwargs):
+            calls.append(kwargs)
+            return is_sufficient(*args, **kwargs)
+
+        ac_defn.is_sufficient = record_sufficiency
+        noise = {"suzy_throws": torch.tensor(1), "billy_throws": torch.tensor(1)}
+        state = env.get_state(dict(noise))
+        outcome = {"bottle_shatters": 1}
+        store.add({"suzy_hits": 1}, outcome, state, ("billy_hits",))
+        necessary, info = ac_defn.is_necessary(
+            env,
+            {"suzy_throws": 1},
+            outcome,
+            state,
+            noise,
+            witness_store=store,
+            twin_network=twin_network,
+        )
+        assert necessary
+        assert info["ac2a_witness_source"] == "witness_store"
+        assert calls == [{"twin_network": twin_network}]
+
+    def test_5(self):
+        # The store keeps the witness sets of at most max_entries events in a state
+        store = WitnessStore(max_entries=2)
+        outcome = {"bottle_shatters": 1}
+        for i, var in enumerate(["suzy_throws", "billy_throws", "suzy_hits"]):
+            store.add({var: 1}, outcome, {"state": i}, ("billy_hits",))
+        store.add({"suzy_hits": 1}, outcome, {"state": 2}, ("billy_throws",))
+        assert store.get_stats()["entries"] == 3
+        assert (
+            assignment_key({"suzy_throws": 1})
+            not in store.entries[assignment_key(outcome)]
+        )
+        assert store.lookup(
+            {"suzy_hits": 1}, outcome, {"state": 2}, ["billy_hits"]
+        ) == [("billy_hits",)]
+        store.clear()
+        assert store.entries == {} and len(store.order) == 0